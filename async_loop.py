@@ -0,0 +1,215 @@
+"""Alternative runtime for event loop built on asyncio. Same startup, transition table, and fault
+handling as event_loop.py, but acquisition, control, DB writes, log writes, and maintenance run as
+separate tasks, so a slow commit, subprocess fork, or backup doesn't hold up relay control.
+
+Priority (highest first). Each has its own thread so lower ones can't hold up higher ones, and
+lower-priority threads are niced (Linux applies nice value per thread):
+    control      - state machine and relay/LED writes. Blocking waits inside transition actions
+                   (voltage stabilization, timer debounce) only hold up this thread.
+    acquisition  - sensor reads, estimators, fault detection (paced by SamplingPolicy)
+    db           - batched inserts of queued samples (DataLogger write-behind)
+    logging      - log-file and EventLog writes (OutputHandler.defer_writes)
+    maintenance  - network name, RTC/NTP checks, status output and stats
+
+    python async_loop.py
+"""
+import os
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+import event_loop
+from class_def import Controller, StateMachine, NETWORK_NAME_MAX_AGE_SEC
+
+# Executor thread -> nice increment. Order here is priority order.
+THREAD_NICENESS = {"control": 0, "acquisition": 1, "db": 5, "logging": 8, "maintenance": 10}
+ACQUISITION_MIN_PERIOD_SEC = 0.05 # Yield between full-rate samples.
+DB_FLUSH_PERIOD_SEC = 1           # Well under DATALOG_LAPSE_THRESHOLD_SEC.
+LOG_FLUSH_PERIOD_SEC = 0.5
+STATUS_PERIOD_SEC = 300
+
+
+def _set_thread_niceness(niceness):
+    # PRIO_PROCESS w/ a thread ID only affects that thread on Linux.
+    if niceness:
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(),
+                           os.getpriority(os.PRIO_PROCESS, 0) + niceness)
+        except OSError:
+            pass # Priority order then only enforced by separate threads.
+
+
+class AsyncRuntime(object):
+    def __init__(self, Car, Machine, Checkpoint, Status=None, Dog=None):
+        self.Car = Car
+        self.Output = Car.Output
+        self.Machine = Machine
+        self.Checkpoint = Checkpoint
+        self.Status = Status
+        self.Dog = Dog
+        self.executors = {name: concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix=name,
+                                                                      initializer=_set_thread_niceness,
+                                                                      initargs=(niceness,))
+                          for name, niceness in THREAD_NICENESS.items()}
+        self.sample_ready = None # asyncio.Event - created in running loop.
+        self.stopping = threading.Event() # Cuts short acquisition thread's wait between samples.
+        self.sample_time = None  # monotonic
+        self.stats = {"control_steps": 0, "max_control_wait_s": 0.0, "max_control_step_s": 0.0,
+                      "db_rows": 0, "max_db_flush_s": 0.0}
+
+    async def _run_in(self, thread_name, fxn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executors[thread_name], fxn, *args)
+
+    def _control_step(self):
+        """Runs on control thread. Returns True if event loop should end.
+        """
+        with self.Car.Phases.phase("control"):
+            self.Car.Params.apply_changes() # Between control steps. Acquisition thread sees whole set at once.
+            self.Checkpoint.update(**self.Machine.states)
+            # Apply LED changes coalesced during previous step and verify relay writes.
+            Controller().flush_outputs()
+            # Datalogging liveness reflects DB writer keeping up, so stalled writes still stop watchdog pings.
+            if self.Car.check_datalogging() and self.Dog is not None:
+                self.Dog.feed()
+            self.Car.Timer.apply_pending_rebase() # After first NTP sync seen by maintenance thread.
+            return self.Machine.step(event_loop.get_tick_predicates(self.Car))
+
+    def _acquire(self):
+        """Runs on acquisition thread. Returns True if new sample taken.
+        """
+        with self.Car.Phases.phase("acquisition"):
+            if not self.Car.Sampling.start_pass(self.Machine.states):
+                return False
+            self.Car.log_data() # Rows queued for db task.
+            if self.Status is not None:
+                self.Status.publish(self.Car.latest_sample, {"states": dict(self.Machine.states),
+                                                             "timers": self.Car.Timer.get_timer_state(),
+                                                             "sampling": self.Car.Sampling.mode,
+                                                             "faults": self.Car.Faults.get_active(),
+                                                             "pid": os.getpid()})
+            return True
+
+    def _wait_for_next_pass(self):
+        with self.Car.Phases.phase("wait"):
+            self.Car.Sampling.wait_for_next_pass(stop_event=self.stopping) # Sleeps between samples when idle.
+
+    def _flush_db(self):
+        with self.Car.Phases.phase("db"):
+            return self.Car.DataLogger.flush_pending()
+
+    def _flush_log(self):
+        with self.Car.Phases.phase("logging"):
+            self.Output.flush_writes()
+
+    async def control(self):
+        """Runs one control step per new sample (samples arriving mid-step coalesced).
+        """
+        while True:
+            await self.sample_ready.wait()
+            self.sample_ready.clear()
+            start_time = time.monotonic()
+            self.stats["max_control_wait_s"] = max(self.stats["max_control_wait_s"], start_time - self.sample_time)
+            if await self._run_in("control", self._control_step):
+                return
+            self.stats["control_steps"] += 1
+            self.stats["max_control_step_s"] = max(self.stats["max_control_step_s"], time.monotonic() - start_time)
+
+    async def acquisition(self):
+        while True:
+            await self._run_in("acquisition", self._acquire)
+            self.sample_time = time.monotonic()
+            self.sample_ready.set()
+            await asyncio.sleep(ACQUISITION_MIN_PERIOD_SEC)
+            await self._run_in("acquisition", self._wait_for_next_pass)
+
+    async def db_writer(self):
+        while True:
+            await asyncio.sleep(DB_FLUSH_PERIOD_SEC)
+            start_time = time.monotonic()
+            self.stats["db_rows"] += await self._run_in("db", self._flush_db)
+            self.stats["max_db_flush_s"] = max(self.stats["max_db_flush_s"], time.monotonic() - start_time)
+
+    async def log_writer(self):
+        while True:
+            await asyncio.sleep(LOG_FLUSH_PERIOD_SEC)
+            await self._run_in("logging", self._flush_log)
+
+    def _output_status(self):
+        with self.Car.Phases.phase("status"):
+            Timer = self.Car.Timer
+            Timer.update_rtc(force=False, wait=False, log=True)
+            Timer.is_ntp_syncd(log=False) # First NTP sync (sys-time jump) handled in-process.
+            self.Car.output_status()
+            self.Machine.print_stats()
+            self.Car.Sampling.print_stats()
+            self.Car.Faults.print_stats()
+            self.print_stats()
+
+    def print_stats(self):
+        self.Output.print_debug("Async runtime: %d control steps (max wait %.3fs, max step %.2fs), "
+                                "%d rows written (max flush %.3fs)."
+                                % (self.stats["control_steps"], self.stats["max_control_wait_s"],
+                                   self.stats["max_control_step_s"], self.stats["db_rows"],
+                                   self.stats["max_db_flush_s"]),
+                                category="program", **{k: round(v, 3) for k, v in self.stats.items()})
+
+    async def maintenance(self):
+        last_status_time = time.monotonic()
+        while True:
+            # Refresh well before cached name expires so acquisition never forks iwgetid.
+            await asyncio.sleep(NETWORK_NAME_MAX_AGE_SEC / 2)
+            await self._run_in("maintenance", self.Car.Timer.get_network_name)
+            if time.monotonic() - last_status_time >= STATUS_PERIOD_SEC:
+                last_status_time = time.monotonic()
+                await self._run_in("maintenance", self._output_status)
+
+    async def run(self):
+        """Returns when control loop ends. Fault in any task cancels rest and is re-raised.
+        """
+        self.sample_ready = asyncio.Event()
+        tasks = [asyncio.create_task(self.control(), name="control"),
+                 asyncio.create_task(self.acquisition(), name="acquisition"),
+                 asyncio.create_task(self.db_writer(), name="db"),
+                 asyncio.create_task(self.log_writer(), name="logging"),
+                 asyncio.create_task(self.maintenance(), name="maintenance")]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                task.result()
+        finally:
+            # Control step may still be mid-transition (e.g., between relay writes in enable_charge()). Refuse
+            # further relay closes and wait for it, so nothing drives relays after caller's exit handling or
+            # in-process recovery opens them. Let in-progress sample and writes finish too, so nothing queues
+            # rows during final flush (or caller's checkpoint). Maintenance thread may be mid-wait (abandoned).
+            Controller().block_relay_closes()
+            self.stopping.set()
+            for name, executor in self.executors.items():
+                executor.shutdown(wait=(name != "maintenance"), cancel_futures=True)
+            self.Car.DataLogger.flush_pending()
+            self.Output.flush_writes()
+
+
+def main(Output, Timer, Checkpoint, Status=None, Dog=None, Car=None):
+    """Drop-in for event_loop.main() (same signature, so event_loop.supervise() can run it).
+    """
+    if Car is None:
+        Car = event_loop.start_up(Output, Timer, Checkpoint, Dog)
+        if Dog is not None:
+            Dog.notify_ready()
+    Machine = StateMachine(Output, event_loop.build_transition_table(Car), dict(Checkpoint.loop_states))
+    Runtime = AsyncRuntime(Car, Machine, Checkpoint, Status, Dog)
+    event_loop.set_stats_signal(Car, Machine, extra_stats_fxn=Runtime.print_stats)
+    Car.DataLogger.enable_write_behind()
+    Output.defer_writes()
+    try:
+        asyncio.run(Runtime.run())
+    finally:
+        Output.defer_writes(False) # Fault handling and exit messages written immediately.
+
+
+if __name__ == "__main__":
+    event_loop.run(main_fxn=main)
@@ -0,0 +1,223 @@
+"""Simulated AutomationHAT, ADS1115 ADC, and PCF8523 RTC for running class_def code off-device
+(benchmarks, dataset tools). Call install() before using class_def objects.
+
+Also substitutes canned results for the iwgetid/timedatectl calls class_def makes, and refuses
+any other privileged command (shutdown, reboot) so nothing here can act on the host.
+"""
+import os
+import sys
+import time
+import types
+import subprocess
+
+
+# Representative values, used only if local control_params.py not present (it isn't tracked in repo).
+BENCH_CONTROL_PARAMS = {"ALTERNATOR_OUTPUT_V_MIN": 13.3,
+                        "MAIN_V_MIN": 12.2,
+                        "MAIN_V_MAX": 14.8,
+                        "MAIN_V_CHARGED": 12.7,
+                        "AUX_V_MIN": 12.8,
+                        "AUX_V_MAX": 13.6,
+                        "MIN_CHARGE_CURRENT_A": 1.0,
+                        "RPI_SHUTDOWN_DELAY_SEC": 600,
+                        "STATE_CHANGE_DELAY_SEC": 30,
+                        "VOLTAGE_STABILIZATION_TIME_SEC": 10,
+                        "NTP_WAIT_TIME_SEC": 5,
+                        "RTC_LAG_THRESHOLD_SEC": 5,
+                        "DB_SAMPLE_TRAILING_SEC": 5}
+
+FAKE_NETWORK_SSID = "bench_ssid"
+CHARGE_CURRENT_A = 10.0 # Shunt current simulated whenever charge-enable relay closed.
+
+
+class FakeHat(object):
+    def __init__(self):
+        """Shared simulated hardware state. Tests/benchmarks change attributes to set up scenarios.
+        Pin numbering matches class_def constants.
+        """
+        self.main_v = 12.6
+        self.aux_v = 13.2
+        self.engine_w = False
+        self.key_acc = False
+        self.enable_sw = True
+        self.relays = [False, False, False]
+        self.lights = [0, 0, 0]
+
+    def set_scenario(self, name):
+        self.enable_sw = (name != "shutdown_pending")
+        self.key_acc = name in ["key_acc", "engine_running"]
+        self.engine_w = (name == "engine_running")
+        self.main_v = 14.2 if name == "engine_running" else 12.6
+
+    def get_charger_output_v(self):
+        # Charge-direction relay open = fwd (aux -> main), so charger output sits at main voltage.
+        return self.aux_v if self.relays[1] else self.main_v
+
+    def get_shunt_v(self):
+        from class_def import SHUNT_AMP_VOLTAGE_RATIO
+        return (CHARGE_CURRENT_A if self.relays[0] else 0.0) / SHUNT_AMP_VOLTAGE_RATIO
+
+
+HAT = FakeHat()
+
+
+class _AnalogChannel(object):
+    def __init__(self, num):
+        self.num = num
+
+    def read(self):
+        return [HAT.get_charger_output_v, lambda: HAT.aux_v, lambda: HAT.main_v][self.num]()
+
+
+class _Input(object):
+    def __init__(self, num):
+        self.num = num
+
+    def is_on(self):
+        return [HAT.engine_w, HAT.key_acc, HAT.enable_sw][self.num]
+
+    def is_off(self):
+        return not self.is_on()
+
+
+class _Relay(object):
+    def __init__(self, num):
+        self.num = num
+
+    def on(self):
+        HAT.relays[self.num] = True
+
+    def off(self):
+        HAT.relays[self.num] = False
+
+    def is_on(self):
+        return HAT.relays[self.num]
+
+    def is_off(self):
+        return not HAT.relays[self.num]
+
+
+class _Light(object):
+    def __init__(self, num):
+        self.num = num
+
+    def write(self, brightness):
+        HAT.lights[self.num] = brightness
+
+    def read(self):
+        return HAT.lights[self.num]
+
+    def toggle(self):
+        HAT.lights[self.num] = 0 if HAT.lights[self.num] else 1
+
+    def off(self):
+        HAT.lights[self.num] = 0
+
+
+class FakeADS1115(object):
+    def __init__(self, i2c):
+        self.gain = 1
+
+
+class FakeAnalogIn(object):
+    def __init__(self, adc, pin_pos, pin_neg):
+        pass
+
+    @property
+    def voltage(self):
+        return HAT.get_shunt_v()
+
+
+class FakePCF8523(object):
+    def __init__(self, i2c):
+        pass
+
+    @property
+    def datetime(self):
+        return time.localtime()
+
+    @datetime.setter
+    def datetime(self, value):
+        pass
+
+
+class FakeSubprocess(object):
+    """Stands in for subprocess module inside class_def.
+    """
+    PIPE = subprocess.PIPE
+    STDOUT = subprocess.STDOUT
+    CompletedProcess = subprocess.CompletedProcess
+
+    def run(self, args, **kwargs):
+        if args[0] == "/usr/sbin/iwgetid":
+            return subprocess.CompletedProcess(args, 0, stdout=FAKE_NETWORK_SSID + "\n", stderr="")
+        elif args[0] == "/usr/bin/timedatectl":
+            return subprocess.CompletedProcess(args, 0, stdout="yes\n", stderr="")
+        else:
+            raise RuntimeError("Refusing to run %s off-device." % " ".join(args))
+
+
+def _install_local_modules():
+    try:
+        import control_params
+    except ImportError:
+        control_params = types.ModuleType("control_params")
+        control_params.__dict__.update(BENCH_CONTROL_PARAMS)
+        sys.modules["control_params"] = control_params
+    try:
+        import network_names
+    except ImportError:
+        network_names = types.ModuleType("network_names")
+        network_names.stored_ssid_mapping_dict = {FAKE_NETWORK_SSID: "Bench network"}
+        sys.modules["network_names"] = network_names
+
+
+class QuietOutput(object):
+    """Minimal Output stand-in for DataLogger-only use (no console output or log file).
+    """
+    def is_time_valid(self):
+        return True
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def import_class_def():
+    """Import class_def from repo root (w/ fallback local modules if needed). Hardware not touched.
+    """
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if repo_root not in sys.path:
+        sys.path.insert(0, repo_root)
+    _install_local_modules()
+    import class_def
+    return class_def
+
+
+def install(work_dir):
+    """Point class_def at simulated hardware and put its data/log files under work_dir.
+    Returns class_def module.
+    """
+    class_def = import_class_def()
+
+    ah = types.SimpleNamespace(analog=[_AnalogChannel(n) for n in range(3)],
+                               input=[_Input(n) for n in range(3)],
+                               relay=[_Relay(n) for n in range(3)],
+                               light=[_Light(n) for n in range(3)])
+    class_def.ah = ah
+    class_def.I2C = object()
+    class_def.ADS1115 = FakeADS1115
+    class_def.AnalogIn = FakeAnalogIn
+    class_def.ads1x15 = types.SimpleNamespace(Pin=types.SimpleNamespace(A0=0, A1=1))
+    class_def.PCF8523 = FakePCF8523
+    class_def.subprocess = FakeSubprocess()
+    class_def.Controller._instance = None # Discard any shadow state from real/previous hardware.
+
+    class_def.LOG_DIR = os.path.join(work_dir, "logs")
+    class_def.DATA_LOG_PATH = os.path.join(work_dir, "system_data_log.db")
+    class_def.DATA_LOG_STAGING_PATH = os.path.join(work_dir, "system_data_log_staging.db")
+    class_def.EVENT_LOG_PATH = os.path.join(work_dir, "logs", "events.db")
+    class_def.DATA_LOG_BU_DIR = os.path.join(work_dir, "datalogging_BU")
+    class_def.STATE_CHECKPOINT_PATH = os.path.join(work_dir, "state_checkpoint.json")
+    class_def.STATUS_API_ADDRESS = None
+    os.makedirs(class_def.LOG_DIR, exist_ok=True)
+    return class_def
@@ -0,0 +1,257 @@
+"""Off-device benchmark suite for control loop, data path, and maintenance jobs.
+Runs class_def/event_loop code against simulated hardware (fake_hardware.py) in a temp dir.
+Deliberate delays (time.sleep) are skipped so timings reflect work done, not waiting.
+
+Results written as JSON. Each result compared against thresholds.json (absolute max median)
+and, if --baseline given, against previous results file (relative tolerance).
+Exit status 1 if any benchmark regressed.
+
+    python benchmarks/run_benchmarks.py [--days 60] [--output bench_results.json] [--baseline old.json]
+"""
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import datetime as dt
+
+import fake_hardware
+import synth_datalog
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+THRESHOLDS_PATH = os.path.join(BENCH_DIR, "thresholds.json")
+LOOP_SCENARIOS = ["key_off", "key_acc", "engine_running", "shutdown_pending"]
+
+
+def time_runs(fxn, num_runs, setup_fxn=None):
+    """Returns list of durations (seconds). setup_fxn (if any) runs before each run, untimed.
+    """
+    durations = []
+    for run_num in range(num_runs):
+        if setup_fxn is not None:
+            setup_fxn()
+        start_time = time.perf_counter()
+        fxn()
+        durations.append(time.perf_counter() - start_time)
+    return durations
+
+
+def summarize(durations):
+    durations = sorted(durations)
+    return {"median_s": statistics.median(durations),
+            "p95_s": durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))],
+            "runs": len(durations)}
+
+
+def build_history_db(db_path, num_days):
+    """Fill db w/ num_days of simulated 1 Hz history in all three tables, ending now.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    return synth_datalog.generate(db_path, num_days)
+
+
+def bench_vehicle(class_def, results, num_runs):
+    import event_loop
+    Output = class_def.OutputHandler()
+    Output.finish_clock_setup()
+    Timer = Output.Clock
+    Car = class_def.Vehicle(Output, Timer)
+    for x in range(3):
+        Car.log_data()
+
+    results["log_data_tick"] = summarize(time_runs(Car.log_data, num_runs))
+    results["get_main_voltage"] = summarize(time_runs(Car.get_main_voltage, num_runs))
+    results["get_aux_voltage"] = summarize(time_runs(Car.get_aux_voltage, num_runs))
+    results["get_charge_current"] = summarize(time_runs(Car.get_charge_current, num_runs))
+
+    for scenario in LOOP_SCENARIOS:
+        fake_hardware.HAT.set_scenario(scenario)
+        Timer.restore_timer_state({"state_change": None, "shutdown": None, "charge": None,
+                                   "state_change_delay_time": class_def.STATE_CHANGE_DELAY_SEC})
+        Checkpoint = class_def.StateCheckpoint(Output, Timer)
+        states = {"key_acc_powered": Car.is_acc_powered(),
+                  "engine_on_state": Car.is_engine_running(),
+                  "sys_enabled_state": scenario != "shutdown_pending"}
+        if scenario == "shutdown_pending":
+            Timer.start_shutdown_timer(log=False)
+        Machine = class_def.StateMachine(Output, event_loop.build_transition_table(Car), states)
+        for x in range(3):
+            event_loop.run_pass(Car, Machine, Checkpoint) # Settle into steady state for scenario.
+        results["loop_pass_%s" % scenario] = summarize(
+            time_runs(lambda: event_loop.run_pass(Car, Machine, Checkpoint), num_runs))
+    Controller = class_def.Controller()
+    Controller.open_all_relays()
+
+
+def bench_maintenance(class_def, results, work_dir, num_days):
+    history_path = os.path.join(work_dir, "history_%dd.db" % num_days)
+    build_stats = build_history_db(history_path, num_days + 1) # Extra day so purge has something to delete.
+    results["build_history_db"] = {"median_s": build_stats["elapsed_s"], "runs": 1,
+                                   "days": num_days + 1, "rows_per_table": build_stats["rows_per_table"]}
+
+    def restore_history():
+        shutil.copy(history_path, class_def.DATA_LOG_PATH)
+
+    restore_history()
+    datalogger = class_def.DataLogger(fake_hardware.QuietOutput())
+    results["purge_old_data_%dd" % num_days] = summarize(
+        time_runs(datalogger.purge_old_data, 3, setup_fxn=restore_history))
+
+    # First backup writes every chunk. Later ones only re-export changed days (none here).
+    datestamp = dt.datetime.now().strftime(class_def.DATE_FORMAT)
+    results["run_backup_full_%dd" % num_days] = summarize(time_runs(lambda: datalogger.run_backup(datestamp), 1))
+    results["run_backup_%dd" % num_days] = summarize(time_runs(lambda: datalogger.run_backup(datestamp), 3))
+
+    try:
+        import pandas
+    except ImportError:
+        results["get_dfs_day"] = {"skipped": "pandas not installed"}
+        return
+    date_str = (dt.datetime.now() - dt.timedelta(days=1)).date().isoformat()
+    results["get_dfs_day"] = summarize(
+        time_runs(lambda: datalogger.get_dfs(date_str), 3, setup_fxn=datalogger.query_cache.clear))
+    results["get_dfs_day_cached"] = summarize(time_runs(lambda: datalogger.get_dfs(date_str), 10))
+
+    def restore_history_wo_derived():
+        restore_history()
+        datalogger._create_derived_table() # History DB has only raw tables.
+    results["backfill_derived_%dd" % num_days] = summarize(
+        time_runs(datalogger.backfill_derived, 1, setup_fxn=restore_history_wo_derived))
+
+
+def bench_high_rate(class_def, results, work_dir, rate_hz=10):
+    """Day of sub-second history (every sample stored, DATA_LOG_MIN_INTERVAL_MS = 0 equivalent).
+    """
+    db_path = os.path.join(work_dir, "history_%dhz.db" % rate_hz)
+    synth_datalog.generate(db_path, 1, rate_hz=rate_hz)
+    datalogger = class_def.DataLogger(fake_hardware.QuietOutput(), db_path=db_path)
+    latest_time = dt.datetime.fromtimestamp(datalogger._get_latest_timestamp(datalogger.voltage_table) / 1000)
+    results["get_voltage_values_%dhz" % rate_hz] = summarize(time_runs(
+        lambda: datalogger.get_voltage_values(latest_time, class_def.DB_SAMPLE_TRAILING_SEC, "Vmain_raw"), 200))
+
+    try:
+        import pandas
+    except ImportError:
+        results["get_dfs_day_%dhz" % rate_hz] = {"skipped": "pandas not installed"}
+        return
+    date_str = latest_time.date().isoformat()
+    results["get_dfs_day_%dhz" % rate_hz] = summarize(
+        time_runs(lambda: datalogger.get_dfs(date_str), 3, setup_fxn=datalogger.query_cache.clear))
+    results["get_dfs_day_%dhz_decimated_1s" % rate_hz] = summarize(
+        time_runs(lambda: datalogger.get_dfs(date_str, decimate_ms=1000), 3, setup_fxn=datalogger.query_cache.clear))
+
+
+def bench_startup(results, num_runs):
+    durations = {"import_s": [], "first_sample_s": []}
+    for run_num in range(num_runs):
+        child = subprocess.run([sys.executable, os.path.abspath(__file__), "--startup-child"],
+                               capture_output=True, text=True, check=True)
+        child_result = json.loads(child.stdout.strip().splitlines()[-1])
+        for key in durations:
+            durations[key].append(child_result[key])
+    results["startup_import"] = summarize(durations["import_s"])
+    results["startup_import_to_first_sample"] = summarize(durations["first_sample_s"])
+
+
+def startup_child():
+    """Run in fresh interpreter. Prints JSON w/ import and first-sample times.
+    """
+    start_time = time.perf_counter()
+    work_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    time.sleep = lambda seconds: None
+    class_def = fake_hardware.install(work_dir)
+    import_done_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        Output = class_def.OutputHandler()
+        Output.finish_clock_setup()
+        class_def.Vehicle(Output, Output.Clock) # Logs first sample.
+    first_sample_time = time.perf_counter()
+    shutil.rmtree(work_dir)
+    print(json.dumps({"import_s": import_done_time - start_time,
+                      "first_sample_s": first_sample_time - start_time}))
+
+
+def check_regressions(results, baseline_results, tolerance):
+    with open(THRESHOLDS_PATH, "r") as fd:
+        thresholds = json.load(fd)
+    regressed = []
+    for name, result in results.items():
+        if "median_s" not in result:
+            continue
+        if name in thresholds:
+            result["threshold_s"] = thresholds[name]
+            if result["median_s"] > thresholds[name]:
+                regressed.append("%s: %.4fs > threshold %.4fs" % (name, result["median_s"], thresholds[name]))
+        baseline = baseline_results.get(name, {})
+        if "median_s" in baseline:
+            result["baseline_s"] = baseline["median_s"]
+            if result["median_s"] > baseline["median_s"] * (1 + tolerance):
+                regressed.append("%s: %.4fs > baseline %.4fs (+%d%%)"
+                                 % (name, result["median_s"], baseline["median_s"], tolerance*100))
+        result["status"] = "regressed" if any(r.startswith(name + ":") for r in regressed) else "ok"
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Off-device benchmarks for vehicle_aux_battery_control.")
+    parser.add_argument("--days", type=int, default=60, help="Days of history for maintenance benchmarks.")
+    parser.add_argument("--runs", type=int, default=200, help="Runs per fast benchmark.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs. baseline (fraction).")
+    parser.add_argument("--startup-child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup_child:
+        startup_child()
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="bench_")
+    real_sleep = time.sleep
+    time.sleep = lambda seconds: None
+    results = {}
+    try:
+        class_def = fake_hardware.install(work_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench_vehicle(class_def, results, args.runs)
+            bench_maintenance(class_def, results, work_dir, args.days)
+            bench_high_rate(class_def, results, work_dir)
+        bench_startup(results, 5)
+    finally:
+        time.sleep = real_sleep
+        shutil.rmtree(work_dir)
+
+    baseline_results = {}
+    if args.baseline is not None:
+        with open(args.baseline, "r") as fd:
+            baseline_results = json.load(fd)["results"]
+    regressed = check_regressions(results, baseline_results, args.tolerance)
+
+    with open(args.output, "w") as fd:
+        json.dump({"meta": {"timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+                            "hostname": platform.node(),
+                            "python": platform.python_version(),
+                            "days": args.days},
+                   "results": results}, fd, indent=2)
+
+    for name, result in results.items():
+        if "median_s" in result:
+            print("%-36s %10.4f ms  %s" % (name, result["median_s"]*1000, result.get("status", "")))
+        else:
+            print("%-36s %s" % (name, result.get("skipped", "")))
+    if regressed:
+        print("\nRegressions:\n\t" + "\n\t".join(regressed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
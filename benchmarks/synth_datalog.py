@@ -0,0 +1,378 @@
+"""Synthetic long-horizon datalog generator for scale-testing DataLogger.
+Writes voltages/charging/signals rows into DataLogger's own schema (tables created by DataLogger).
+
+Vehicle behavior simulated event-by-event (drive cycles, key-off idle drain, charge sessions in
+both directions w/ charge delays, aux-empty shutdowns, NTP gaps after boot, program restarts w/ new PID).
+The timeline is reduced to segments w/ constant discrete state and linear analog trends, and SQLite
+expands each segment to rows itself (recursive CTE), so no per-row Python work.
+
+    python benchmarks/synth_datalog.py out.db --days 365 [--hz 1] [--start 2024-01-01] [--seed 0] [--profile p.json]
+
+Timestamps are epoch ms like DataLogger's, so rates above 1 Hz match production sub-second logging
+(see DATA_LOG_MIN_INTERVAL_MS).
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import datetime as dt
+
+import fake_hardware
+
+
+# All currents in A, capacities in Ah, durations in sec unless noted.
+DEFAULT_PROFILE = {"trips_per_day": 2.5,            # Mean (Poisson)
+                   "trip_minutes": [8, 75],          # Uniform range of engine-running time per trip
+                   "trip_window_hours": [7, 21],     # Trips start in this part of the day
+                   "acc_before_start_sec": 20,
+                   "acc_after_stop_sec": 15,
+                   "main_capacity_ah": 60,
+                   "aux_capacity_ah": 100,
+                   "main_soc_start": 0.9,
+                   "aux_soc_start": 0.8,
+                   "alternator_v": 14.2,
+                   "alternator_charge_a": 25,        # Into main batt while engine running (until full)
+                   "rev_charge_a": 20,               # Charger output into aux batt (engine running)
+                   "fwd_charge_a": 10,               # Charger output into main batt (engine off)
+                   "fwd_float_a": 0.3,               # Charger output once main batt full
+                   "charger_efficiency": 0.88,
+                   "acc_load_a": 6,                  # Accessory load on main batt w/ key in ACC
+                   "parasitic_drain_a": 0.04,        # Key-off idle drain on main batt
+                   "controller_load_a": 0.4,         # RPi etc. on aux batt while powered
+                   "aux_full_soc": 0.98,
+                   "key_off_shutdown_v": 12.0,       # Matches temp threshold in event_loop key_off_mode()
+                   "boot_sec": 25,                   # Power-on to first logged sample
+                   "ntp_gap_prob": 0.3,              # Chance boot has no valid time for a while
+                   "ntp_gap_sec": [30, 300],
+                   "restarts_per_day": 0.2,          # Program restarts (new PID) while powered
+                   "restart_gap_sec": 12,
+                   "home_network": "Home",
+                   "home_hours": [18, 8],            # Parked in this window -> on home network
+                   "noise_v": 0.01,                  # Uniform +/- noise on each analog reading
+                   "noise_a": 0.05,
+                   "max_segment_sec": 1800}          # Caps linear-interpolation span
+
+# LiFePO4-ish aux OCV and flooded lead-acid main OCV vs. state of charge.
+AUX_OCV_SOC = [0.0, 0.05, 0.2, 0.9, 1.0]
+AUX_OCV_V = [12.0, 12.8, 13.1, 13.3, 13.55]
+MAIN_OCV_SOC = [0.0, 1.0]
+MAIN_OCV_V = [11.8, 12.75]
+
+
+def _interp(x, xp, fp):
+    if x <= xp[0]:
+        return fp[0]
+    for n in range(1, len(xp)):
+        if x <= xp[n]:
+            return fp[n-1] + (fp[n] - fp[n-1]) * (x - xp[n-1]) / (xp[n] - xp[n-1])
+    return fp[-1]
+
+
+class VehicleSim(object):
+    def __init__(self, class_def, start_time, num_days, profile, seed=0):
+        """Event-driven sim of vehicle + controller. Produces segments via run().
+        Thresholds come from class_def (i.e. control_params) so data matches configured behavior.
+        """
+        self.cd = class_def
+        self.p = profile
+        self.rng = random.Random(seed)
+        self.start_s = int((start_time - dt.datetime(1970, 1, 1)).total_seconds()) # Naive local time
+        self.end_s = self.start_s + int(num_days * 86400)
+
+        self.main_soc = profile["main_soc_start"]
+        self.aux_soc = profile["aux_soc_start"]
+        self.key_acc = False
+        self.engine_on = False
+        self.powered = True
+        self.pid = self.rng.randint(400, 30000)
+        self.rows_from = self.start_s + profile["boot_sec"]
+        self.delay_until = self.rows_from + self.cd.STATE_CHANGE_DELAY_SEC
+        self.aux_empty_soc_acc = _interp(self.cd.AUX_V_MIN, AUX_OCV_V, AUX_OCV_SOC)
+        self.aux_empty_soc_off = _interp(profile["key_off_shutdown_v"], AUX_OCV_V, AUX_OCV_SOC)
+        self.counts = {"trips": 0, "boots": 1, "restarts": 0, "ntp_gaps": 0, "shutdowns": 0}
+
+    def _poisson(self, mean):
+        # Knuth. Means here are small.
+        limit, k, prod = pow(2.718281828459045, -mean), 0, self.rng.random()
+        while prod > limit:
+            k += 1
+            prod *= self.rng.random()
+        return k
+
+    def build_events(self):
+        p = self.p
+        events = []
+        for day_start in range(self.start_s - self.start_s % 86400, self.end_s, 86400):
+            num_trips = self._poisson(p["trips_per_day"])
+            starts = sorted(day_start + int(self.rng.uniform(*p["trip_window_hours"]) * 3600)
+                            for n in range(num_trips))
+            trip_end = 0
+            for acc_on in starts:
+                acc_on = max(acc_on, trip_end + 300)
+                engine_start = acc_on + p["acc_before_start_sec"]
+                engine_stop = engine_start + int(self.rng.uniform(*p["trip_minutes"]) * 60)
+                trip_end = engine_stop + p["acc_after_stop_sec"]
+                events += [(acc_on, "acc_on"), (engine_start, "engine_start"),
+                           (engine_stop, "engine_stop"), (trip_end, "acc_off")]
+            for n in range(self._poisson(p["restarts_per_day"])):
+                events.append((day_start + self.rng.randrange(86400), "restart"))
+        return sorted(e for e in events if self.start_s <= e[0] < self.end_s)
+
+    def _handle_event(self, t, kind):
+        p = self.p
+        if kind == "restart":
+            if self.powered:
+                self.counts["restarts"] += 1
+                self.pid = self.rng.randint(400, 30000)
+                self.rows_from = t + p["restart_gap_sec"]
+                self.delay_until = self.rows_from + self.cd.STATE_CHANGE_DELAY_SEC
+            return
+        if kind == "acc_on":
+            self.key_acc = True
+            self.counts["trips"] += 1
+            if not self.powered:
+                # Key -> ACC powers controller back up.
+                self.powered = True
+                self.counts["boots"] += 1
+                self.pid = self.rng.randint(400, 30000)
+                self.rows_from = t + p["boot_sec"]
+                if self.rng.random() < p["ntp_gap_prob"]:
+                    self.counts["ntp_gaps"] += 1
+                    self.rows_from += int(self.rng.uniform(*p["ntp_gap_sec"]))
+                self.delay_until = t + p["boot_sec"] + self.cd.STATE_CHANGE_DELAY_SEC
+                return
+        elif kind == "engine_start":
+            self.engine_on = True
+        elif kind == "engine_stop":
+            self.engine_on = False
+        elif kind == "acc_off":
+            self.key_acc = False
+            # Engine already off -> controller uses short delay.
+            self.delay_until = max(self.delay_until, t + 5)
+            return
+        self.delay_until = max(self.delay_until, t + self.cd.STATE_CHANGE_DELAY_SEC)
+
+    def _charge_mode(self, t):
+        """Returns (mode, shutdown) w/ mode None, "fwd" (aux -> main), or "rev" (main -> aux).
+        """
+        if not self.powered or t < self.delay_until:
+            return None, False
+        if self.engine_on:
+            return ("rev" if self.aux_soc < self.p["aux_full_soc"] else None), False
+        empty_soc = self.aux_empty_soc_acc if self.key_acc else self.aux_empty_soc_off
+        if self.aux_soc <= empty_soc:
+            return None, True
+        return "fwd", False
+
+    def _currents(self, mode):
+        """Returns (main batt net A, aux batt net A, charger output A) for current state.
+        """
+        p = self.p
+        main_a, aux_a, charge_a = 0.0, 0.0, 0.0
+        if self.engine_on:
+            main_a = p["alternator_charge_a"] if self.main_soc < 1 else 0.0
+        elif self.key_acc:
+            main_a = -p["acc_load_a"]
+        else:
+            main_a = -p["parasitic_drain_a"]
+        if self.powered:
+            aux_a = -p["controller_load_a"]
+        if mode == "rev":
+            charge_a = p["rev_charge_a"]
+            aux_a += charge_a
+        elif mode == "fwd":
+            charge_a = p["fwd_charge_a"] if self.main_soc < 1 else p["fwd_float_a"]
+            main_a += charge_a
+            aux_a -= charge_a / p["charger_efficiency"]
+        if self.main_soc >= 1 and main_a > 0:
+            main_a = 0.0
+        return main_a, aux_a, charge_a
+
+    def _terminal_voltages(self, main_soc, aux_soc, main_a, aux_a):
+        if self.engine_on:
+            v_main = self.p["alternator_v"]
+        else:
+            v_main = _interp(main_soc, MAIN_OCV_SOC, MAIN_OCV_V) + main_a * self.cd.MAIN_BATT_INTERNAL_R_OHM
+        v_aux = _interp(aux_soc, AUX_OCV_SOC, AUX_OCV_V) + aux_a * self.cd.AUX_BATT_INTERNAL_R_OHM
+        return v_main, v_aux
+
+    def _sec_to_soc(self, soc, target, current_a, capacity_ah):
+        if current_a == 0 or (target - soc) * current_a <= 0:
+            return None
+        return max(1, int((target - soc) * capacity_ah * 3600 / current_a) + 1)
+
+    def run(self):
+        """Generator of segment dicts (only for spans where rows get logged).
+        """
+        p = self.p
+        events = self.build_events()
+        event_num = 0
+        t = self.start_s
+        while t < self.end_s:
+            while event_num < len(events) and events[event_num][0] <= t:
+                self._handle_event(t, events[event_num][1])
+                event_num += 1
+            mode, shutdown = self._charge_mode(t)
+            if shutdown:
+                self.powered = False
+                self.counts["shutdowns"] += 1
+                mode = None
+            main_a, aux_a, charge_a = self._currents(mode)
+
+            boundaries = [self.end_s, t + p["max_segment_sec"]]
+            if event_num < len(events):
+                boundaries.append(events[event_num][0])
+            for boundary in [self.rows_from, self.delay_until]:
+                if boundary > t:
+                    boundaries.append(boundary)
+            main_target = 1.0 if main_a > 0 else 0.0
+            aux_target = p["aux_full_soc"] if aux_a > 0 else (self.aux_empty_soc_acc if self.key_acc
+                                                               else self.aux_empty_soc_off)
+            for dur in [self._sec_to_soc(self.main_soc, main_target, main_a, p["main_capacity_ah"]),
+                        self._sec_to_soc(self.aux_soc, aux_target, aux_a, p["aux_capacity_ah"])]:
+                if dur is not None:
+                    boundaries.append(t + dur)
+            seg_end = min(boundaries)
+
+            main_soc_end = min(1.0, max(0.0, self.main_soc + main_a * (seg_end - t) / 3600 / p["main_capacity_ah"]))
+            aux_soc_end = min(1.0, max(0.0, self.aux_soc + aux_a * (seg_end - t) / 3600 / p["aux_capacity_ah"]))
+            if self.powered and t >= self.rows_from:
+                v_main_0, v_aux_0 = self._terminal_voltages(self.main_soc, self.aux_soc, main_a, aux_a)
+                v_main_1, v_aux_1 = self._terminal_voltages(main_soc_end, aux_soc_end, main_a, aux_a)
+                local_hour = (t % 86400) // 3600
+                home_start, home_end = p["home_hours"]
+                at_home = (not self.key_acc) and (local_hour >= home_start or local_hour < home_end)
+                yield {"start_s": t,
+                       "dur_s": seg_end - t,
+                       "v_main": (v_main_0, v_main_1),
+                       "v_aux": (v_aux_0, v_aux_1),
+                       "charge_a": charge_a,
+                       "charging": mode is not None,
+                       "charge_dir_fwd": mode != "rev", # Direction relay only energized for rev.
+                       "key_acc": self.key_acc,
+                       "engine_on": self.engine_on,
+                       "network": p["home_network"] if at_home else None,
+                       "pid": self.pid}
+            self.main_soc, self.aux_soc = main_soc_end, aux_soc_end
+            t = seg_end
+
+
+def _row_source(rate_hz):
+    """SQL fragment yielding (n, ts) for each sample in segment. Params: (num_samples - 1, start_ms).
+    """
+    return f"""WITH RECURSIVE s(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM s WHERE n < ?)
+               SELECT n, ? + n * {1000 // rate_hz} AS ts FROM s"""
+
+
+def _local_s_to_epoch_ms(local_s):
+    # Sim runs in naive local seconds (no DST), so segments straddling a DST change can overlap - hence INSERT OR IGNORE.
+    return int((dt.datetime(1970, 1, 1) + dt.timedelta(seconds=local_s)).timestamp() * 1000)
+
+
+def write_segments(conn, segments, rate_hz, noise_v, noise_a, shunt_ratio):
+    """Expand segments into rows in all three tables. Returns number of rows per table.
+    """
+    rows = _row_source(rate_hz)
+    # Uniform noise in +/- noise amplitude. random() % 1000 is in [-999, 999].
+    noise = "(random() %% 1000) * %r" % (noise_v / 1000)
+    lerp = "(? + (? - ?) * n / ?)"
+    voltage_stmt = f"""INSERT OR IGNORE INTO voltages
+                       SELECT ts, {lerp} + {noise}, {lerp} + {noise}
+                       FROM ({rows});
+                    """
+    charging_stmt = f"""INSERT OR IGNORE INTO charging
+                        SELECT ts, ?, ?, amps, amps / {shunt_ratio!r}
+                        FROM (SELECT ts, abs(? + (random() % 1000) * {noise_a / 1000!r}) AS amps
+                              FROM ({rows}));
+                     """
+    signals_stmt = f"""INSERT OR IGNORE INTO signals
+                       SELECT ts, 1, ?, ?, ?, ?,
+                              {lerp} + {noise}, {lerp} + {noise}, {lerp} + {noise},
+                              ?, ?, 1,
+                              ?, ?, 1,
+                              ?
+                       FROM ({rows});
+                    """
+    num_rows = 0
+    for seg in segments:
+        num_samples = seg["dur_s"] * rate_hz
+        span = float(num_samples) # lerp denominator (float to avoid SQLite integer division)
+        source = (num_samples - 1, _local_s_to_epoch_ms(seg["start_s"]))
+        (vm0, vm1), (va0, va1) = seg["v_main"], seg["v_aux"]
+        charger_out = (va0, va1) if seg["charging"] and not seg["charge_dir_fwd"] else (vm0, vm1)
+        conn.execute(voltage_stmt, (vm0, vm1, vm0, span, va0, va1, va0, span, *source))
+        conn.execute(charging_stmt, (seg["charging"], seg["charge_dir_fwd"], seg["charge_a"], *source))
+        conn.execute(signals_stmt, (seg["key_acc"], seg["engine_on"], seg["engine_on"], seg["network"],
+                                    charger_out[0], charger_out[1], charger_out[0], span,
+                                    va0, va1, va0, span,
+                                    vm0, vm1, vm0, span,
+                                    seg["engine_on"], seg["key_acc"],
+                                    seg["charging"], seg["charging"] and not seg["charge_dir_fwd"],
+                                    seg["pid"], *source))
+        num_rows += num_samples
+    return num_rows
+
+
+def generate(db_path, num_days, rate_hz=1, start_time=None, profile=None, seed=0):
+    """Build synthetic datalog at db_path (must not exist). start_time defaults to num_days before now,
+    so data ends at present. Returns stats dict.
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError("%s already exists." % db_path)
+    if rate_hz < 1 or 1000 % rate_hz:
+        raise ValueError("rate_hz must be an integer divisor of 1000 (got %r)." % rate_hz)
+    full_profile = dict(DEFAULT_PROFILE)
+    full_profile.update(profile or {})
+    if start_time is None:
+        start_time = dt.datetime.now().replace(microsecond=0) - dt.timedelta(days=num_days)
+
+    gen_start = time.perf_counter()
+    class_def = fake_hardware.import_class_def()
+    datalogger = class_def.DataLogger(fake_hardware.QuietOutput(), db_path=db_path) # Creates tables.
+    datalogger.sql_conn.close()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA cache_size = -262144") # 256 MB
+    Sim = VehicleSim(class_def, start_time, num_days, full_profile, seed=seed)
+    num_rows = write_segments(conn, Sim.run(), rate_hz, full_profile["noise_v"], full_profile["noise_a"],
+                              class_def.SHUNT_AMP_VOLTAGE_RATIO)
+    conn.commit()
+    conn.close()
+    return {"days": num_days,
+            "rate_hz": rate_hz,
+            "rows_per_table": num_rows,
+            "db_MB": os.path.getsize(db_path) / 1024**2,
+            "elapsed_s": time.perf_counter() - gen_start,
+            **Sim.counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic vehicle datalog DB.")
+    parser.add_argument("db_path")
+    parser.add_argument("--days", type=float, default=60)
+    parser.add_argument("--hz", type=int, default=1, help="Sample rate (divisor of 1000).")
+    parser.add_argument("--start", help="Start date (YYYY-MM-DD). Default: data ends now.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", help="JSON file overriding DEFAULT_PROFILE entries.")
+    args = parser.parse_args()
+
+    profile = None
+    if args.profile:
+        with open(args.profile, "r") as fd:
+            profile = json.load(fd)
+        unknown = set(profile) - set(DEFAULT_PROFILE)
+        if unknown:
+            sys.exit("Unknown profile keys: %s" % ", ".join(sorted(unknown)))
+    start_time = dt.datetime.strptime(args.start, "%Y-%m-%d") if args.start else None
+    stats = generate(args.db_path, args.days, rate_hz=args.hz, start_time=start_time,
+                     profile=profile, seed=args.seed)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
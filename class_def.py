@@ -5,14 +5,29 @@ import time
 import datetime as dt
 import sys
 import re
-import subprocess, shlex
-import ntplib
+import importlib
+import subprocess
+import math
+import json
+import threading
+import collections
+import http.server
+import urllib.parse
+import hashlib
+import socket
+import statistics
+import zlib
+import gzip
+import contextlib
+import ctypes
+import struct
+import ast
+import operator
 from colorama import Style, Fore, Back
 
 import sqlite3
-import pandas as pd
-import numpy as np
-from sqlalchemy import create_engine, text
+# pandas is only needed for analysis (notebook, get_dfs(), etc.) and is imported
+# lazily there to keep program startup fast on the RPi.
 
 HOSTNAME = platform.node()
 if HOSTNAME.lower().startswith("rpi"):
@@ -26,6 +41,7 @@ else:
     I2C = None
 
 from network_names import stored_ssid_mapping_dict     # local file
+import control_params
 from control_params import ALTERNATOR_OUTPUT_V_MIN, \
                            MAIN_V_MIN, MAIN_V_MAX, \
                            MAIN_V_CHARGED, \
@@ -41,10 +57,69 @@ from control_params import ALTERNATOR_OUTPUT_V_MIN, \
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
 DATA_LOG_PATH = os.path.join(SCRIPT_DIR, "system_data_log.db")
+EVENT_LOG_PATH = os.path.join(LOG_DIR, "events.db") # Structured copy of log-file entries (EventLog).
+# EventLog rows committed in batches to limit SD-card writes: w/ each deferred log flush (async runtime),
+# else once this long since last commit. WARN/ERROR events committed immediately, and pending ones on exit.
+EVENT_LOG_COMMIT_INTERVAL_SEC = 10
+# Completed days' log files (before today) gzipped by LogArchiver in background thread.
+LOG_FILE_REGEX = r"^(2[01]\d{2}[01]\d[0-3]\d)\.log$"
+LOG_COMPRESS_LEVEL = 9
+LOG_COMPRESS_BLOCK_MAX_BYTES = 1024**2 # Uncompressed. Each block (<= 1 hr of entries) is a separate gzip member.
+LOG_COMPRESS_CHECK_SEC = 3600
+
+DATALOG_LAPSE_THRESHOLD_SEC = 5 # Every table expected to have had a row inserted within this time.
+DATA_LOG_MIN_INTERVAL_MS = 100 # Samples closer than this to previous stored row not stored (0 keeps every sample).
+DATA_LOG_COMMIT_INTERVAL_SEC = 1 # Rows queued and inserted in one transaction this often.
+# While sys time invalid (no RTC, no NTP sync yet), rows held in memory w/ monotonic time and stamped once time
+# valid. Oldest dropped beyond max rows (~7 hr at untimed interval, 4 tables).
+DATA_LOG_UNTIMED_MIN_INTERVAL_MS = 1000
+DATA_LOG_UNTIMED_MAX_ROWS = 100000
+# Live writes go to staging DB on tmpfs (RAM) and are checkpointed to DATA_LOG_PATH (SD card) in batches.
+# Set to None to write DATA_LOG_PATH directly (SD-card commit every DATA_LOG_COMMIT_INTERVAL_SEC).
+# Loss window: on power loss or unclean shutdown, up to DATA_LOG_CHECKPOINT_INTERVAL_SEC of rows are lost
+# (program restart w/o reboot recovers them from staging file). Every exit path and shutdown checkpoints first.
+DATA_LOG_STAGING_PATH = "/dev/shm/system_data_log_staging.db"
+DATA_LOG_CHECKPOINT_INTERVAL_SEC = 60 # SD-card writes still batched 60x vs. direct (one transaction per minute).
+DATA_LOG_STAGING_KEEP_SEC = 300 # Rows kept in staging DB after checkpoint (serves trailing-window reads).
+# Derived table (signed current, power, trailing-median voltages over DB_SAMPLE_TRAILING_SEC) written w/ each
+# sample. Decisions use stored filtered voltage if its row is this recent, else recompute from raw window.
+DERIVED_FILTER_MAX_AGE_SEC = 1
+DERIVED_BACKFILL_CHUNK_SEC = 24*60*60 # Rows older than first ingested derived row computed a chunk at a time.
+QUERY_CACHE_MAX_BYTES = 256 * 1024**2 # In-memory bound for DataLogger's cache of historical query results.
+# Long DB jobs (migration, purge, backup) call DataLogger progress_fxn (e.g., Watchdog.keep_alive) this often.
+DATA_LOG_PROGRESS_INTERVAL_OPS = 100000 # SQLite VM instructions
 
 DATA_LOG_BU_NUM_TO_KEEP = 10
 DATA_LOG_BU_DIR = os.path.join(SCRIPT_DIR, "datalogging_BU")
-DATA_LOG_BU_REGEX = r"^system_data_log--2[01]\d{2}[01]\d[0-3]\d_auto\.db$"
+DATA_LOG_BU_REGEX = r"^system_data_log--2[01]\d{2}[01]\d[0-3]\d_auto\.db$" # Legacy full-copy backups
+DATA_LOG_BU_MANIFEST_REGEX = r"^(system_data_log--2[01]\d{2}[01]\d[0-3]\d_auto)\.json$"
+DATA_LOG_BU_COMPRESS_LEVEL = 6 # zlib
+
+STATE_CHECKPOINT_PATH = os.path.join(SCRIPT_DIR, "state_checkpoint.json")
+STATE_CHECKPOINT_MAX_AGE_SEC = 60 # Older checkpoints ignored (normal startup instead).
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+STATUS_API_ADDRESS = ("127.0.0.1", 8765) # Local status API (StatusServer). Set to None to disable.
+STATUS_API_HISTORY_LEN = 600             # Number of recent samples held in memory for API.
+STATUS_API_STREAM_KEEPALIVE_SEC = 15
+
+NETWORK_NAME_MAX_AGE_SEC = 60 # Network name logged w/ each sample re-checked (iwgetid) this often.
+
+# Control params hot-reloaded (ControlParamStore) when either file changes. Any param assigned in USB file (also
+# launcher.sh kill switch) overrides local file's value, at startup and after, until drive removed. So USB file
+# should assign only params meant to override. Files parsed, not run (literal values and arithmetic only).
+# Watched w/ inotify, or polled this often if inotify unavailable (e.g., drive not mounted).
+CONTROL_PARAMS_PATH = os.path.abspath(control_params.__file__) if getattr(control_params, "__file__", None) else None
+CONTROL_PARAMS_USB_PATH = os.path.join("/media", pwd.getpwuid(os.getuid()).pw_name, "USB-01", "control_params.py")
+CONTROL_PARAMS_POLL_SEC = 5
+CONTROL_PARAM_NAMES = ["ALTERNATOR_OUTPUT_V_MIN", "MAIN_V_MIN", "MAIN_V_MAX", "MAIN_V_CHARGED", "AUX_V_MIN",
+                       "AUX_V_MAX", "MIN_CHARGE_CURRENT_A", "RPI_SHUTDOWN_DELAY_SEC", "STATE_CHANGE_DELAY_SEC",
+                       "VOLTAGE_STABILIZATION_TIME_SEC", "NTP_WAIT_TIME_SEC", "RTC_LAG_THRESHOLD_SEC",
+                       "DB_SAMPLE_TRAILING_SEC"]
+CONTROL_PARAM_V_MAX = 20 # Voltage params (names ending in "_V_...") must be between MIN_BATT_PRESENT_V and this.
+
+PROFILE_DURATION_SEC = 30           # On-demand profile (SIGUSR1) length. Folded stacks written to LOG_DIR.
+PROFILE_SAMPLE_INTERVAL_SEC = 0.01
 
 DATE_FORMAT = "%Y%m%d"
 TIME_FORMAT = "%H%M%S"
@@ -66,6 +141,33 @@ CHARGER_ENABLE_RELAY = 0          # labeled 1 on board
 CHARGE_DIRECTION_RELAY = 1        # labeled 2 on board
 KEEPALIVE_RELAY = 2               # labeled 3 on board
 
+RELAY_FULL_VERIFY_INTERVAL = 10   # Read back all relays every Nth Controller.flush_outputs() call.
+
+# Battery open-circuit-voltage estimator (BatteryEstimator) tuning
+MAIN_BATT_INTERNAL_R_OHM = 0.03         # Includes wiring. TODO experimentally determine.
+AUX_BATT_INTERNAL_R_OHM = 0.02          # Includes wiring. TODO experimentally determine.
+OCV_EST_PROCESS_NOISE_V2_PER_S = 1e-6   # Expected OCV drift (variance growth per second)
+OCV_EST_STALE_NOISE_V2_PER_S = 1e-4     # Variance growth per second while readings unusable (e.g., engine running)
+OCV_EST_MEAS_NOISE_V2 = 0.05**2         # ADC noise and ripple on single raw reading
+OCV_EST_TRANSITION_V2 = 0.2**2          # Uncertainty added when charging starts/stops/reverses
+OCV_EST_CONFIDENT_STD_V = 0.015         # Estimate used for charge decisions below this std dev (~10+ readings)...
+OCV_EST_MIN_SETTLED_SEC = 10            # ...and this long after last charging change or resumed tracking.
+
+# Adaptive sampling (SamplingPolicy) - seconds between logged samples in each mode
+SAMPLE_INTERVAL_FAST_SEC = 0            # Every pass (charging, charge delay, key ACC/ON, voltage settling)
+SAMPLE_INTERVAL_SHUTDOWN_SEC = 5        # Shutdown countdown
+SAMPLE_INTERVAL_IDLE_SEC = 15           # Key OFF, not charging, no timers running
+SAMPLE_INPUT_POLL_SEC = 0.5             # Inputs/relays checked this often between slow samples (change -> sample now).
+SAMPLE_TRAILING_MIN_COUNT = 3           # Trailing-window estimators widen window to span this many samples.
+
+# Streaming fault detection (FaultDetector)
+FAULT_DEBOUNCE_SEC = 3                  # Invariant must be violated continuously this long...
+FAULT_DEBOUNCE_MIN_SAMPLES = 3          # ...and over at least this many samples before fault raised.
+FAULT_SETTLE_SEC = 2                    # Relay-dependent invariants not checked this long after charge mode changes.
+FAULT_EWMA_ALPHA = 0.1                  # Smoothing of each invariant's measured quantity
+CHARGER_OUTPUT_V_TOL = 0.05             # Charger output vs. selected source battery voltage
+MIN_BATT_PRESENT_V = 5                  # Below this, battery (or its sense wire) considered disconnected.
+
 
 
 class ChargeControlError(Exception):
@@ -86,8 +188,10 @@ class SysTimeUpdateException(Exception):
 
 class OutputHandler(object):
     def __init__(self, use_log_file=True):
-        self.Clock = TimeKeeper(self)
         self.logging = use_log_file
+        self.pending_writes = None # Set by defer_writes()
+        self.Events = EventLog() if use_log_file else None # Before TimeKeeper, which may log.
+        self.Clock = TimeKeeper(self)
         self._log_startup()
 
         # Call finish_clock_setup() immediately after instantiation.
@@ -130,18 +234,63 @@ class OutputHandler(object):
             with open(self.log_filepath, "w") as fd:
                 pass
 
+    def defer_writes(self, enabled=True):
+        """Queue log-file and EventLog writes for flush_writes() (e.g., called from a low-priority
+        thread) instead of writing from caller's thread. Console output still immediate.
+        Pass enabled=False to write anything still queued and go back to writing immediately.
+        """
+        if enabled and self.pending_writes is None:
+            self.pending_writes = collections.deque()
+        elif not enabled and self.pending_writes is not None:
+            self.flush_writes()
+            self.pending_writes = None
+
+    def flush_writes(self):
+        while self.pending_writes:
+            write_fxn, args = self.pending_writes.popleft()
+            write_fxn(*args)
+        self.commit_events()
+
+    def commit_events(self):
+        """Commits EventLog rows batched since last commit (see EventLog.add). Call before exit.
+        """
+        if self.Events is not None:
+            self.Events.commit()
+
     def _add_to_log_file(self, print_str):
         if not self.logging:
             return
+        if self.pending_writes is not None:
+            self.pending_writes.append((self._write_to_log_file, (print_str,)))
+        else:
+            self._write_to_log_file(print_str)
+
+    def _write_to_log_file(self, print_str):
         self._create_log_file() # Ensures that if date changes while program running,
                                 # new log entries are written to next day's log.
         with open(self.log_filepath, "a") as log_file:
             log_file.write("%s\n" % print_str)
 
-    def _print_and_log(self, message, color=Fore.WHITE, style=Style.BRIGHT, prompt=False):
+    def _add_event(self, level, category, message, fields):
+        if self.Events is None:
+            return
+        time_valid = self.is_time_valid()
+        event_args = (self.Clock.get_time_now(string_format=DATETIME_FORMAT_SQL), time_valid,
+                      level, category, message, fields)
+        if self.pending_writes is not None:
+            self.pending_writes.append((self.Events.add, event_args))
+        else:
+            self.Events.add(*event_args)
+
+    def _print_and_log(self, message, color=Fore.WHITE, style=Style.BRIGHT, prompt=False,
+                       level=None, category=None, fields=None):
+        """If level given, also records event in EventLog (message w/o level tag).
+        """
         timestamp = self._get_timestamp()
         print_str = Style.NORMAL + timestamp + " " + color + style + message
         log_str = timestamp + " " + message
+        if level is not None:
+            self._add_event(level, category, message[8:], fields)
 
         if prompt:
             print(print_str)
@@ -161,12 +310,15 @@ class OutputHandler(object):
         self._add_to_log_file("")
         self._add_to_log_file("-"*23 + " PROGRAM START [USER: %s, PID: %d] "
                               % (username, os.getpid()) + "-"*20)
+        self._add_event("INFO", "program", "Program start", {"user": username, "pid": os.getpid()})
 
     def print_rtc_and_sys_time(self, preface):
-        self.print_debug("%s:" % preface)
-        self.print_debug("\tRTC time: %s" % self.Clock.get_time_now(string_format=DATETIME_FORMAT, source="rtc"))
+        self.print_debug("%s:" % preface, category="time")
+        self.print_debug("\tRTC time: %s" % self.Clock.get_time_now(string_format=DATETIME_FORMAT, source="rtc"),
+                         category="time")
         self.print_debug("\tSys time: %s (%sNTP sync)" % (self.Clock.get_time_now(string_format=DATETIME_FORMAT, source="sys"),
-                                                          "No " if not self.Clock.is_ntp_syncd(log=False) else ""))
+                                                          "No " if not self.Clock.is_ntp_syncd(log=False) else ""),
+                         category="time")
 
     def print_network_status(self):
         """Outputs name defined in name-mapping dict (not SSID).
@@ -177,24 +329,317 @@ class OutputHandler(object):
         else:
             self.print_info("No network connection.")
 
-    def print_temp(self, print_str, prompt_user=False):
-        return self._print_and_log("[TEMP]  %s" % print_str, Fore.CYAN, prompt=prompt_user)
+    # Each print_* call also records an event in EventLog. Pass category (e.g. "state", "charge",
+    # "timer", "time", "program") and any keyword fields to make it easy to query later.
+    def print_temp(self, print_str, prompt_user=False, category=None, **fields):
+        return self._print_and_log("[TEMP]  %s" % print_str, Fore.CYAN, prompt=prompt_user,
+                                   level="TEMP", category=category, fields=fields)
 
-    def print_info(self, print_str, prompt_user=False):
-        return self._print_and_log("[INFO]  %s" % print_str, Fore.WHITE, prompt=prompt_user)
+    def print_info(self, print_str, prompt_user=False, category=None, **fields):
+        return self._print_and_log("[INFO]  %s" % print_str, Fore.WHITE, prompt=prompt_user,
+                                   level="INFO", category=category, fields=fields)
 
-    def print_debug(self, print_str, prompt_user=False):
-        return self._print_and_log("[DEBUG] %s" % print_str, Fore.WHITE, Style.DIM, prompt=prompt_user)
+    def print_debug(self, print_str, prompt_user=False, category=None, **fields):
+        return self._print_and_log("[DEBUG] %s" % print_str, Fore.WHITE, Style.DIM, prompt=prompt_user,
+                                   level="DEBUG", category=category, fields=fields)
 
-    def print_warn(self, print_str, prompt_user=False):
-        return self._print_and_log("[WARN]  %s" % print_str, Fore.YELLOW, prompt=prompt_user)
+    def print_warn(self, print_str, prompt_user=False, category=None, **fields):
+        return self._print_and_log("[WARN]  %s" % print_str, Fore.YELLOW, prompt=prompt_user,
+                                   level="WARN", category=category, fields=fields)
 
-    def print_err(self, print_str, prompt_user=False):
-        return self._print_and_log("[ERROR] %s" % print_str, Fore.RED, prompt=prompt_user)
+    def print_err(self, print_str, prompt_user=False, category=None, **fields):
+        return self._print_and_log("[ERROR] %s" % print_str, Fore.RED, prompt=prompt_user,
+                                   level="ERROR", category=category, fields=fields)
 
     def print_exit(self, error_msg):
-        self.print_err(error_msg)
-        self.print_debug("[PID %d killed]" % os.getpid())
+        self.print_err(error_msg, category="program")
+        self.print_debug("[PID %d killed]" % os.getpid(), category="program", pid=os.getpid())
+
+
+class EventLog(object):
+    EVENT_LEVELS = ["DEBUG", "TEMP", "INFO", "WARN", "ERROR"]
+
+    def __init__(self, db_path=None):
+        """Indexed store of typed event records (level, category, fields) mirroring log-file entries.
+        Kept separate from datalog DB so it isn't purged w/ sensor data. Joinable w/ it by time (see query()).
+        """
+        self.db_path = db_path if db_path is not None else EVENT_LOG_PATH
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.sql_conn = sqlite3.connect(self.db_path, check_same_thread=False) # StatusServer threads may log.
+        self.lock = threading.Lock()
+        self.sql_conn.executescript("""CREATE TABLE IF NOT EXISTS events (
+                                           id INTEGER PRIMARY KEY,
+                                           Timestamp TEXT,
+                                           time_valid BOOL,
+                                           pid INTEGER,
+                                           level TEXT,
+                                           category TEXT,
+                                           message TEXT,
+                                           fields TEXT
+                                       );
+                                       CREATE INDEX IF NOT EXISTS events_time ON events (Timestamp);
+                                       CREATE INDEX IF NOT EXISTS events_category_time ON events (category, Timestamp);
+                                       CREATE INDEX IF NOT EXISTS events_level_time ON events (level, Timestamp);
+                                    """)
+        self.pid = os.getpid()
+        self.last_commit_time = time.monotonic()
+
+    def add(self, timestamp_str, time_valid, level, category, message, fields=None):
+        """Timestamp kept even if time not valid (like log file) - time_valid column flags it.
+        Not committed until WARN/ERROR event, EVENT_LOG_COMMIT_INTERVAL_SEC elapsed, or commit() called.
+        Never raises (logging must not take down control loop).
+        """
+        fields_str = json.dumps(fields, default=str) if fields else None
+        try:
+            with self.lock:
+                self.sql_conn.execute("INSERT INTO events (Timestamp, time_valid, pid, level, category, message, fields) "
+                                      "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                      (timestamp_str, time_valid, self.pid, level, category or "general",
+                                       message, fields_str))
+                if (level in ["WARN", "ERROR"]
+                        or time.monotonic() - self.last_commit_time >= EVENT_LOG_COMMIT_INTERVAL_SEC):
+                    self._commit()
+        except sqlite3.Error:
+            pass
+
+    def commit(self):
+        """Never raises. No-op (no disk write) if nothing added since last commit.
+        """
+        try:
+            with self.lock:
+                self._commit()
+        except sqlite3.Error:
+            pass
+
+    def _commit(self):
+        self.sql_conn.commit()
+        self.last_commit_time = time.monotonic()
+
+    def query(self, start=None, end=None, categories=None, min_level=None, contains=None,
+              valid_only=True, data_log_path=None, limit=None):
+        """Returns list of event dicts (fields decoded) in time order.
+        start/end are datetime objects or SQL-format strings (end exclusive).
+        If data_log_path given, each event also gets first sensor sample from same second (LEFT JOIN).
+        """
+        conditions, params = [], []
+        for bound, op in [(start, ">="), (end, "<")]:
+            if bound is not None:
+                if isinstance(bound, dt.datetime):
+                    bound = bound.strftime(DATETIME_FORMAT_SQL)
+                conditions.append("e.Timestamp %s ?" % op)
+                params.append(bound)
+        if categories:
+            conditions.append("e.category IN (%s)" % ", ".join(["?"] * len(categories)))
+            params += list(categories)
+        if min_level is not None:
+            levels = self.EVENT_LEVELS[self.EVENT_LEVELS.index(min_level):]
+            conditions.append("e.level IN (%s)" % ", ".join(["?"] * len(levels)))
+            params += levels
+        if contains is not None:
+            conditions.append("e.message LIKE ?")
+            params.append("%%%s%%" % contains)
+        if valid_only:
+            conditions.append("e.time_valid = 1")
+        where_str = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        limit_str = ("LIMIT %d" % limit) if limit is not None else ""
+
+        columns = "e.Timestamp, e.time_valid, e.pid, e.level, e.category, e.message, e.fields"
+        joins = ""
+        if data_log_path is not None:
+            self.sql_conn.execute("ATTACH ? AS dl", (data_log_path,))
+            columns += ", v.Vmain_raw, v.Vaux_raw, c.charge_enable, c.charge_dir, c.charge_current"
+            # Datalog Timestamp is epoch ms (DataLogger). Event's local-time second -> ms range.
+            event_ms = "(CAST(strftime('%s', e.Timestamp, 'utc') AS INTEGER) * 1000)"
+            joins = f"""LEFT JOIN dl.voltages AS v ON v.Timestamp = (SELECT MIN(Timestamp) FROM dl.voltages
+                                                                     WHERE Timestamp >= {event_ms}
+                                                                       AND Timestamp < {event_ms} + 1000)
+                        LEFT JOIN dl.charging AS c ON c.Timestamp = v.Timestamp"""
+        sql_stmt = f"""SELECT {columns}
+                       FROM events AS e
+                       {joins}
+                       {where_str}
+                       ORDER BY e.Timestamp, e.id
+                       {limit_str};
+                    """
+        try:
+            cursor = self.sql_conn.execute(sql_stmt, params)
+            col_names = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+        finally:
+            if data_log_path is not None:
+                self.sql_conn.execute("DETACH dl")
+        events = []
+        for row in rows:
+            event = dict(zip(col_names, row))
+            event["fields"] = json.loads(event["fields"]) if event["fields"] else {}
+            events.append(event)
+        return events
+
+
+class LogArchiver(object):
+    HEADER_REGEX = re.compile(r"^(\d{8}T\d{6}|-{8}-\d{6}) \[(\w+)\]")
+
+    def __init__(self, Output, log_dir=None):
+        """Compresses completed daily log files (YYYYMMDD.log -> YYYYMMDD.log.gz) w/ JSON index
+        (YYYYMMDD.log.gz.idx). Each block of entries (same hour, up to LOG_COMPRESS_BLOCK_MAX_BYTES)
+        is its own gzip member, so file still works w/ zcat/zgrep, but a reader can seek to and
+        decompress only blocks in the time range and at the levels it wants (see iter_blocks()).
+        If entries get appended to an already-compressed day, they're added as more blocks.
+        """
+        self.Output = Output
+        self.log_dir = log_dir if log_dir is not None else LOG_DIR
+        self.thread = None
+
+    @classmethod
+    def parse_header(cls, line):
+        """Returns (datetime or None if logged before time valid, level) for first line of an entry.
+        Returns None for continuation lines (e.g., traceback) and unstamped lines.
+        """
+        match = cls.HEADER_REGEX.match(line)
+        if match is None:
+            return None
+        stamp, level = match.groups()
+        return (None if stamp.startswith("-") else dt.datetime.strptime(stamp, DATETIME_FORMAT)), level
+
+    @staticmethod
+    def get_index_path(gz_path):
+        return gz_path + ".idx"
+
+    @classmethod
+    def read_index(cls, gz_path):
+        with open(cls.get_index_path(gz_path), "r") as fd:
+            return json.load(fd)
+
+    def _split_blocks(self, log_path):
+        """Returns list of (raw bytes, index entry w/o offsets).
+        """
+        blocks = []
+        block_lines, block_key, block_info = [], None, None
+        block_bytes = 0 # Running total of block_lines lengths.
+        with open(log_path, "rb") as fd:
+            for line in fd:
+                header = self.parse_header(line.decode(errors="replace"))
+                if header is not None:
+                    line_time, level = header
+                    # Entries before time valid kept together (hour unknown).
+                    key = line_time.strftime("%Y%m%d%H") if line_time is not None else None
+                    if block_lines and (key != block_key or block_bytes >= LOG_COMPRESS_BLOCK_MAX_BYTES):
+                        blocks.append((b"".join(block_lines), block_info))
+                        block_lines, block_bytes = [], 0
+                    if not block_lines:
+                        block_key = key
+                        block_info = {"first_time": None, "last_time": None, "levels": {}}
+                    if line_time is not None:
+                        block_info["first_time"] = block_info["first_time"] or line_time.strftime(DATETIME_FORMAT_SQL)
+                        block_info["last_time"] = line_time.strftime(DATETIME_FORMAT_SQL)
+                    block_info["levels"][level] = block_info["levels"].get(level, 0) + 1
+                elif not block_lines:
+                    block_key = None # Unstamped lines at start of file (e.g., launcher.sh messages).
+                    block_info = {"first_time": None, "last_time": None, "levels": {}}
+                block_lines.append(line)
+                block_bytes += len(line)
+        if block_lines:
+            blocks.append((b"".join(block_lines), block_info))
+        return blocks
+
+    def compress(self, log_path):
+        """Returns (uncompressed bytes, compressed bytes) added. Removes log_path when done.
+        """
+        gz_path = log_path + ".gz"
+        if os.path.exists(gz_path):
+            index = self.read_index(gz_path)
+            with open(gz_path, "rb") as fd:
+                compressed = [fd.read()]
+        else:
+            index = {"source": os.path.basename(log_path), "raw_size": 0, "blocks": []}
+            compressed = []
+        offset = sum(len(data) for data in compressed)
+        raw_bytes, compressed_bytes = 0, 0
+        for data, block_info in self._split_blocks(log_path):
+            member = gzip.compress(data, compresslevel=LOG_COMPRESS_LEVEL, mtime=0)
+            block_info.update({"offset": offset, "length": len(member),
+                               "raw_offset": index["raw_size"], "raw_length": len(data)})
+            index["blocks"].append(block_info)
+            compressed.append(member)
+            offset += len(member)
+            index["raw_size"] += len(data)
+            raw_bytes += len(data)
+            compressed_bytes += len(member)
+
+        # Both files replaced atomically, index last. Log file only removed once both in place.
+        with open(gz_path + ".tmp", "wb") as fd:
+            fd.writelines(compressed)
+        with open(self.get_index_path(gz_path) + ".tmp", "w") as fd:
+            json.dump(index, fd)
+        os.replace(gz_path + ".tmp", gz_path)
+        os.replace(self.get_index_path(gz_path) + ".tmp", self.get_index_path(gz_path))
+        os.remove(log_path)
+        return raw_bytes, compressed_bytes
+
+    def get_completed_logs(self):
+        """Log files from days before today. Empty if sys time not valid (today unknown).
+        """
+        if not self.Output.is_time_valid():
+            return []
+        today = self.Output.Clock.get_time_now(string_format=DATE_FORMAT)
+        log_names = [name for name in os.listdir(self.log_dir)
+                     if re.match(LOG_FILE_REGEX, name) and re.match(LOG_FILE_REGEX, name).group(1) < today]
+        return [os.path.join(self.log_dir, name) for name in sorted(log_names)]
+
+    def compress_completed(self):
+        """Returns number of log files compressed.
+        """
+        num_compressed = 0
+        for log_path in self.get_completed_logs():
+            start_time = time.monotonic()
+            try:
+                raw_bytes, compressed_bytes = self.compress(log_path)
+            except (OSError, ValueError) as e:
+                self.Output.print_err("Log compression of %s failed (%r)." % (os.path.basename(log_path), e),
+                                      category="program")
+                continue
+            num_compressed += 1
+            self.Output.print_debug("Compressed %s: %d kB -> %d kB in %.1fs."
+                                    % (os.path.basename(log_path), raw_bytes/1024, compressed_bytes/1024,
+                                       time.monotonic() - start_time),
+                                    category="program", raw_bytes=raw_bytes, compressed_bytes=compressed_bytes)
+        return num_compressed
+
+    def _run(self):
+        try:
+            # Lowest priority. PRIO_PROCESS w/ a thread ID only affects that thread on Linux.
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError:
+            pass
+        while True:
+            self.compress_completed()
+            time.sleep(LOG_COMPRESS_CHECK_SEC)
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, name="log_archiver", daemon=True)
+            self.thread.start()
+
+    @classmethod
+    def iter_blocks(cls, gz_path, start=None, end=None, min_level=None, include_invalid_time=False):
+        """Yields decompressed text of only blocks that may hold entries in [start, end) (datetimes)
+        at min_level or above. Blocks logged before time valid only included if include_invalid_time.
+        """
+        index = cls.read_index(gz_path)
+        levels = (EventLog.EVENT_LEVELS[EventLog.EVENT_LEVELS.index(min_level):] if min_level is not None
+                  else None)
+        with open(gz_path, "rb") as fd:
+            for block in index["blocks"]:
+                if block["first_time"] is None:
+                    if not include_invalid_time:
+                        continue
+                elif ((end is not None and block["first_time"] >= end.strftime(DATETIME_FORMAT_SQL))
+                        or (start is not None and block["last_time"] < start.strftime(DATETIME_FORMAT_SQL))):
+                    continue
+                if levels is not None and not any(level in levels for level in block["levels"]):
+                    continue
+                fd.seek(block["offset"])
+                yield gzip.decompress(fd.read(block["length"])).decode(errors="replace")
 
 
 class TimeKeeper(object):
@@ -202,21 +647,29 @@ class TimeKeeper(object):
         """Should always be instantiated by OutputHandler object.
         """
         self.Output = Output
+        self.setup_done = False
         self.state_change_delay_time = STATE_CHANGE_DELAY_SEC # default able to be overridden
 
         self.state_change_timer_start = None
         self.shutdown_timer_start = None
         self.charge_start_time = None
+        # Monotonic-clock copies of above start times. Unaffected by RTC/NTP time jumps, so used
+        # when checkpointing timer state across program restarts.
+        self.timer_starts_mono = {"state_change": None, "shutdown": None, "charge": None}
+        # Set by is_ntp_syncd() (may run on maintenance thread). Timers only re-based by thread that runs them.
+        self.timer_rebase_pending = False
 
-        self.sys_time_valid = False
-        self.is_ntp_syncd(restart_on_sync=False, log=False) # Can't log yet because Output object may not be  fully instantiated.
+        self.network_name_checked = None # (monotonic time, name)
+        self.sys_time_valid = self._query_ntp_syncd() # Can't log yet because Output object may not be fully instantiated.
 
         self.rtc = None
         self.rtc_time_valid = False
+        self.rtc_anchor = None # (datetime, monotonic time) - see _add_rtc_subsecond()
         self.set_up_rtc()
         # Will default to sys time if RTC check fails.
         # Since there's no log file yet, caller (whatever's creating this class instance)
         # should call check_rtc() method again w/ logging after time source established.
+        self.setup_done = True
 
     def is_time_valid(self, log=False):
         if not self.rtc_time_valid:
@@ -254,7 +707,7 @@ class TimeKeeper(object):
         if self.rtc is None:
             self.rtc_time_valid = False
             if log:
-                self.Output.print_warn("No RTC present.")
+                self.Output.print_warn("No RTC present.", category="time")
             self.wait_for_ntp_update(log=False)
             return
 
@@ -265,7 +718,7 @@ class TimeKeeper(object):
             if log:
                 self.Output.print_err(f"RTC time behind sys time {rtc_lag.total_seconds():.0f}s, "
                                        "over {RTC_LAG_THRESHOLD_SEC}s threshold. "
-                                       "Falling back to sys time.")
+                                       "Falling back to sys time.", category="time", rtc_lag_s=rtc_lag.total_seconds())
             self.wait_for_ntp_update(log=False)
 
         elif -rtc_lag > dt.timedelta(weeks=6):
@@ -277,18 +730,18 @@ class TimeKeeper(object):
                 # Update it from system time, which requires
                 # waiting for network connection and NTP sync.
                 if log:
-                    self.Output.print_err("RTC time plausibility check failed.")
+                    self.Output.print_err("RTC time plausibility check failed.", category="time")
                 self.update_rtc(force=True, wait=True, log=log)
                 # Will succeed only if NTP-sync acquired already. Else, will fall back to sys time.
                 if log and not self.rtc_time_valid:
-                    self.Output.print_err("Falling back to sys time.")
+                    self.Output.print_err("Falling back to sys time.", category="time")
             elif log:
                 self.Output.print_err("RTC time plausibility check failed."
-                                      "Falling back to sys time.")
+                                      "Falling back to sys time.", category="time")
         else:
             self.rtc_time_valid = True
             if log:
-                self.Output.print_info("Using RTC time.")
+                self.Output.print_info("Using RTC time.", category="time")
 
     def get_rtc_lag(self):
         """Returns datetime.timedelta object.
@@ -314,11 +767,13 @@ class TimeKeeper(object):
                 or ( self.get_rtc_lag() > dt.timedelta(seconds=RTC_LAG_THRESHOLD_SEC))
                 or (-self.get_rtc_lag() > dt.timedelta(seconds=RTC_LAG_THRESHOLD_SEC))):
                 prev_time = self.get_time_now(source="rtc")
-                self.rtc.datetime = time.localtime(dt.datetime.now().timestamp())
+                with Controller.hw_lock:
+                    self.rtc.datetime = time.localtime(dt.datetime.now().timestamp())
                 new_time = self.get_time_now(source="rtc")
                 if log:
                     self.Output.print_debug("Updated RTC time (%s -> %s) from NTP-syncd sys time."
-                                            % (prev_time, new_time))
+                                            % (prev_time, new_time),
+                                            category="time", prev_time=prev_time, new_time=new_time)
                 # Now need to confirm setting is valid and set self.rtc_time_valid to True.
                 self.check_rtc(adjust=False, log=log)
                 if restart_on_sync:
@@ -327,7 +782,7 @@ class TimeKeeper(object):
                 self.Output.print_rtc_and_sys_time("No RTC update needed.")
 
         elif log:
-            self.Output.print_debug("Not updating RTC time since sys time not syncd with NTP.")
+            self.Output.print_debug("Not updating RTC time since sys time not syncd with NTP.", category="time")
 
     def get_time_now(self, string_format=None, source=None):
         """Returns date and time as datetime object or
@@ -342,7 +797,11 @@ class TimeKeeper(object):
         elif source == "sys":
             datetime_now = dt.datetime.now()
         elif source == "rtc" or self.rtc_time_valid:
-            datetime_now = dt.datetime.fromtimestamp(time.mktime(self.rtc.datetime))
+            with Controller.hw_lock:
+                rtc_time = self.rtc.datetime
+            datetime_now = dt.datetime.fromtimestamp(time.mktime(rtc_time))
+            if source is None:
+                datetime_now = self._add_rtc_subsecond(datetime_now)
         else:
             # Fall back to sys time if rtc time invalid.
             datetime_now = dt.datetime.now()
@@ -352,10 +811,29 @@ class TimeKeeper(object):
         else:
             return datetime_now
 
-    def get_network_name(self, log=False):
+    def _add_rtc_subsecond(self, rtc_datetime):
+        """RTC only has whole seconds, which would collapse sub-second datalog samples onto one timestamp.
+        Sub-second part taken from monotonic clock, re-anchored whenever it drifts outside RTC's current second.
+        """
+        time_now_mono = time.monotonic()
+        if self.rtc_anchor is not None:
+            datetime_est = self.rtc_anchor[0] + dt.timedelta(seconds=time_now_mono - self.rtc_anchor[1])
+            if rtc_datetime <= datetime_est < rtc_datetime + dt.timedelta(seconds=1):
+                return datetime_est
+            datetime_est = min(max(datetime_est, rtc_datetime), rtc_datetime + dt.timedelta(milliseconds=999))
+        else:
+            datetime_est = rtc_datetime
+        self.rtc_anchor = (datetime_est, time_now_mono)
+        return datetime_est
+
+    def get_network_name(self, log=False, max_age_s=0):
         """Uses local file w/ SSID->name dict.
         Returns name of network as string, or None if not connected to any.
+        Pass max_age_s to reuse previous result if recent enough (avoids forking iwgetid every sample).
         """
+        if (max_age_s and self.network_name_checked is not None
+                and (time.monotonic() - self.network_name_checked[0]) < max_age_s):
+            return self.network_name_checked[1]
         result = subprocess.run(["/usr/sbin/iwgetid", "-r"], capture_output=True, text=True)
         network_ssid = result.stdout.strip()
         # Can take a few seconds for network name to be returned after connection,
@@ -363,21 +841,25 @@ class TimeKeeper(object):
         # https://forums.raspberrypi.com/viewtopic.php?t=340058
         if log:
             self.Output.print_temp("Network SSID returned by iwgetid: %s" % network_ssid)
-        return stored_ssid_mapping_dict.get(network_ssid)
+        network_name = stored_ssid_mapping_dict.get(network_ssid)
+        self.network_name_checked = (time.monotonic(), network_name)
+        return network_name
 
-    def is_ntp_syncd(self, restart_on_sync=False, log=False):
-        """If restart_on_sync is True, will throw exception to restart program to reset
-        issues AutomationHAT gets into when sys time suddenly jumps forward.
-        """
-        # ntplib.NTPClient().request("pool.ntp.org", timeout=NTP_WAIT_TIME_SEC)
+    def _query_ntp_syncd(self):
+        # import ntplib; ntplib.NTPClient().request("pool.ntp.org", timeout=NTP_WAIT_TIME_SEC)
         result = subprocess.run(["/usr/bin/timedatectl", "show", "--property=NTPSynchronized", "--value"],
                                 capture_output=True, text=True)
-        updated = (result.stdout.strip() == "yes")
+        return (result.stdout.strip() == "yes")
+
+    def is_ntp_syncd(self, log=False):
+        """First sync seen while running is handled in-process (see _handle_sys_time_sync()).
+        """
+        updated = self._query_ntp_syncd()
 
-        if updated and not self.sys_time_valid and restart_on_sync:
+        if updated and not self.sys_time_valid:
             # First time seeing NTP sync
-            self.sys_time_valid = True
-            Controller().exit_program(SysTimeUpdateException, "NTP sync acquired. Restarting program.")
+            self.sys_time_valid = True # Before logging, which checks time validity.
+            self._handle_sys_time_sync()
         elif updated:
             self.sys_time_valid = True
             if log:
@@ -385,23 +867,49 @@ class TimeKeeper(object):
                                                    % (" (connected to %s)"
                                         % (self.get_network_name(log=False)) if self.get_network_name(log=log) else ""))
         elif log:
-            self.Output.print_warn("System date/time not yet updated since last power loss.")
+            self.Output.print_warn("System date/time not yet updated since last power loss.", category="time")
 
         return updated
 
-    def wait_for_ntp_update(self, log=False):
-        # Provide buffer time for OS to update sys time.
+    def _handle_sys_time_sync(self):
+        """Sys time may have just jumped (if it was time source, i.e. no valid RTC). Timers re-based on
+        their monotonic elapsed times so none fire early or late - by control thread, in
+        apply_pending_rebase(). Datalog rows held while time invalid are stamped on next insert
+        (DataLogger.stamp_untimed()). AutomationHAT faults the jump may cause are recovered by
+        event_loop.supervise().
+        """
+        if not self.setup_done:
+            return # Synced during startup. Nothing timed yet (and Output can't log yet).
+        self.timer_rebase_pending = True
+        self.Output.print_info("NTP sync acquired. Sys time now %s%s."
+                               % (dt.datetime.now().strftime(DATETIME_FORMAT),
+                                  "" if self.rtc_time_valid else " (was time source - timers to be re-based)"),
+                               category="time")
+
+    def apply_pending_rebase(self):
+        """Call from thread that starts/stops timers (event loop, or async runtime's control thread)
+        before evaluating them, so re-basing never races a timer being started or stopped.
+        """
+        if self.timer_rebase_pending:
+            self.timer_rebase_pending = False
+            self.restore_timer_state(self.get_timer_state())
+
+    def wait_for_ntp_update(self, log=False, progress_fxn=None):
+        # Provide buffer time for OS to update sys time. progress_fxn (if any) called while waiting.
         if log:
-            self.Output.print_debug("Checking if sys date/time synchronized to NTP server...")
+            self.Output.print_debug("Checking if sys date/time synchronized to NTP server...", category="time")
 
         start_time = self.get_time_now()
         while not self._has_time_elapsed(start_time, NTP_WAIT_TIME_SEC):
             if self.is_ntp_syncd(log=False):
                 break
+            if progress_fxn is not None:
+                progress_fxn()
         self.is_ntp_syncd(log=log) # Call again just for output
 
     def set_charge_start_time(self):
         self.charge_start_time = self.get_time_now()
+        self.timer_starts_mono["charge"] = time.monotonic()
 
     def is_sys_voltage_stable(self):
         if self.charge_start_time is None:
@@ -426,9 +934,11 @@ class TimeKeeper(object):
         """
         Controller().turn_off_all_ind_leds()
         self.shutdown_timer_start = self.get_time_now()
+        self.timer_starts_mono["shutdown"] = time.monotonic()
         if log:
             self.Output.print_debug("RPi shutdown timer (%ds) started at %s."
-                                    % (RPI_SHUTDOWN_DELAY_SEC, self.shutdown_timer_start.strftime("%H:%M:%S")))
+                                    % (RPI_SHUTDOWN_DELAY_SEC, self.shutdown_timer_start.strftime("%H:%M:%S")),
+                                    category="timer", timer="shutdown", delay_s=RPI_SHUTDOWN_DELAY_SEC)
         time.sleep(1) # Avoid catching multiple state transitions during some transient condition not yet characterized.
 
     def is_shutdown_pending(self):
@@ -439,9 +949,10 @@ class TimeKeeper(object):
 
     def stop_shutdown_timer(self, log=True):
         self.shutdown_timer_start = None
+        self.timer_starts_mono["shutdown"] = None
         Controller().turn_off_all_ind_leds()
         if log:
-            self.Output.print_debug("RPi shutdown timer stopped.")
+            self.Output.print_debug("RPi shutdown timer stopped.", category="timer", timer="shutdown")
 
     def has_shutdown_delay_elapsed(self, log=False):
         """Evaluates if shutdown grace period has elapsed.
@@ -454,14 +965,16 @@ class TimeKeeper(object):
                 Controller().toggle_red_led()
             is_time_up = self._has_time_elapsed(self.shutdown_timer_start, RPI_SHUTDOWN_DELAY_SEC)
             if is_time_up and log:
-                self.Output.print_debug("Shutdown-delay time has elapsed.")
+                self.Output.print_debug("Shutdown-delay time has elapsed.", category="timer", timer="shutdown")
             return is_time_up
 
-    def start_charge_delay_timer(self, state_change_desc, delay_s=STATE_CHANGE_DELAY_SEC, log=True):
+    def start_charge_delay_timer(self, state_change_desc, delay_s=None, log=True):
         """If called while timer already running, timer restarts iff result is extended delay.
         If delay_s parameter specified (int representing seconds), overrides default delay
         unless it would shorten delay time. Longer delay takes precedence.
         """
+        if delay_s is None:
+            delay_s = STATE_CHANGE_DELAY_SEC # Looked up at call time so reloaded value applies.
 
         if (self.state_change_timer_start is None
               or (    self.get_time_now() + dt.timedelta(seconds=delay_s))
@@ -469,17 +982,21 @@ class TimeKeeper(object):
             self.state_change_delay_time = delay_s
             Controller().turn_off_all_ind_leds()
             self.state_change_timer_start = self.charge_start_time = self.get_time_now()
+            self.timer_starts_mono["state_change"] = self.timer_starts_mono["charge"] = time.monotonic()
             if log:
                 self.Output.print_debug("Charge delay of %ds started (%s) at %s."
                                         % (self.state_change_delay_time,
                                            state_change_desc,
-                                           self.state_change_timer_start.strftime("%H:%M:%S")))
+                                           self.state_change_timer_start.strftime("%H:%M:%S")),
+                                        category="timer", timer="charge_delay",
+                                        delay_s=self.state_change_delay_time, reason=state_change_desc)
             time.sleep(1) # Avoid catching multiple state transitions during voltage ripple.
         elif log:
             self.Output.print_debug("New charge delay of %ds ignored (%s) - inside existing %ds delay started at %s."
                                     % (delay_s, state_change_desc,
                                        self.state_change_delay_time,
-                                       self.state_change_timer_start.strftime("%H:%M:%S")))
+                                       self.state_change_timer_start.strftime("%H:%M:%S")),
+                                    category="timer", timer="charge_delay", delay_s=delay_s, reason=state_change_desc)
 
     def has_charge_delay_time_elapsed(self):
         """Evaluates if state-delay buffer time has elapsed since last state change.
@@ -497,12 +1014,49 @@ class TimeKeeper(object):
             is_time_up = self._has_time_elapsed(self.state_change_timer_start, self.state_change_delay_time)
             if is_time_up:
                 self.state_change_timer_start = None
+                self.timer_starts_mono["state_change"] = None
                 Controller().turn_off_all_ind_leds()
             elif self.get_seconds() % 2 == 0:
                 Controller().toggle_green_led()
                 Controller().light_blue_led(brightness=int(Controller().is_green_led_lit()))
             return (is_time_up, is_time_up)
 
+    def is_charge_delay_pending(self):
+        if self.state_change_timer_start is None:
+            return False
+        else:
+            return True
+
+    def get_timer_state(self):
+        """Returns dict of seconds elapsed on each running timer (None if not running) for checkpointing.
+        Uses monotonic clock, so no RTC access needed and unaffected by sys-time jumps.
+        """
+        mono_now = time.monotonic()
+        timer_state = {name: (None if start is None else mono_now - start)
+                       for name, start in self.timer_starts_mono.items()}
+        timer_state["state_change_delay_time"] = self.state_change_delay_time
+        return timer_state
+
+    def restore_timer_state(self, timer_state, downtime_s=0):
+        """Restarts timers as if they had kept running through program restart.
+        downtime_s is time elapsed between checkpoint save and restore.
+        """
+        time_now = self.get_time_now()
+        mono_now = time.monotonic()
+        start_times = {}
+        for name in self.timer_starts_mono:
+            if timer_state.get(name) is None:
+                start_times[name] = None
+                self.timer_starts_mono[name] = None
+            else:
+                elapsed_s = timer_state[name] + downtime_s
+                start_times[name] = time_now - dt.timedelta(seconds=elapsed_s)
+                self.timer_starts_mono[name] = mono_now - elapsed_s
+        self.state_change_timer_start = start_times["state_change"]
+        self.shutdown_timer_start = start_times["shutdown"]
+        self.charge_start_time = start_times["charge"]
+        self.state_change_delay_time = timer_state["state_change_delay_time"]
+
     def _get_time_elapsed(self, start_time):
         return (self.get_time_now() - start_time)
 
@@ -514,34 +1068,350 @@ class TimeKeeper(object):
         # https://www.tutorialspoint.com/How-can-we-do-date-and-time-math-in-Python
 
 
+class QueryCache(object):
+    def __init__(self, max_bytes=QUERY_CACHE_MAX_BYTES, cache_dir=None):
+        """LRU cache of query-result dataframes, bounded by total in-memory size.
+        If cache_dir specified, entries also persisted there as pickles and reloaded on miss.
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.entries = collections.OrderedDict() # key -> (dataframe, size in bytes)
+        self.total_bytes = 0
+
+    def _get_pickle_path(self, key):
+        key_hash = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, "%s.pkl" % key_hash)
+
+    def get(self, key):
+        """Returns cached dataframe or None. Caller must not modify returned dataframe.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+        elif self.cache_dir is not None and os.path.exists(self._get_pickle_path(key)):
+            import pandas as pd
+            df = pd.read_pickle(self._get_pickle_path(key))
+            self._add_entry(key, df)
+            return df
+        return None
+
+    def put(self, key, df):
+        self._add_entry(key, df)
+        if self.cache_dir is not None:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            df.to_pickle(self._get_pickle_path(key))
+
+    def _add_entry(self, key, df):
+        num_bytes = int(df.memory_usage(deep=True).sum())
+        if num_bytes > self.max_bytes:
+            return # Would evict everything else. Don't hold in memory.
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (df, num_bytes)
+        self.total_bytes += num_bytes
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self.entries.popitem(last=False) # least recently used
+            self.total_bytes -= evicted_bytes
+
+    def clear(self):
+        """Call when stored rows change. Persisted pickles removed too (keys include data version, so
+        they'd only miss from now on).
+        """
+        self.entries.clear()
+        self.total_bytes = 0
+        if self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
 class DataLogger(object):
-    def __init__(self, Output):
+    def __init__(self, Output, cache_dir=None, db_path=None, purge=True, staging_path=None, progress_fxn=None,
+                 read_only=False):
         """Pass None to DataLogger explicitly to have it instantiate its own Output and not use a log file.
+        Pass cache_dir to persist cached historical query results to disk (for analysis across sessions).
+        Pass db_path to use DB other than DATA_LOG_PATH (e.g., a backup or another vehicle's copy).
+        Pass purge=False to keep rows older than purge_old_data() window (e.g., reading an archive).
+        Pass staging_path to write live rows to that DB instead (see _set_up_staging()).
+        Pass progress_fxn to have it called periodically during long jobs that block caller (startup
+        migration/purge, run_backup()), e.g. to keep systemd watchdog fed.
+        Pass read_only=True to only query DB (e.g., report on live DB while controller writes it). Nothing
+        created, migrated, or purged, so DB must already have epoch-ms tables.
+        Timestamps stored as INTEGER epoch ms (rowid alias, so range scans and MAX() read the table b-tree directly).
         """
         if Output is None:
             Output = OutputHandler(use_log_file=False)
         self.Output = Output
-
-        self.sql_engine = self._create_SQLite_engine()
+        self.db_path = db_path if db_path is not None else DATA_LOG_PATH
+        self.query_cache = QueryCache(cache_dir=cache_dir)
+        self.logging_paused = False # True while sys time invalid (rows held in untimed_rows).
+        self.untimed_rows = collections.deque(maxlen=DATA_LOG_UNTIMED_MAX_ROWS) # (table, monotonic ms, values)
+        self.untimed_dropped = 0
+        self.pending_rows = collections.deque() # (table, params) queued for flush_pending()
+        self.write_behind = False # Set by enable_write_behind()
+        self.last_flush_time = None # monotonic
+        self.progress_fxn = progress_fxn
+        # Held for inserts and checkpoints (ATTACH/DETACH on stage_conn). Callers on db, control, and main
+        # threads (async runtime) could otherwise interleave.
+        self.write_lock = threading.RLock()
+
+        self.sql_conn = self._create_SQLite_conn(read_only=read_only)
+        self.write_conn = self.sql_conn # Inserts
+        self.read_conn = self.sql_conn  # Trailing-window reads
+        self.stage_conn = None
+        self.last_checkpoint_time = None # monotonic
         self.voltage_table = "voltages"
         self.charging_table = "charging"
         self.signals_table = "signals"
+        self.derived_table = "derived"
+
+        if read_only:
+            col_types = {row[1]: row[2] for row in self._query_rows(f"PRAGMA table_info({self.signals_table})")}
+            if col_types.get("Timestamp", "").upper() != "INTEGER":
+                raise DataLoggingError("%s has no epoch-ms datalog tables (open w/o read_only once to migrate)."
+                                       % self.db_path)
+        else:
+            self._create_voltage_table() # idempotent
+            self._create_charging_table() # idempotent
+            self._create_signals_table() # idempotent
+            self._create_derived_table() # idempotent
+            with self._reporting_progress():
+                self._migrate_text_timestamps() # Can take minutes on first start after upgrade.
+        self.table_columns = {table: [row[1] for row in self._query_rows(f"PRAGMA table_info({table})")]
+                              for table in [self.voltage_table, self.charging_table, self.signals_table,
+                                            self.derived_table]}
+        # In-memory liveness record (monotonic time of last row actually inserted, per table).
+        self.last_insert_times = {table: None for table in self.table_columns}
+        self.last_row_ms = {table: None for table in self.table_columns} # For decimation
+        self.last_untimed_ms = {table: None for table in self.table_columns} # monotonic
+        with self._reporting_progress():
+            if purge and not read_only:
+                self.purge_old_data()
+            if staging_path is not None and not read_only:
+                self._set_up_staging(staging_path) # Recovers rows staged before unclean exit.
+        # Raw voltages (epoch ms, value) in trailing window, for filtered columns of derived rows.
+        self.filter_windows = {"Vmain_raw": collections.deque(), "Vaux_raw": collections.deque()}
+        self.latest_derived = None # (epoch ms, {column: value}) for newest sample, even if row decimated
+        self._seed_filter_windows()
+
+    @staticmethod
+    def to_epoch_ms(timestamp):
+        """Naive local datetime (as returned by TimeKeeper.get_time_now()) -> integer epoch ms.
+        """
+        return int(round(timestamp.timestamp() * 1000))
+
+    @staticmethod
+    def get_day_bounds_ms(date_str):
+        """Returns (start, end) epoch ms of local day "YYYY-MM-DD" (end exclusive).
+        """
+        day_start = dt.datetime.fromisoformat(date_str)
+        return (DataLogger.to_epoch_ms(day_start),
+                DataLogger.to_epoch_ms(day_start + dt.timedelta(days=1)))
+
+    @staticmethod
+    def to_datetime_index(epoch_ms_values):
+        """Epoch ms -> naive local-time DatetimeIndex named Timestamp. Vectorized w/ one UTC offset unless
+        range spans DST change.
+        """
+        import pandas as pd
+        epoch_ms_values = pd.Index(epoch_ms_values, dtype="int64")
+        index = pd.to_datetime(epoch_ms_values, unit="ms")
+        if len(index) == 0:
+            return index.rename("Timestamp")
+        start_ms, end_ms = int(epoch_ms_values.min()), int(epoch_ms_values.max())
+        # Offset checked once per day across range (catches two DST changes inside a long range).
+        offsets = {dt.datetime.fromtimestamp(ms / 1000).astimezone().utcoffset()
+                   for ms in [*range(start_ms, end_ms, 24*60*60*1000), end_ms]}
+        if len(offsets) == 1:
+            return (index + offsets.pop()).rename("Timestamp")
+        return pd.DatetimeIndex([dt.datetime.fromtimestamp(ms / 1000) for ms in epoch_ms_values], name="Timestamp")
+
+    def _create_SQLite_conn(self, read_only=False):
+        # Plain sqlite3 connection kept open for life of object (no SQLAlchemy engine/connection overhead per statement).
+        if read_only:
+            return sqlite3.connect("file:%s?mode=ro" % urllib.parse.quote(os.path.abspath(self.db_path)), uri=True)
+        return sqlite3.connect(self.db_path)
+
+    @contextlib.contextmanager
+    def _reporting_progress(self):
+        """Calls progress_fxn (if any) every DATA_LOG_PROGRESS_INTERVAL_OPS while statements run on sql_conn.
+        """
+        if self.progress_fxn is None:
+            yield
+            return
+        def handler():
+            self.progress_fxn()
+            return 0 # Non-zero would abort statement.
+        self.sql_conn.set_progress_handler(handler, DATA_LOG_PROGRESS_INTERVAL_OPS)
+        try:
+            yield
+        finally:
+            self.sql_conn.set_progress_handler(None, 0)
 
-        self._create_voltage_table() # idempotent
-        self._create_charging_table() # idempotent
-        self._create_signals_table() # idempotent
-        self.purge_old_data()
+    def _execute_sql(self, stmt_str, query=False, params=()):
+        """If query is True, returns dataframe (for analysis use).
+        Runtime code should use _query_rows() instead to avoid importing pandas.
+        """
+        if query:
+            import pandas as pd # Deferred - heavy import only needed for analysis.
+            cursor = self.sql_conn.execute(stmt_str, params)
+            data = pd.DataFrame.from_records(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+            if "Timestamp" in data.columns:
+                data.index = self.to_datetime_index(data.pop("Timestamp"))
+            return data
+        else:
+            cursor = self.sql_conn.execute(stmt_str, params)
+            self.sql_conn.commit()
+            return cursor
+
+    def _set_up_staging(self, staging_path):
+        """Open staging DB (tmpfs) for inserts and trailing-window reads. checkpoint() copies its rows to
+        persistent DB. Rows in a staging file that survived (program restart w/o reboot) are recovered
+        first, then staging seeded w/ newest DATA_LOG_STAGING_KEEP_SEC of persistent rows so trailing
+        windows span restart.
+        """
+        # Separate write and read connections, shareable across threads, w/ WAL so reads don't wait on commits.
+        self.stage_conn = sqlite3.connect(staging_path, check_same_thread=False)
+        self.stage_conn.execute("PRAGMA journal_mode=WAL;")
+        self.stage_conn.execute("PRAGMA synchronous=OFF;") # RAM - lost on power loss regardless.
+        for table in self.table_columns:
+            schema_sql = self._query_rows("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                          (table,))[0][0]
+            self.stage_conn.execute(schema_sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        self.stage_conn.commit()
+        self.write_conn = self.stage_conn
+        self.read_conn = sqlite3.connect(staging_path, check_same_thread=False)
+
+        num_recovered = self.checkpoint()
+        if num_recovered:
+            self.Output.print_info("Recovered %d datalog rows from staging DB %s." % (num_recovered, staging_path),
+                                   category="program", rows=num_recovered)
+        latest_ms = self._get_latest_timestamp(self.signals_table)
+        if latest_ms is not None:
+            self.stage_conn.execute("ATTACH ? AS persist", (self.db_path,))
+            try:
+                for table in self.table_columns:
+                    self.stage_conn.execute(f"""INSERT OR IGNORE INTO main.{table}
+                                                SELECT * FROM persist.{table}
+                                                WHERE Timestamp >= ?;
+                                             """, (latest_ms - DATA_LOG_STAGING_KEEP_SEC*1000,))
+                self.stage_conn.commit()
+            finally:
+                self.stage_conn.execute("DETACH persist")
 
-    def _create_SQLite_engine(self):
-        return create_engine("sqlite:///%s" % DATA_LOG_PATH, echo=False)
+    def checkpoint(self):
+        """Copy staged rows to persistent DB in one transaction, then trim staging DB to newest
+        DATA_LOG_STAGING_KEEP_SEC of rows. Queued rows inserted first, so call on exit paths.
+        W/o staging DB, just inserts queued rows. Returns number of rows newly written to persistent DB.
+        """
+        with self.write_lock:
+            return self._checkpoint()
+
+    def _checkpoint(self):
+        num_inserted = self._insert_pending()
+        if self.stage_conn is None:
+            return num_inserted
+        self.last_checkpoint_time = time.monotonic()
+        num_written = None # Set once copy committed.
+        self.stage_conn.execute("ATTACH ? AS persist", (self.db_path,))
+        try:
+            # Rows already in persistent DB (kept for trailing windows) ignored.
+            num_copied = 0
+            for table in self.table_columns:
+                num_copied += self.stage_conn.execute(f"""INSERT OR IGNORE INTO persist.{table}
+                                                          SELECT * FROM main.{table}
+                                                          ORDER BY Timestamp;
+                                                       """).rowcount
+            self.stage_conn.commit()
+            num_written = num_copied
+            latest_ms = self.stage_conn.execute(f"SELECT MAX(Timestamp) FROM main.{self.signals_table};").fetchone()[0]
+            if latest_ms is not None:
+                for table in self.table_columns:
+                    self.stage_conn.execute(f"DELETE FROM main.{table} WHERE Timestamp < ?;",
+                                            (latest_ms - DATA_LOG_STAGING_KEEP_SEC*1000,))
+                self.stage_conn.commit()
+        except sqlite3.Error as e:
+            # e.g., SD card full or read-only. Rows stay staged and are retried at next checkpoint.
+            self.stage_conn.rollback()
+            if num_written is None:
+                num_staged = sum(self.stage_conn.execute(f"SELECT COUNT(*) FROM main.{table};").fetchone()[0]
+                                 for table in self.table_columns)
+                self.Output.print_err("Datalog checkpoint to %s failed (%r). %d rows remain staged in RAM only."
+                                      % (self.db_path, e, num_staged), category="backup", rows_staged=num_staged)
+                return 0
+            self.Output.print_err("Datalog staging trim failed (%r)." % e, category="backup")
+        finally:
+            self.stage_conn.execute("DETACH persist")
+        self.Output.print_debug("Datalog checkpoint: %d rows written in %.2fs."
+                                % (num_written, time.monotonic() - self.last_checkpoint_time),
+                                category="backup", rows=num_written)
+        return num_written
+
+    def enable_write_behind(self):
+        """Leave flush_pending() to caller (e.g., a DB-writer thread) instead of committing in logging
+        thread. DB connection reopened to be shareable across threads (sqlite3 module serializes access),
+        and DB switched to WAL journal so trailing-window reads never wait on a commit in progress.
+        """
+        if self.write_behind:
+            return # Already enabled (e.g., loop resumed after in-process recovery).
+        self.flush_pending()
+        self.write_behind = True
+        if self.stage_conn is not None:
+            return # Staging connections already set up this way.
+        self.sql_conn.close()
+        self.sql_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.sql_conn.execute("PRAGMA journal_mode=WAL;")
+        self.read_conn = self.sql_conn
+        self.write_conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.write_conn.execute("PRAGMA synchronous=NORMAL;") # WAL stays consistent; only fsyncs at checkpoint.
+
+    def commit_if_due(self):
+        """Call after logging each sample. Flushes queued rows if DATA_LOG_COMMIT_INTERVAL_SEC elapsed
+        (every sample when sampling slower than that). No-op w/ write-behind enabled.
+        """
+        if self.write_behind:
+            return
+        if self.last_flush_time is None or time.monotonic() - self.last_flush_time >= DATA_LOG_COMMIT_INTERVAL_SEC:
+            self.flush_pending()
 
-    def _execute_sql(self, stmt_str, query=False):
-        with self.sql_engine.connect() as sql_conn:
-            if query:
-                return pd.read_sql(text(stmt_str), con=sql_conn, index_col="Timestamp", parse_dates=["Timestamp"])
-            else:
-                sql_conn.execute(text(stmt_str))
-                sql_conn.commit()
+    def flush_pending(self):
+        """Insert all queued rows in one transaction, and checkpoint staging DB if due.
+        Returns number of rows inserted.
+        """
+        with self.write_lock:
+            num_inserted = self._insert_pending()
+            if (self.stage_conn is not None
+                  and time.monotonic() - self.last_checkpoint_time >= DATA_LOG_CHECKPOINT_INTERVAL_SEC):
+                self._checkpoint()
+        return num_inserted
+
+    def _insert_pending(self):
+        # Caller holds write_lock.
+        if not self.pending_rows:
+            return 0
+        self.last_flush_time = time.monotonic()
+        rows_by_table = {}
+        while self.pending_rows:
+            table_name, params = self.pending_rows.popleft()
+            rows_by_table.setdefault(table_name, []).append(params)
+        num_inserted = 0
+        for table_name, rows in rows_by_table.items():
+            placeholders = ", ".join(["?"] * len(rows[0]))
+            cursor = self.write_conn.executemany(f"""INSERT OR IGNORE INTO {table_name}
+                                                    VALUES ({placeholders});
+                                                 """, rows)
+            if cursor.rowcount > 0:
+                # Not counted if all ignored as duplicate timestamps (e.g., clock stuck).
+                self.last_insert_times[table_name] = time.monotonic()
+                num_inserted += cursor.rowcount
+        self.write_conn.commit()
+        return num_inserted
+
+    def _query_rows(self, stmt_str, params=()):
+        """Returns list of tuples. Lean query path for use during runtime.
+        """
+        return self.sql_conn.execute(stmt_str, params).fetchall()
 
     def _create_voltage_table(self, force=False):
         if force:
@@ -549,7 +1419,7 @@ class DataLogger(object):
                         """
             self._execute_sql(sql_stmt)
         sql_stmt = f"""CREATE TABLE IF NOT EXISTS {self.voltage_table} (
-                           Timestamp TEXT,
+                           Timestamp INTEGER,
                            Vmain_raw FLOAT,
                            Vaux_raw FLOAT,
                            PRIMARY KEY (Timestamp)
@@ -563,7 +1433,7 @@ class DataLogger(object):
                         """
             self._execute_sql(sql_stmt)
         sql_stmt = f"""CREATE TABLE IF NOT EXISTS {self.charging_table} (
-                            Timestamp TEXT,
+                            Timestamp INTEGER,
                             charge_enable BOOL,
                             charge_dir BOOL,
                             charge_current FLOAT,
@@ -580,7 +1450,7 @@ class DataLogger(object):
             self._execute_sql(sql_stmt)
         # define schema
         sql_stmt = f"""CREATE TABLE IF NOT EXISTS {self.signals_table} (
-                            Timestamp TEXT,
+                            Timestamp INTEGER,
                             enable_sw BOOL,
                             key_ACC BOOL,
                             ecu_W BOOL,
@@ -601,178 +1471,1397 @@ class DataLogger(object):
                     """
         self._execute_sql(sql_stmt)
 
-    def purge_old_data(self, num_days=60):
-        sql_stmt = f"""SELECT Timestamp FROM {self.signals_table}
-                       ORDER BY Timestamp DESC
-                       LIMIT 1;
+    def _create_derived_table(self, force=False):
+        if force:
+            sql_stmt = f"""DROP TABLE IF EXISTS {self.derived_table};
+                        """
+            self._execute_sql(sql_stmt)
+        # Computed from other tables' rows w/ same Timestamp (log_derived() or backfill_derived()).
+        #   charge_current_signed: charge_current * (charge_dir*2 - 1). Positive = fwd (aux -> main).
+        #   charge_power:          charge_current_signed * Vaux_raw (aux side, W)
+        #   V*_filt:               median of raw voltage over trailing DB_SAMPLE_TRAILING_SEC (incl. this row)
+        sql_stmt = f"""CREATE TABLE IF NOT EXISTS {self.derived_table} (
+                            Timestamp INTEGER,
+                            charge_current_signed FLOAT,
+                            charge_power FLOAT,
+                            Vmain_filt FLOAT,
+                            Vaux_filt FLOAT,
+                            PRIMARY KEY (Timestamp)
+                       );
                     """
-        query_return = self._execute_sql(sql_stmt, query=True)
-        if query_return.empty:
+        self._execute_sql(sql_stmt)
+
+    def _migrate_text_timestamps(self):
+        """One-time conversion of tables from older TEXT timestamps ("YYYY-MM-DD HH:MM:SS" local time)
+        to epoch ms. Old table renamed aside first, so an interrupted conversion resumes on next start.
+        """
+        for table, create_fxn in [(self.voltage_table, self._create_voltage_table),
+                                  (self.charging_table, self._create_charging_table),
+                                  (self.signals_table, self._create_signals_table)]:
+            old_table = table + "_text_ts"
+            col_types = {row[1]: row[2] for row in self._query_rows(f"PRAGMA table_info({table})")}
+            if col_types["Timestamp"].upper() == "TEXT":
+                self.Output.print_info("Converting %s table to epoch-ms timestamps." % table, category="program")
+                self._execute_sql(f"ALTER TABLE {table} RENAME TO {old_table};")
+                create_fxn()
+            elif not self._query_rows("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                      (old_table,)):
+                continue
+            columns = ", ".join(col for col in col_types if col != "Timestamp")
+            # 'utc' modifier treats stored text as local time.
+            self._execute_sql(f"""INSERT OR IGNORE INTO {table}
+                                  SELECT CAST(round((julianday(Timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER),
+                                         {columns}
+                                  FROM {old_table}
+                                  ORDER BY Timestamp;
+                               """)
+            self._execute_sql(f"DROP TABLE {old_table};")
+            self.query_cache.clear()
+
+    def purge_old_data(self, num_days=60):
+        latest_ms = self._get_latest_timestamp(self.signals_table)
+        if latest_ms is None:
             return
 
-        latest_date = query_return.index[0].date()
+        latest_date = dt.datetime.fromtimestamp(latest_ms / 1000).date()
         old_date_cutoff = latest_date - dt.timedelta(days=num_days)
-        old_date_cutoff_str = old_date_cutoff.strftime(DATETIME_FORMAT_SQL)
-        date_filter = "WHERE Timestamp < '%s'" % old_date_cutoff_str
-        for table in [self.voltage_table, self.charging_table, self.signals_table]:
+        cutoff_ms = self.get_day_bounds_ms(old_date_cutoff.isoformat())[0]
+        num_deleted = 0
+        for table in self.table_columns:
             sql_stmt = f"""DELETE
                            FROM {table}
-                           {date_filter};
+                           WHERE Timestamp < ?;
                         """
-            self._execute_sql(sql_stmt)
+            num_deleted += self._execute_sql(sql_stmt, params=(cutoff_ms,)).rowcount
+        if num_deleted:
+            self.query_cache.clear()
 
     def _log_data(self, table_name, timestamp_now, values_list):
+        """Returns True if row queued or held for stamping (False if decimated).
+        """
         if not self.Output.is_time_valid():
-            # Don't log data if timestamp not valid.
-            return
-        # Convert True and False to TRUE and FALSE for SQLite to properly interpret as BOOL.
-        # Handle network-name string that needs extra quote wrap.
-        values_str = ", ".join([str(x).upper() if not isinstance(x, str) else "'%s'" % x for x in values_list]).replace("NONE", "NULL")
-        # Since only using one-second precision timestamps, and loop iterations take less
-        # time than that, first insertion w/ a given "seconds" value will be the only one to
-        # persist in table.
-        sql_stmt = f"""INSERT OR IGNORE INTO {table_name}
-                       VALUES ("{timestamp_now.strftime(DATETIME_FORMAT_SQL)}",
-                               {values_str}
-                              );
-                    """
-        self._execute_sql(sql_stmt)
+            # Timestamp not valid. Hold row until it is.
+            self.logging_paused = True
+            return self._hold_untimed(table_name, values_list)
+        self.logging_paused = False
+        if self.untimed_rows:
+            self.stamp_untimed()
+        timestamp_ms = self.to_epoch_ms(timestamp_now)
+        last_row_ms = self.last_row_ms[table_name]
+        if last_row_ms is not None and 0 <= timestamp_ms - last_row_ms < DATA_LOG_MIN_INTERVAL_MS:
+            return False # Decimated. (Clock stepping backward not treated as too soon.)
+        self.last_row_ms[table_name] = timestamp_ms
+        # Bound parameters: sqlite3 stores True/False as 1/0 (BOOL) and None as NULL.
+        # Queued; inserted by flush_pending() (commit_if_due() or write-behind thread). Liveness recorded then.
+        self.pending_rows.append((table_name, [timestamp_ms, *values_list]))
+        return True
+
+    def _hold_untimed(self, table_name, values_list):
+        mono_ms = int(time.monotonic() * 1000)
+        last_untimed_ms = self.last_untimed_ms[table_name]
+        if last_untimed_ms is not None and mono_ms - last_untimed_ms < DATA_LOG_UNTIMED_MIN_INTERVAL_MS:
+            return False
+        self.last_untimed_ms[table_name] = mono_ms
+        if len(self.untimed_rows) == self.untimed_rows.maxlen:
+            self.untimed_dropped += 1 # Oldest row dropped by append below.
+        self.untimed_rows.append((table_name, mono_ms, values_list))
+        return True
+
+    def stamp_untimed(self):
+        """Once time valid, convert monotonic times of rows held while it wasn't to epoch ms (relative to
+        current time) and queue them for insert w/ next flush. Returns number of rows queued.
+        """
+        if not self.untimed_rows:
+            return 0
+        offset_ms = self.to_epoch_ms(self.Output.Clock.get_time_now()) - int(time.monotonic() * 1000)
+        num_stamped = 0
+        while self.untimed_rows:
+            table_name, mono_ms, values_list = self.untimed_rows.popleft()
+            self.pending_rows.append((table_name, [mono_ms + offset_ms, *values_list]))
+            num_stamped += 1
+        self.query_cache.clear()
+        self.Output.print_info("Sys time valid. %d datalog rows held while invalid stamped and queued%s."
+                               % (num_stamped, (" (%d oldest dropped)" % self.untimed_dropped)
+                                               if self.untimed_dropped else ""),
+                               category="time", rows=num_stamped, dropped=self.untimed_dropped)
+        self.untimed_dropped = 0
+        return num_stamped
+
+    def get_lapsed_tables(self, threshold_s):
+        """Returns list of tables w/ no row inserted in past threshold_s seconds (in-memory check, no query).
+        Empty while logging paused for invalid sys time.
+        """
+        if self.logging_paused:
+            return []
+        time_now = time.monotonic()
+        return [table for table, insert_time in self.last_insert_times.items()
+                if insert_time is None or (time_now - insert_time) > threshold_s]
+
+    def _get_time_bounds(self, timestamp_now, trailing_seconds):
+        """Returns (start, end) epoch ms of trailing window (end exclusive, so timestamp_now included).
+        """
+        now_ms = self.to_epoch_ms(timestamp_now)
+        return now_ms - int(round(trailing_seconds * 1000)), now_ms + 1
+
+    def _get_data(self, table_name, timestamp_now, trailing_seconds, column_list, decimate_ms=None):
+        start_ms, end_ms = self._get_time_bounds(timestamp_now, trailing_seconds)
+        return self._get_range(table_name, start_ms, end_ms, column_list, decimate_ms)
 
-    def _get_data(self, table_name, timestamp_now, trailing_seconds, column_list):
+    def _get_range(self, table_name, start_ms, end_ms, column_list, decimate_ms=None):
+        """Rows w/ start_ms <= Timestamp < end_ms. Pass decimate_ms to get only first row in each
+        decimate_ms bucket (e.g., 1000 for one row per second for plotting a day of high-rate data).
+        """
         if column_list is not None:
             cols =  ", ".join(["Timestamp"] + column_list)
         else:
             cols = "*"
 
-        timestamp_trail = timestamp_now - dt.timedelta(seconds=trailing_seconds)
-        timestamp_now_str = timestamp_now.strftime(DATETIME_FORMAT_SQL)
-        timestamp_trail_str = timestamp_trail.strftime(DATETIME_FORMAT_SQL)
-        time_filter = "WHERE Timestamp >= '%s' AND Timestamp <= '%s'" % (timestamp_trail_str, timestamp_now_str)
+        # Range that ends before newest committed sample normally won't change (only appending), so serve from
+        # cache. Key includes range's row count and time span (data version - PK range scan only), so rows later
+        # added to or removed from range (stamped after sys time became valid, backfilled, purged) make it miss,
+        # incl. pickles persisted by an earlier session.
+        data_version = self.sql_conn.execute(f"""SELECT COUNT(*), MIN(Timestamp), MAX(Timestamp)
+                                                 FROM {table_name}
+                                                 WHERE Timestamp >= ? AND Timestamp < ?;
+                                              """, (start_ms, end_ms)).fetchone()
+        cache_key = (table_name, start_ms, end_ms, None if column_list is None else tuple(column_list), decimate_ms,
+                     data_version)
+        cached_data = self.query_cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data.copy()
+
+        if decimate_ms:
+            # Bucketing only reads PK. Selected rows then fetched by rowid.
+            sql_stmt = f"""SELECT {cols}
+                           FROM {table_name}
+                           WHERE Timestamp IN (SELECT MIN(Timestamp)
+                                               FROM {table_name}
+                                               WHERE Timestamp >= ? AND Timestamp < ?
+                                               GROUP BY Timestamp / ?)
+                           ORDER BY Timestamp;
+                        """
+            params = (start_ms, end_ms, int(decimate_ms))
+        else:
+            sql_stmt = f"""SELECT {cols}
+                           FROM {table_name}
+                           WHERE Timestamp >= ? AND Timestamp < ?;
+                        """
+            params = (start_ms, end_ms)
+        data = self._execute_sql(sql_stmt, query=True, params=params)
+        latest_ms = self._get_latest_timestamp(table_name)
+        if latest_ms is not None and end_ms <= latest_ms:
+            self.query_cache.put(cache_key, data.copy())
+        return data
+
+    def _get_latest_timestamp(self, table_name):
+        sql_stmt = f"""SELECT MAX(Timestamp) FROM {table_name};
+                    """
+        return self._query_rows(sql_stmt)[0][0]
 
-        sql_stmt = f"""SELECT {cols}
+    def _get_values(self, table_name, timestamp_now, trailing_seconds, column):
+        """Runtime counterpart to _get_data(). Returns list of values for single column
+        without building a dataframe. Includes rows still queued for insert.
+        """
+        start_ms, end_ms = self._get_time_bounds(timestamp_now, trailing_seconds)
+        sql_stmt = f"""SELECT {column}
                        FROM {table_name}
-                       {time_filter};
+                       WHERE Timestamp >= ? AND Timestamp < ?;
                     """
-        return self._execute_sql(sql_stmt, query=True)
+        values = [row[0] for row in self.read_conn.execute(sql_stmt, (start_ms, end_ms)).fetchall()]
+        # Read DB first - row flushed in between then missed rather than counted twice.
+        col_index = self.table_columns[table_name].index(column)
+        values += [params[col_index] for queued_table, params in list(self.pending_rows)
+                   if queued_table == table_name and start_ms <= params[0] < end_ms]
+        return values
 
     def log_voltages(self, timestamp_now, values_list):
         self._log_data(self.voltage_table, timestamp_now, values_list)
 
-    def get_voltages(self, timestamp_now, trailing_seconds, column_list=None):
-        return self._get_data(self.voltage_table, timestamp_now, trailing_seconds, column_list)
+    def get_voltages(self, timestamp_now, trailing_seconds, column_list=None, decimate_ms=None):
+        return self._get_data(self.voltage_table, timestamp_now, trailing_seconds, column_list, decimate_ms)
+
+    def get_voltage_values(self, timestamp_now, trailing_seconds, column):
+        return self._get_values(self.voltage_table, timestamp_now, trailing_seconds, column)
 
     def log_charging(self, timestamp_now, values_list):
         self._log_data(self.charging_table, timestamp_now, values_list)
 
-    def get_charging(self, timestamp_now, trailing_seconds, column_list=None, signed_charge_dir=False):
-        charge_data = self._get_data(self.charging_table, timestamp_now, trailing_seconds, column_list)
+    def get_charging(self, timestamp_now, trailing_seconds, column_list=None, signed_charge_dir=False, decimate_ms=None):
+        charge_data = self._get_data(self.charging_table, timestamp_now, trailing_seconds, column_list, decimate_ms)
         if signed_charge_dir:
-            charge_data["charge_current"] = charge_data["charge_current"] * (charge_data["charge_dir"] - 1/2)*2
+            # Stored signed current. Rows not yet backfilled computed here.
+            signed = self.get_derived(timestamp_now, trailing_seconds, ["charge_current_signed"], decimate_ms)
+            charge_data["charge_current"] = (signed["charge_current_signed"].reindex(charge_data.index)
+                                             .fillna(charge_data["charge_current"] * (charge_data["charge_dir"] - 1/2)*2))
         return charge_data
 
+    def get_charging_values(self, timestamp_now, trailing_seconds, column):
+        return self._get_values(self.charging_table, timestamp_now, trailing_seconds, column)
+
+    def _seed_filter_windows(self):
+        # Continue filters across restart from newest stored rows (staging DB if any).
+        latest_ms = self.read_conn.execute(f"SELECT MAX(Timestamp) FROM {self.voltage_table};").fetchone()[0]
+        if latest_ms is None:
+            return
+        for timestamp_ms, v_main, v_aux in self.read_conn.execute(f"""SELECT Timestamp, Vmain_raw, Vaux_raw
+                                                                      FROM {self.voltage_table}
+                                                                      WHERE Timestamp >= ?
+                                                                      ORDER BY Timestamp;
+                                                                   """, (latest_ms - DB_SAMPLE_TRAILING_SEC*1000,)):
+            self.filter_windows["Vmain_raw"].append((timestamp_ms, v_main))
+            self.filter_windows["Vaux_raw"].append((timestamp_ms, v_aux))
+
+    def _get_filtered(self, column, timestamp_ms, value):
+        """Median of column's window incl. new value (window itself updated only once row queued).
+        """
+        window = self.filter_windows[column]
+        if window and window[-1][0] > timestamp_ms:
+            window.clear() # Clock stepped backward.
+        while window and window[0][0] < timestamp_ms - DB_SAMPLE_TRAILING_SEC*1000:
+            window.popleft()
+        return statistics.median([v for ms, v in window] + [value])
+
+    def log_derived(self, timestamp_now, v_main_raw, v_aux_raw, charge_dir_fwd, charge_current):
+        """Call after logging voltages and charging rows for same sample (same decimation applies).
+        """
+        timestamp_ms = self.to_epoch_ms(timestamp_now)
+        current_signed = charge_current * (1 if charge_dir_fwd else -1)
+        values = {"charge_current_signed": current_signed,
+                  "charge_power": current_signed * v_aux_raw,
+                  "Vmain_filt": self._get_filtered("Vmain_raw", timestamp_ms, v_main_raw),
+                  "Vaux_filt": self._get_filtered("Vaux_raw", timestamp_ms, v_aux_raw)}
+        # Decimated samples still update latest values (decisions), but not filter windows (match stored rows).
+        self.latest_derived = (timestamp_ms, values)
+        if self._log_data(self.derived_table, timestamp_now, list(values.values())):
+            self.filter_windows["Vmain_raw"].append((timestamp_ms, v_main_raw))
+            self.filter_windows["Vaux_raw"].append((timestamp_ms, v_aux_raw))
+
+    def get_filtered_voltage(self, timestamp_now, trailing_seconds, column):
+        """Vmain_filt/Vaux_filt of newest sample (as stored, or would have been if decimated), if filtered over
+        same window as trailing_seconds and sample within DERIVED_FILTER_MAX_AGE_SEC. Otherwise None (caller
+        computes from raw window).
+        """
+        if self.latest_derived is None or trailing_seconds != DB_SAMPLE_TRAILING_SEC:
+            return None
+        timestamp_ms, values = self.latest_derived
+        if not 0 <= self.to_epoch_ms(timestamp_now) - timestamp_ms <= DERIVED_FILTER_MAX_AGE_SEC*1000:
+            return None
+        return values[column]
+
+    def get_derived(self, timestamp_now, trailing_seconds, column_list=None, decimate_ms=None):
+        return self._get_data(self.derived_table, timestamp_now, trailing_seconds, column_list, decimate_ms)
+
+    def backfill_derived(self):
+        """Vectorized fill of derived rows for history logged before derived table existed (i.e., older than
+        its first row), one DERIVED_BACKFILL_CHUNK_SEC chunk at a time. Returns number of rows written.
+        """
+        import pandas as pd
+        first_ms = self._query_rows(f"SELECT MIN(Timestamp) FROM {self.voltage_table};")[0][0]
+        end_ms = self._query_rows(f"SELECT MIN(Timestamp) FROM {self.derived_table};")[0][0]
+        if end_ms is None:
+            end_ms = self._get_latest_timestamp(self.voltage_table)
+            end_ms = end_ms + 1 if end_ms is not None else None
+        if first_ms is None or end_ms is None or first_ms >= end_ms:
+            return 0
+
+        start_time = time.monotonic()
+        window_ms = DB_SAMPLE_TRAILING_SEC * 1000
+        num_written = 0
+        for chunk_start in range(first_ms, end_ms, DERIVED_BACKFILL_CHUNK_SEC*1000):
+            chunk_end = min(chunk_start + DERIVED_BACKFILL_CHUNK_SEC*1000, end_ms)
+            # Chunk read w/ preceding window so first rows' medians match what ingest would have stored.
+            rows = self._query_rows(f"""SELECT v.Timestamp, v.Vmain_raw, v.Vaux_raw, c.charge_dir, c.charge_current
+                                        FROM {self.voltage_table} v
+                                        LEFT JOIN {self.charging_table} c USING (Timestamp)
+                                        WHERE v.Timestamp >= ? AND v.Timestamp < ?
+                                        ORDER BY v.Timestamp;
+                                     """, (chunk_start - window_ms, chunk_end))
+            data = pd.DataFrame.from_records(rows, columns=["Timestamp", "Vmain_raw", "Vaux_raw",
+                                                            "charge_dir", "charge_current"])
+            derived = pd.DataFrame({"Timestamp": data["Timestamp"]})
+            derived["charge_current_signed"] = data["charge_current"] * (data["charge_dir"] * 2 - 1)
+            derived["charge_power"] = derived["charge_current_signed"] * data["Vaux_raw"]
+            voltages = data[["Vmain_raw", "Vaux_raw"]].set_axis(pd.to_datetime(data["Timestamp"], unit="ms"))
+            # closed="both": window [t - DB_SAMPLE_TRAILING_SEC, t], same as ingest and _get_time_bounds().
+            filtered = voltages.rolling("%dms" % window_ms, closed="both").median()
+            derived["Vmain_filt"] = filtered["Vmain_raw"].to_numpy()
+            derived["Vaux_filt"] = filtered["Vaux_raw"].to_numpy()
+            derived = derived[derived["Timestamp"] >= chunk_start]
+            derived = derived.astype(object).where(derived.notna(), None) # NaN (no charging row) -> NULL
+            num_written += self.sql_conn.executemany(f"""INSERT OR IGNORE INTO {self.derived_table}
+                                                         VALUES (?, ?, ?, ?, ?);
+                                                      """, derived.itertuples(index=False, name=None)).rowcount
+            self.sql_conn.commit()
+        self.query_cache.clear()
+        self.Output.print_debug("Derived datalog columns backfilled: %d rows in %.1fs."
+                                % (num_written, time.monotonic() - start_time), category="program", rows=num_written)
+        return num_written
+
     def log_signals(self, timestamp_now, values_list):
         self._log_data(self.signals_table, timestamp_now, values_list)
 
-    def get_signals(self, timestamp_now, trailing_seconds, column_list=None):
-        return self._get_data(self.signals_table, timestamp_now, trailing_seconds, column_list)
+    def get_signals(self, timestamp_now, trailing_seconds, column_list=None, decimate_ms=None):
+        return self._get_data(self.signals_table, timestamp_now, trailing_seconds, column_list, decimate_ms)
 
-    def get_dfs(self, date_str=None):
+    def get_dfs(self, date_str=None, decimate_ms=None, with_derived=False):
         """Pass date string in "YYYY-MM-DD" format or leave blank to get data from today (based on sys time).
         Returns a list of three dataframes representing the voltages, chargin, and signals tables,
         with all entries for the given day.
+        Pass decimate_ms (e.g. 1000) to get first row per interval instead of every stored sample.
+        Pass with_derived=True to get derived table as fourth dataframe (run backfill_derived() first for old data).
         """
         if date_str is None:
             # today
             date_str = dt.datetime.now().date().isoformat()
 
-        day_end_time = dt.datetime.fromisoformat(date_str + "T235959")
-        return [self.get_voltages(day_end_time, 24*60*60 - 1),
-                self.get_charging(day_end_time, 24*60*60 - 1),
-                self.get_signals(day_end_time, 24*60*60 - 1)  ]
-
-    def get_backup_list(self):
-        """Only includes ones that were auto-generated.
+        day_start_ms, next_day_ms = self.get_day_bounds_ms(date_str)
+        tables = [self.voltage_table, self.charging_table, self.signals_table]
+        if with_derived:
+            tables.append(self.derived_table)
+        return [self._get_range(table, day_start_ms, next_day_ms, None, decimate_ms) for table in tables]
+
+    def get_binned(self, table_names, exprs, start_ms, end_ms, bucket_ms):
+        """Min/max of each SQL expression per bucket_ms-wide time bucket, for plotting long ranges.
+        Tables joined on Timestamp. One PK range scan per bucket (faster than GROUP BY, which sorts
+        every row), and memory bounded by bucket count, not row count.
+        Returns list of (bucket start ms, row count, expr0 min, expr0 max, expr1 min, ...). Empty buckets omitted.
         """
-        bu_dir_contents = os.listdir(DATA_LOG_BU_DIR)
-        datalog_backups = []
-        for filename in bu_dir_contents:
-            matches = re.findall(DATA_LOG_BU_REGEX, filename, flags=re.IGNORECASE)
-            if len(matches) == 1:
-                datalog_backups.append(matches[0])
-        datalog_backups.sort()
-        return datalog_backups
+        aggregates = ", ".join("MIN(%s), MAX(%s)" % (expr, expr) for expr in exprs)
+        sql_stmt = f"""SELECT COUNT(*), {aggregates}
+                       FROM {" JOIN ".join(table_names)}
+                       {"USING (Timestamp)" if len(table_names) > 1 else ""}
+                       WHERE Timestamp >= ? AND Timestamp < ?;
+                    """
+        bucket_ms = int(bucket_ms)
+        rows = []
+        for bucket_start in range(start_ms - start_ms % bucket_ms, end_ms, bucket_ms):
+            row = self._query_rows(sql_stmt, (max(bucket_start, start_ms), min(bucket_start + bucket_ms, end_ms)))[0]
+            if row[0]:
+                rows.append((bucket_start, *row))
+        return rows
+
+    def run_backup(self, timestamp_now_str=None):
+        """Pass None to name backup from current time (looked up after any wait for valid time).
+        Calls progress_fxn throughout (first backup of a full DB can take minutes).
+        """
+        with self._reporting_progress():
+            self._run_backup(timestamp_now_str)
 
-    def run_backup(self, timestamp_now_str):
+    def _run_backup(self, timestamp_now_str):
+        if not self.Output.is_time_valid():
+            # Give NTP one more chance so held rows can be stamped and backed up (else lost at shutdown).
+            self.Output.Clock.wait_for_ntp_update(log=True, progress_fxn=self.progress_fxn)
         if not self.Output.is_time_valid():
             # Don't run if no valid time is available. Won't be able to properly name backup target.
+            self.Output.print_warn("Datalog BU: Skipped (sys time invalid). %d datalog rows held while time invalid "
+                                   "not saved." % len(self.untimed_rows), category="backup",
+                                   rows=len(self.untimed_rows))
             return
-        if not os.path.exists(DATA_LOG_BU_DIR):
-            os.mkdir(DATA_LOG_BU_DIR)
-
-        existing_datalog_backups = self.get_backup_list()
-        if len(existing_datalog_backups) > DATA_LOG_BU_NUM_TO_KEEP:
-            # If BU folder has more than specified number of existing backups to
-            # retain, remove oldest extraneous ones.
-            backups_to_keep = existing_datalog_backups[-DATA_LOG_BU_NUM_TO_KEEP:]
-            backups_to_remove = set(existing_datalog_backups).difference(set(backups_to_keep))
-            self.Output.print_info(f"Datalog BU: Removing {len(backups_to_remove)} extraneous datalog backup(s):")
-            for filename in backups_to_remove:
-                self.Output.print_info(f"\t\t{filename}")
-                os.remove(os.path.join(DATA_LOG_BU_DIR, filename))
-
-        # Read back in since list might have changed if files removed in above block.
-        existing_datalog_backups = self.get_backup_list()
-
-        today_bu_name = f"{os.path.splitext(os.path.basename(DATA_LOG_PATH))[0]}" \
-                        f"--{timestamp_now_str}_auto" \
-                        f"{os.path.splitext(os.path.basename(DATA_LOG_PATH))[1]}"
-                        # e.g., system_data_log--YYYYMMDD_auto.db
-        today_bu_target_path = os.path.join(DATA_LOG_BU_DIR, today_bu_name)
-
-        if os.path.exists(today_bu_target_path):
-            # If backup w/ today's date already exists, leave there and reuse that.
-            target_filename = today_bu_name
-        elif len(existing_datalog_backups) >= DATA_LOG_BU_NUM_TO_KEEP:
-            # If right number of dirs exists, and none is today's date,
-            # rename oldest dir to today's date.
-            backup_file_to_overwrite = existing_datalog_backups[0]
-            self.Output.print_info(f"Datalog BU: Overwriting {backup_file_to_overwrite}.")
-            target_filename = backup_file_to_overwrite
-        else:
-            # If fewer than target number of images exist, and none has today's date,
-            # sync to new file.
-            target_filename = today_bu_name
+        if self.untimed_rows:
+            self.stamp_untimed()
+            self.checkpoint()
+        if timestamp_now_str is None:
+            timestamp_now_str = self.Output.Clock.get_time_now(string_format=DATE_FORMAT)
+        # e.g., system_data_log--YYYYMMDD_auto. Same-day backups replace earlier one.
+        today_bu_name = f"{os.path.splitext(os.path.basename(DATA_LOG_PATH))[0]}--{timestamp_now_str}_auto"
+        BackupStore = DatalogBackupStore(self.Output)
+        try:
+            # Derived table not backed up (backfill_derived() recreates it from restored tables).
+            stats = BackupStore.backup(self.sql_conn, today_bu_name,
+                                       [self.voltage_table, self.charging_table, self.signals_table],
+                                       progress_fxn=self.progress_fxn)
+        except (OSError, sqlite3.Error) as e:
+            self.Output.print_err(f"Datalog BU: Backup to {today_bu_name} failed ({e!r}).", category="backup")
+            return
+        self.Output.print_info(f"Datalog BU: Backed up to {today_bu_name} ({stats['chunks_new']} new chunk(s), "
+                               f"{stats['chunks_reused']} reused, {stats['bytes_written']/1024**2:.1f} MB written).",
+                               category="backup", target=today_bu_name, **stats)
+        BackupStore.prune(DATA_LOG_BU_NUM_TO_KEEP)
+
+
+class DatalogBackupStore(object):
+    def __init__(self, Output, bu_dir=None):
+        """Deduplicated, compressed datalog backups.
+        Each table is split into one chunk per day of rows. Chunks are stored once (zlib-compressed,
+        named by SHA-256 of content) under chunks/, and each backup is a manifest under manifests/
+        listing its chunks. Past days don't change, so each backup only writes today's chunks and
+        storage grows w/ new data rather than backup count.
+        """
+        if Output is None:
+            Output = OutputHandler(use_log_file=False)
+        self.Output = Output
+        self.bu_dir = bu_dir if bu_dir is not None else DATA_LOG_BU_DIR
+        self.chunk_dir = os.path.join(self.bu_dir, "chunks")
+        self.manifest_dir = os.path.join(self.bu_dir, "manifests")
+
+    def _chunk_path(self, sha256):
+        return os.path.join(self.chunk_dir, sha256[:2], sha256 + ".z")
+
+    def _manifest_path(self, name):
+        return os.path.join(self.manifest_dir, name + ".json")
+
+    def list_backups(self):
+        """Returns manifest names, oldest first.
+        """
+        if not os.path.isdir(self.manifest_dir):
+            return []
+        names = []
+        for filename in os.listdir(self.manifest_dir):
+            matches = re.findall(DATA_LOG_BU_MANIFEST_REGEX, filename, flags=re.IGNORECASE)
+            if len(matches) == 1:
+                names.append(matches[0])
+        return sorted(names)
+
+    def load_manifest(self, name):
+        with open(self._manifest_path(name), "r") as fd:
+            return json.load(fd)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as fd:
+            fd.write(data)
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(temp_path, path)
+
+    def _get_day_spans(self, sql_conn, table):
+        """Returns list of (day, row count, first Timestamp, last Timestamp), days in local time.
+        Seeks day to day through Timestamp PK (faster than GROUP BY over every row).
+        """
+        day_spans = []
+        row = sql_conn.execute(f"SELECT MIN(Timestamp) FROM {table}").fetchone()
+        while row is not None and row[0] is not None:
+            day = dt.datetime.fromtimestamp(row[0] / 1000).date().isoformat()
+            day_start_ms, next_day_ms = DataLogger.get_day_bounds_ms(day)
+            day_spans.append((day, *sql_conn.execute(f"""SELECT COUNT(*), MIN(Timestamp), MAX(Timestamp)
+                                                         FROM {table}
+                                                         WHERE Timestamp >= ? AND Timestamp < ?;
+                                                      """, (day_start_ms, next_day_ms)).fetchone()))
+            row = sql_conn.execute(f"SELECT Timestamp FROM {table} WHERE Timestamp >= ? ORDER BY Timestamp LIMIT 1",
+                                   (next_day_ms,)).fetchone()
+        return day_spans
+
+    def backup(self, sql_conn, name, tables, progress_fxn=None):
+        """Back up tables from open connection to manifest name. Returns dict of stats.
+        progress_fxn (if any) called after each chunk.
+        """
+        # Chunks in latest manifest can be reused w/o re-reading rows if day's row count and time span unchanged.
+        prev_chunks = {}
+        for prev_name in self.list_backups()[-1:]:
+            for chunk in self.load_manifest(prev_name)["chunks"]:
+                prev_chunks[(chunk["table"], chunk["day"])] = chunk
+
+        stats = {"chunks_new": 0, "chunks_reused": 0, "bytes_written": 0}
+        manifest = {"name": name,
+                    "created": dt.datetime.now().isoformat(timespec="seconds"),
+                    "schema": {},
+                    "chunks": []}
+        for table in tables:
+            manifest["schema"][table] = sql_conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                                         (table,)).fetchone()[0]
+            for day, num_rows, first_ts, last_ts in self._get_day_spans(sql_conn, table):
+                chunk = {"table": table, "day": day, "rows": num_rows, "first_ts": first_ts, "last_ts": last_ts}
+                prev_chunk = prev_chunks.get((table, day))
+                if (prev_chunk is not None
+                      and all(prev_chunk[key] == chunk[key] for key in ["rows", "first_ts", "last_ts"])
+                      and os.path.exists(self._chunk_path(prev_chunk["sha256"]))):
+                    chunk["sha256"] = prev_chunk["sha256"]
+                    stats["chunks_reused"] += 1
+                else:
+                    rows = sql_conn.execute(f"SELECT * FROM {table} WHERE Timestamp >= ? AND Timestamp < ? ORDER BY Timestamp",
+                                            DataLogger.get_day_bounds_ms(day)).fetchall()
+                    content = json.dumps(rows, separators=(",", ":")).encode()
+                    chunk["sha256"] = hashlib.sha256(content).hexdigest()
+                    chunk_path = self._chunk_path(chunk["sha256"])
+                    if os.path.exists(chunk_path):
+                        stats["chunks_reused"] += 1 # Identical content already stored.
+                    else:
+                        compressed = zlib.compress(content, DATA_LOG_BU_COMPRESS_LEVEL)
+                        self._write_atomic(chunk_path, compressed)
+                        stats["chunks_new"] += 1
+                        stats["bytes_written"] += len(compressed)
+                manifest["chunks"].append(chunk)
+                if progress_fxn is not None:
+                    progress_fxn()
+        # Manifest written last, so it only ever references chunks already on disk.
+        self._write_atomic(self._manifest_path(name), json.dumps(manifest, indent=1).encode())
+        return stats
+
+    def _read_chunk(self, sha256):
+        with open(self._chunk_path(sha256), "rb") as fd:
+            content = zlib.decompress(fd.read())
+        if hashlib.sha256(content).hexdigest() != sha256:
+            raise DataLoggingError("Backup chunk %s corrupt (hash mismatch)." % sha256)
+        return json.loads(content)
+
+    def restore(self, name, dest_path):
+        """Rebuild full DB from backup into dest_path (must not exist). Verifies every chunk's hash.
+        """
+        if os.path.exists(dest_path):
+            raise FileExistsError("%s already exists." % dest_path)
+        manifest = self.load_manifest(name)
+        temp_path = dest_path + ".tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        dest_conn = sqlite3.connect(temp_path)
+        try:
+            for schema_sql in manifest["schema"].values():
+                dest_conn.execute(schema_sql)
+            for chunk in manifest["chunks"]:
+                rows = self._read_chunk(chunk["sha256"])
+                if rows:
+                    placeholders = ", ".join(["?"] * len(rows[0]))
+                    dest_conn.executemany(f"INSERT INTO {chunk['table']} VALUES ({placeholders})", rows)
+            dest_conn.commit()
+        finally:
+            dest_conn.close()
+        os.replace(temp_path, dest_path)
+        return sum(chunk["rows"] for chunk in manifest["chunks"])
+
+    def prune(self, num_to_keep):
+        """Keep newest num_to_keep backups (legacy full-copy .db backups count too, so they age out),
+        then delete chunks no remaining manifest references.
+        """
+        backups = [(name[-13:-5], "manifest", name) for name in self.list_backups()]
+        if os.path.isdir(self.bu_dir):
+            for filename in os.listdir(self.bu_dir):
+                if re.match(DATA_LOG_BU_REGEX, filename, flags=re.IGNORECASE):
+                    backups.append((os.path.splitext(filename)[0][-13:-5], "legacy", filename))
+        backups.sort()
+        backups_to_remove = backups[:-num_to_keep] if num_to_keep > 0 else backups
+        if backups_to_remove:
+            self.Output.print_info(f"Datalog BU: Removing {len(backups_to_remove)} extraneous datalog backup(s):",
+                                   category="backup")
+        for datestamp, kind, name in backups_to_remove:
+            self.Output.print_info(f"\t\t{name}")
+            if kind == "manifest":
+                os.remove(self._manifest_path(name))
+            else:
+                os.remove(os.path.join(self.bu_dir, name))
+        return self.collect_garbage()
+
+    def collect_garbage(self):
+        """Delete unreferenced chunks (incl. any left by interrupted backup). Returns number deleted.
+        """
+        referenced = set()
+        for name in self.list_backups():
+            referenced.update(chunk["sha256"] for chunk in self.load_manifest(name)["chunks"])
+        num_deleted = 0
+        if not os.path.isdir(self.chunk_dir):
+            return num_deleted
+        for sub_dir in os.listdir(self.chunk_dir):
+            for filename in os.listdir(os.path.join(self.chunk_dir, sub_dir)):
+                if filename.endswith(".tmp") or os.path.splitext(filename)[0] not in referenced:
+                    os.remove(os.path.join(self.chunk_dir, sub_dir, filename))
+                    num_deleted += 1
+        return num_deleted
+
+
+class StateCheckpoint(object):
+    LOOP_STATE_KEYS = ("key_acc_powered", "engine_on_state", "sys_enabled_state")
 
-        target_filename_temp = f"{os.path.splitext(today_bu_name)[0]}_TEMP{os.path.splitext(today_bu_name)[1]}"
-        target_file_path_temp = os.path.join(DATA_LOG_BU_DIR, target_filename_temp)
+    def __init__(self, Output, Timer):
+        """Saves control state when program exits to be restarted (exit code 109) so next
+        instance can resume without startup delays. Only restored if saved during same
+        boot and within STATE_CHECKPOINT_MAX_AGE_SEC.
+        """
+        self.Output = Output
+        self.Timer = Timer
+        self.Car = None
+        self.loop_states = {}
+
+    def attach_vehicle(self, Car):
+        self.Car = Car
+
+    def update(self, **loop_states):
+        """Record event-loop state variables (in memory only - written to disk by save()).
+        """
+        self.loop_states.update(loop_states)
+
+    def _get_boot_id(self):
+        if not os.path.exists(BOOT_ID_PATH):
+            return None
+        with open(BOOT_ID_PATH, "r") as fd:
+            return fd.read().strip()
+
+    def is_startup_complete(self):
+        return self.Car is not None and all(key in self.loop_states for key in self.LOOP_STATE_KEYS)
+
+    def save(self):
+        """Called from exit paths. Must not raise, since program exit has to proceed regardless.
+        Nothing saved if startup not complete (e.g., HAT fault during startup) - next instance starts normally.
+        """
+        if not self.is_startup_complete():
+            self.Output.print_debug("Startup not complete. No state checkpoint saved.", category="program")
+            return
+        try:
+            vehicle_state = self.Car.get_checkpoint_state() if self.Car is not None else None
+        except Exception:
+            # Relay read-back can fail here if AutomationHAT is what caused the exit.
+            vehicle_state = None
+        try:
+            checkpoint = {"boot_id": self._get_boot_id(),
+                          "monotonic_time": time.monotonic(),
+                          "pid": os.getpid(),
+                          "loop_states": self.loop_states,
+                          "timers": self.Timer.get_timer_state(),
+                          "vehicle": vehicle_state}
+            temp_path = STATE_CHECKPOINT_PATH + ".tmp"
+            with open(temp_path, "w") as fd:
+                json.dump(checkpoint, fd)
+            os.replace(temp_path, STATE_CHECKPOINT_PATH) # atomic
+        except Exception as e:
+            self.Output.print_err("Failed to save state checkpoint (%s)." % repr(e))
+
+    def _is_complete(self, checkpoint):
+        """Checks everything start_up() reads from checkpoint is present (e.g., file written by older version).
+        """
+        try:
+            vehicle_state = checkpoint["vehicle"]
+            return (all(key in checkpoint for key in ["boot_id", "monotonic_time", "pid", "timers"])
+                    and all(key in checkpoint["loop_states"] for key in self.LOOP_STATE_KEYS)
+                    and (vehicle_state is None
+                         or all(key in vehicle_state for key in ["charging", "charge_dir_fwd", "estimators"])))
+        except (KeyError, TypeError):
+            return False
+
+    def load(self):
+        """Returns checkpoint dict (w/ "downtime_s" added) if valid and fresh, else None.
+        Checkpoint file is consumed either way so it can only be applied once.
+        """
+        if not os.path.exists(STATE_CHECKPOINT_PATH):
+            return None
+        try:
+            with open(STATE_CHECKPOINT_PATH, "r") as fd:
+                checkpoint = json.load(fd)
+        except (OSError, ValueError):
+            self.Output.print_warn("State checkpoint unreadable. Ignoring.")
+            return None
+        finally:
+            os.remove(STATE_CHECKPOINT_PATH)
+
+        if not self._is_complete(checkpoint):
+            self.Output.print_warn("State checkpoint incomplete. Ignoring.")
+            return None
+        downtime_s = time.monotonic() - checkpoint["monotonic_time"]
+        if checkpoint["boot_id"] != self._get_boot_id() or checkpoint["boot_id"] is None:
+            self.Output.print_debug("State checkpoint from previous boot. Ignoring.")
+            return None
+        elif not (0 <= downtime_s <= STATE_CHECKPOINT_MAX_AGE_SEC):
+            self.Output.print_debug("State checkpoint stale (%.0fs old). Ignoring." % downtime_s)
+            return None
+
+        checkpoint["downtime_s"] = downtime_s
+        self.Output.print_info("Resuming from state checkpoint of PID %d (%.1fs old)."
+                               % (checkpoint["pid"], downtime_s), category="program", prev_pid=checkpoint["pid"])
+        return checkpoint
+
+
+class StatusServer(object):
+    def __init__(self, Output, address=STATUS_API_ADDRESS):
+        """Local HTTP endpoint serving latest status and recent samples from memory (no DB access).
+        Runs in daemon threads. Event loop only pays for publish() (append and notify).
+            GET /status           current loop states, timers, latest sample
+            GET /samples?n=N      last N samples (N clamped to 0-STATUS_API_HISTORY_LEN, 400 if not an integer)
+            GET /stream           newline-delimited JSON, one line per new sample
+        """
+        self.Output = Output
+        self.samples = collections.deque(maxlen=STATUS_API_HISTORY_LEN)
+        self.sample_count = 0
+        self.status = {}
+        self.update_cond = threading.Condition()
+
+        self.httpd = http.server.ThreadingHTTPServer(address, self._make_request_handler())
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, name="status_api", daemon=True).start()
+        self.Output.print_debug("Status API listening on http://%s:%d." % address)
+
+    def publish(self, sample, status):
+        """Called by event loop once per pass. sample and status dicts must not be modified afterward.
+        """
+        with self.update_cond:
+            if sample is not None:
+                self.samples.append(sample)
+                self.sample_count += 1
+            self.status = status
+            self.update_cond.notify_all()
+
+    def get_status(self):
+        with self.update_cond:
+            return dict(self.status, latest=(self.samples[-1] if self.samples else None))
+
+    def get_samples(self, num_samples):
+        with self.update_cond:
+            return list(self.samples)[-num_samples:] if num_samples > 0 else []
+
+    def wait_for_samples(self, last_count, timeout):
+        """Returns (new sample count, list of samples published after last_count).
+        """
+        with self.update_cond:
+            self.update_cond.wait_for(lambda: self.sample_count > last_count, timeout=timeout)
+            num_new = min(self.sample_count - last_count, len(self.samples))
+            return self.sample_count, (list(self.samples)[-num_new:] if num_new > 0 else [])
+
+    def shut_down(self):
+        self.httpd.shutdown()
+
+    def _make_request_handler(self):
+        server = self
+
+        class StatusRequestHandler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass # Don't print every request to console.
+
+            def _send_json(self, obj):
+                body = json.dumps(obj).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                last_count = server.sample_count
+                try:
+                    while True:
+                        last_count, new_samples = server.wait_for_samples(last_count, STATUS_API_STREAM_KEEPALIVE_SEC)
+                        lines = "".join([json.dumps(sample) + "\n" for sample in new_samples]) or "\n" # blank line as keepalive
+                        self.wfile.write(lines.encode())
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return # Client disconnected.
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                if url.path == "/status":
+                    self._send_json(server.get_status())
+                elif url.path == "/samples":
+                    try:
+                        num_samples = int(query.get("n", ["60"])[0])
+                    except ValueError:
+                        self.send_error(400, "n must be an integer")
+                        return
+                    self._send_json(server.get_samples(min(max(num_samples, 0), STATUS_API_HISTORY_LEN)))
+                elif url.path == "/stream":
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+        return StatusRequestHandler
+
+
+class ControlParamStore(object):
+    IN_MODIFY = 0x2
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_UNMOUNT = 0x2000
+    IN_IGNORED = 0x8000
+    EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, name length
+    BIN_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+               ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv}
+
+    def __init__(self, Output, paths=None):
+        """Hot reload of control params (CONTROL_PARAM_NAMES). Loop calls apply_changes() between
+        passes. If a watched file changed, all are re-read, and changed values are validated and
+        applied to class_def globals all at once (whole set rejected if any value invalid), so
+        no pass sees a mix of old and new params. Later paths override earlier ones, and values
+        from a file that's gone (e.g., USB drive removed) revert. Same rule applied at startup.
+        """
+        self.Output = Output
+        self.paths = [path for path in (paths if paths is not None else [CONTROL_PARAMS_PATH, CONTROL_PARAMS_USB_PATH])
+                      if path is not None]
+        self.import_params = self.get_current() # Values from control_params import. Base for any param no file sets.
+        self.file_sigs = {path: self._get_file_sig(path) for path in self.paths}
+        self.overrides = {} # name -> path of file (after first) that set it
+        self.inotify_fd = None
+        self.watch_paths = {} # inotify watch descriptor -> path
+        self.polled_paths = list(self.paths)
+        self.last_poll_time = time.monotonic()
+        self.num_applied = 0
+        self._set_up_inotify()
+        self.apply_changes(force=True)
+
+    def _set_up_inotify(self):
+        # Watch directories rather than files so editors' save-by-rename is seen.
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            self.inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            self.inotify_fd = -1 # Not Linux
+        if self.inotify_fd < 0:
+            self.inotify_fd = None
+            self.Output.print_debug("inotify unavailable. Polling control params every %ds." % CONTROL_PARAMS_POLL_SEC)
+            return
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        for path in self.paths:
+            wd = libc.inotify_add_watch(self.inotify_fd, os.path.dirname(path).encode(), mask)
+            if wd >= 0:
+                self.watch_paths[wd] = path
+                self.polled_paths.remove(path)
+            # else dir doesn't exist (e.g., USB drive not mounted yet). Polled instead.
+
+    def _get_file_sig(self, path):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _read_events(self):
+        """Returns True if any event concerns a watched file, or a watched dir went away.
+        """
+        changed = False
+        while True:
+            try:
+                buffer = os.read(self.inotify_fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, name_len = self.EVENT_HEADER.unpack_from(buffer, offset)
+                offset += self.EVENT_HEADER.size
+                name = buffer[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+                offset += name_len
+                if mask & (self.IN_DELETE_SELF | self.IN_UNMOUNT | self.IN_IGNORED):
+                    # e.g., USB drive removed. Watch gone, so poll for drive's return.
+                    path = self.watch_paths.pop(wd, None)
+                    if path is not None:
+                        self.polled_paths.append(path)
+                        changed = True
+                elif wd in self.watch_paths and name == os.path.basename(self.watch_paths[wd]):
+                    changed = True
+
+    def _is_changed(self):
+        changed = self.inotify_fd is not None and self._read_events()
+        if self.polled_paths and time.monotonic() - self.last_poll_time >= CONTROL_PARAMS_POLL_SEC:
+            self.last_poll_time = time.monotonic()
+            changed = changed or any(self._get_file_sig(path) != self.file_sigs[path] for path in self.polled_paths)
+        return changed
+
+    def _eval_node(self, node, assigned):
+        # Literal numbers and arithmetic on them (incl. names assigned earlier in same file).
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+            return node.value
+        elif isinstance(node, ast.Name) and node.id in assigned:
+            return assigned[node.id]
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            value = self._eval_node(node.operand, assigned)
+            return -value if isinstance(node.op, ast.USub) else +value
+        elif isinstance(node, ast.BinOp) and type(node.op) in self.BIN_OPS:
+            return self.BIN_OPS[type(node.op)](self._eval_node(node.left, assigned),
+                                               self._eval_node(node.right, assigned))
+        raise ValueError("line %d: only literal values and arithmetic allowed" % node.lineno)
+
+    def parse_file(self, path):
+        """Returns dict of CONTROL_PARAM_NAMES assigned in file. File is parsed, never run
+        (may be on removable media). Other statements (imports, other names) ignored.
+        Raises ValueError if file unreadable or a param's value isn't a literal expression.
+        """
+        try:
+            with open(path, "r") as fd:
+                tree = ast.parse(fd.read(), filename=path)
+        except (OSError, SyntaxError, ValueError) as e:
+            raise ValueError("%s: %s" % (os.path.basename(path), repr(e)))
+        assigned = {}
+        for statement in tree.body:
+            if not (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                    and isinstance(statement.targets[0], ast.Name)):
+                continue
+            name = statement.targets[0].id
+            try:
+                assigned[name] = self._eval_node(statement.value, assigned)
+            except (ValueError, TypeError, ArithmeticError) as e:
+                if name in CONTROL_PARAM_NAMES:
+                    raise ValueError("%s: %s (%s)" % (os.path.basename(path), name, e))
+        return {name: value for name, value in assigned.items() if name in CONTROL_PARAM_NAMES}
+
+    def load(self):
+        """Returns (params, overrides). params is dict from watched files (later paths override earlier).
+        overrides maps each name a later file set (to a different value) to that file's path.
+        Raises ValueError if a file can't be parsed.
+        """
+        params = {}
+        overrides = {}
+        for path_num, path in enumerate(self.paths):
+            self.file_sigs[path] = self._get_file_sig(path)
+            if self.file_sigs[path] is None:
+                continue
+            file_params = self.parse_file(path)
+            if path_num > 0:
+                overrides.update({name: path for name, value in file_params.items()
+                                  if params.get(name, self.import_params[name]) != value})
+            params.update(file_params)
+        return params, overrides
+
+    def get_current(self):
+        return {name: globals()[name] for name in CONTROL_PARAM_NAMES}
+
+    def validate(self, params):
+        """Returns list of problems (empty if params OK). params must include every name.
+        """
+        problems = []
+        for name in CONTROL_PARAM_NAMES:
+            value = params[name]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+                problems.append("%s=%r not a number" % (name, value))
+            elif value < 0:
+                problems.append("%s=%r negative" % (name, value))
+            elif "_V_" in name and not (MIN_BATT_PRESENT_V < value < CONTROL_PARAM_V_MAX):
+                problems.append("%s=%r outside %d-%dV" % (name, value, MIN_BATT_PRESENT_V, CONTROL_PARAM_V_MAX))
+        if problems:
+            return problems
+        for low_name, high_name in [("MAIN_V_MIN", "MAIN_V_CHARGED"), ("MAIN_V_CHARGED", "MAIN_V_MAX"),
+                                    ("AUX_V_MIN", "AUX_V_MAX")]:
+            if params[low_name] >= params[high_name]:
+                problems.append("%s (%r) not below %s (%r)"
+                                % (low_name, params[low_name], high_name, params[high_name]))
+        return problems
+
+    def apply_changes(self, force=False):
+        """Call between loop passes. Returns dict of applied changes (name -> (old, new)), empty if none.
+        Cheap when nothing changed (one non-blocking read). force=True re-reads files regardless.
+        """
+        if not (self._is_changed() or force):
+            return {}
+        current = self.get_current()
+        try:
+            file_params, overrides = self.load()
+        except ValueError as e:
+            self.Output.print_err("Control params not reloaded (%s). Keeping current values." % e, category="program")
+            return {}
+        params = dict(self.import_params, **file_params) # Param no longer in any file reverts to imported value.
+        changes = {name: (current[name], params[name]) for name in CONTROL_PARAM_NAMES
+                   if params[name] != current[name]}
+        if not changes:
+            return {}
+        problems = self.validate(params)
+        if problems:
+            self.Output.print_err("Control param change rejected (%s). Keeping current values."
+                                  % "; ".join(problems), category="program", problems=problems)
+            return {}
+        # Single dict update, so other threads (async runtime) don't see a partial set either.
+        globals().update({name: new for name, (old, new) in changes.items()})
+        self.num_applied += 1
+        for name, (old, new) in changes.items():
+            source = os.path.basename(os.path.dirname(overrides[name])) if name in overrides else "local file"
+            self.Output.print_info("Control param %s changed: %r -> %r (%s)." % (name, old, new, source),
+                                   category="program", param=name, old=old, new=new, source=source)
+        if overrides != self.overrides:
+            if overrides:
+                self.Output.print_warn("Control params overridden by %s: %s."
+                                       % (", ".join(sorted(set(overrides.values()))), ", ".join(sorted(overrides))),
+                                       category="program", overrides=sorted(overrides))
+            else:
+                self.Output.print_info("No control params overridden.", category="program")
+            self.overrides = overrides
+        return changes
 
-        if os.path.exists(os.path.join(DATA_LOG_BU_DIR, target_filename)):
-            # Use TEMP designation until confirmed successful transfer
-            os.rename(os.path.join(DATA_LOG_BU_DIR, target_filename), target_file_path_temp)
 
-        rsync_options = "-azivh"
-        rsync_call = shlex.split(f"rsync {rsync_options} {DATA_LOG_PATH} {target_file_path_temp}") # returns a list
+class StackProfiler(object):
+    def __init__(self, Output):
+        """Sampling profiler for running program (started by SIGUSR1). Background thread samples every
+        other thread's stack, so nothing is traced and profiled code runs at normal speed. Written as
+        folded stacks (one "thread;file:function;... count" line per unique stack) for flamegraph.pl,
+        speedscope, etc.
+        """
+        self.Output = Output
+        self.thread = None
 
-        subprocess.run(shlex.split("tput setaf 63"))
-        result = subprocess.run(rsync_call)
-        subprocess.run(shlex.split("tput sgr0"))
-        if result.returncode != 0:
-            self.Output.print_info(f"Datalog BU: rsync command had nonzero exit status. {target_filename_temp} may be corrupt.")
+    def start(self, duration_s=PROFILE_DURATION_SEC):
+        """Returns False if profile already in progress.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self.thread = threading.Thread(target=self._run, args=(duration_s,), name="profiler", daemon=True)
+        self.thread.start()
+        return True
+
+    def _run(self, duration_s):
+        self.Output.print_info("Profiling program for %ds." % duration_s, category="program")
+        own_id = threading.get_ident()
+        stack_counts = collections.Counter()
+        num_samples = 0
+        end_time = time.monotonic() + duration_s
+        while time.monotonic() < end_time:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append("%s:%s" % (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, str(thread_id)))
+                stack_counts[";".join(reversed(stack))] += 1
+            num_samples += 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL_SEC)
+
+        profile_path = os.path.join(LOG_DIR, "profile_%s.folded"
+                                             % self.Output.Clock.get_time_now(string_format=DATETIME_FORMAT))
+        with open(profile_path, "w") as fd:
+            for stack, count in stack_counts.most_common():
+                fd.write("%s %d\n" % (stack, count))
+        self.Output.print_info("Profile written to %s (%d samples, %d unique stacks)."
+                               % (profile_path, num_samples, len(stack_counts)),
+                               category="program", path=profile_path, samples=num_samples)
+
+
+class LoopPhaseTimer(object):
+    def __init__(self, Output):
+        """Duration stats per event-loop phase (count, total, max), plus phase each thread is in right now,
+        so a stalled loop can be located from outside (SIGUSR2). Phases shouldn't be nested.
+        """
+        self.Output = Output
+        self.phase_stats = {}   # name -> [count, total seconds, max seconds]
+        self.current = {}       # thread name -> (phase name, monotonic start time)
+        self.start_time = time.monotonic()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        thread_name = threading.current_thread().name
+        start_time = time.monotonic()
+        self.current[thread_name] = (name, start_time)
+        try:
+            yield
+        finally:
+            duration_s = time.monotonic() - start_time
+            stats = self.phase_stats.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration_s
+            stats[2] = max(stats[2], duration_s)
+            self.current.pop(thread_name, None)
+
+    def print_stats(self):
+        run_time_s = time.monotonic() - self.start_time
+        self.Output.print_debug("Loop phases over %.0fs (count, avg, max, share of time):" % run_time_s)
+        for name, (count, total_s, max_s) in list(self.phase_stats.items()):
+            self.Output.print_debug("\t%-16s %8d  %8.4fs  %7.3fs  %5.1f%%"
+                                    % (name, count, total_s/count, max_s, 100*total_s/run_time_s))
+        time_now = time.monotonic()
+        for thread_name, (name, start_time) in list(self.current.items()):
+            self.Output.print_debug("\t%s thread in %s phase for %.2fs." % (thread_name, name, time_now - start_time))
+
+
+class Watchdog(object):
+    def __init__(self, Output, notify_fxn=None):
+        """Feeds systemd watchdog (sd_notify "WATCHDOG=1") from event loop. Loop only calls feed()
+        after datalogging check passes, so a stalled loop or stalled writes stop the pings and
+        systemd restarts service (see WatchdogSec in .service file).
+        Not running under systemd (no NOTIFY_SOCKET), messages are recorded in local_messages
+        instead. notify_fxn overrides destination (e.g., stand-in for testing).
+        """
+        self.Output = Output
+        self.notify_socket_path = os.environ.get("NOTIFY_SOCKET")
+        watchdog_usec = os.environ.get("WATCHDOG_USEC")
+        # systemd recommends pinging at half the watchdog timeout.
+        self.feed_interval_s = int(watchdog_usec)/1e6/2 if watchdog_usec else 1
+        self.last_feed_time = None # monotonic
+        self.local_messages = collections.deque(maxlen=100) # (monotonic time, message)
+
+        if notify_fxn is not None:
+            self.notify_fxn = notify_fxn
+        elif self.notify_socket_path is not None:
+            self.notify_fxn = self._send_to_systemd
+        else:
+            self.notify_fxn = self._record_locally
+
+    def _send_to_systemd(self, message):
+        address = self.notify_socket_path
+        if address.startswith("@"):
+            address = "\0" + address[1:] # abstract namespace socket
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(message.encode(), address)
+
+    def _record_locally(self, message):
+        self.local_messages.append((time.monotonic(), message))
+
+    def notify_ready(self):
+        self.notify_fxn("READY=1")
+
+    def feed(self, force=False):
+        time_now = time.monotonic()
+        if force or self.last_feed_time is None or (time_now - self.last_feed_time) >= self.feed_interval_s:
+            self.notify_fxn("WATCHDOG=1")
+            self.last_feed_time = time_now
+
+    def keep_alive(self, force=False):
+        """Called from progress points of long jobs that block loop (DB migration, backup, NTP wait), so
+        a job that's still progressing isn't killed. Also extends start timeout (TimeoutStartSec), since
+        first-start migration runs before READY=1. A job that stops progressing stops the pings too.
+        """
+        time_now = time.monotonic()
+        if force or self.last_feed_time is None or (time_now - self.last_feed_time) >= self.feed_interval_s:
+            self.notify_fxn("WATCHDOG=1\nEXTEND_TIMEOUT_USEC=%d" % (self.feed_interval_s * 4 * 1e6))
+            self.last_feed_time = time_now
+
+
+class SamplingPolicy(object):
+    MODE_INTERVALS = {"fast": SAMPLE_INTERVAL_FAST_SEC,
+                      "shutdown": SAMPLE_INTERVAL_SHUTDOWN_SEC,
+                      "idle": SAMPLE_INTERVAL_IDLE_SEC}
+
+    def __init__(self, Output, Timer, BattCharger, Faults=None):
+        """Decides when Vehicle samples/logs and paces event loop between samples.
+        Full rate while anything is happening (charging, charge delay, key ACC/ON, voltage settling,
+        suspected fault in FaultDetector).
+        Slow during shutdown countdown and key-OFF idle, where loop sleeps between samples and only
+        polls digital inputs and relay states. Any change there (or in loop states or mode) makes
+        next pass sample immediately.
+        """
+        self.Output = Output
+        self.Timer = Timer
+        self.BattCharger = BattCharger
+        self.Faults = Faults
+        self.mode = "fast"
+        self.last_sample_mono = None
+        self.last_io_state = None
+        self.last_loop_states = None
+        self.prev_pass_time = None # datetime
+        self.pass_time = None
+        self.mode_sample_counts = {mode: 0 for mode in self.MODE_INTERVALS}
+
+    def _get_mode(self, loop_states):
+        if self.BattCharger.is_charging() or (self.Faults is not None and self.Faults.is_any_suspect()):
+            return "fast"
+        elif self.Timer.is_shutdown_pending():
+            return "shutdown"
+        elif (loop_states.get("key_acc_powered") or loop_states.get("engine_on_state")
+              or self.Timer.is_charge_delay_pending() or not self.Timer.is_sys_voltage_stable()):
+            return "fast"
         else:
-            # rename file again after successful rsync
-            os.rename(target_file_path_temp, today_bu_target_path)
-            self.Output.print_info(f"Datalog BU: rsync command successful. Backed up to {today_bu_name}.")
+            return "idle"
+
+    def _read_io_state(self):
+        """Cheap to read (GPIO inputs and relay shadow state - no ADC or DB access).
+        """
+        return (tuple(Controller().is_input_high(n) for n in [0, 1, 2])
+                + tuple(Controller().is_relay_on(n) for n in [0, 1, 2]))
+
+    def get_interval(self):
+        return self.MODE_INTERVALS[self.mode]
+
+    def get_trailing_window_s(self):
+        """Trailing window for DB-median estimators. Widened while sampling slowly so it still
+        spans several samples.
+        """
+        return max(DB_SAMPLE_TRAILING_SEC, SAMPLE_TRAILING_MIN_COUNT * self.get_interval())
+
+    def start_pass(self, loop_states):
+        """Call at start of each event-loop pass. Returns True if sample should be logged this pass.
+        """
+        self.prev_pass_time, self.pass_time = self.pass_time, self.Timer.get_time_now()
+        mode = self._get_mode(loop_states)
+        mode_changed = (mode != self.mode)
+        if mode_changed:
+            self.Output.print_debug("Sampling mode: %s -> %s (%ds interval)."
+                                    % (self.mode, mode, self.MODE_INTERVALS[mode]),
+                                    category="sampling", mode=mode, interval_s=self.MODE_INTERVALS[mode])
+            self.mode = mode
+        loop_states_changed = (self.last_loop_states is not None and loop_states != self.last_loop_states)
+        self.last_loop_states = dict(loop_states)
+        return (mode_changed or loop_states_changed
+                or self.last_sample_mono is None
+                or (time.monotonic() - self.last_sample_mono) >= self.get_interval()
+                or self._read_io_state() != self.last_io_state)
+
+    def record_sample(self):
+        """Called by Vehicle.log_data() (so startup samples count too).
+        """
+        self.last_sample_mono = time.monotonic()
+        self.last_io_state = self._read_io_state()
+        self.mode_sample_counts[self.mode] += 1
+
+    def wait_for_next_pass(self, stop_event=None):
+        """Sleep until next sample due, returning early if inputs or relays change (or stop_event set).
+        Returns immediately at full rate.
+        """
+        if self.get_interval() == 0 or self.last_sample_mono is None:
+            return
+        while True:
+            remaining_s = self.get_interval() - (time.monotonic() - self.last_sample_mono)
+            if (remaining_s <= 0 or self._read_io_state() != self.last_io_state
+                  or (stop_event is not None and stop_event.is_set())):
+                return
+            time.sleep(min(SAMPLE_INPUT_POLL_SEC, remaining_s))
+
+    def crossed(self, period_s, offset_s=0):
+        """Returns True if a wall-clock mark (seconds into day % period_s == offset_s) passed
+        between previous pass and this one. Replaces exact-second checks, which slow passes can skip over.
+        """
+        if self.prev_pass_time is None:
+            return False
+        def mark_num(time_val):
+            day_s = time_val.toordinal() * 86400 + time_val.hour * 3600 + time_val.minute * 60 + time_val.second
+            return (day_s - offset_s) // period_s
+        return mark_num(self.pass_time) > mark_num(self.prev_pass_time)
+
+    def print_stats(self):
+        self.Output.print_debug("Sampling mode: %s. Samples per mode since start: %s."
+                                % (self.mode, ", ".join("%s %d" % item for item in self.mode_sample_counts.items())))
+
+
+class TickPredicates(dict):
+    def __init__(self, predicate_fxns):
+        """Dict of predicate values for one event-loop pass. Each predicate function is
+        called at most once (on first access) and its result reused for rest of pass.
+        A plain dict of values can be used in its place (e.g., to exercise StateMachine w/o hardware).
+        """
+        super().__init__()
+        self.predicate_fxns = predicate_fxns
+
+    def __missing__(self, key):
+        value = self[key] = self.predicate_fxns[key]()
+        return value
+
+
+class StateMachine(object):
+    def __init__(self, Output, transition_table, states):
+        """transition_table is ordered list of (name, guard, action, is_state_change) tuples.
+        guard(states, predicates) returns bool. First row whose guard is True has its
+        action(states, predicates) run, which may update states dict in place and returns
+        True if event loop should end.
+        Rows w/ is_state_change True are logged along w/ resulting state changes.
+        """
+        self.Output = Output
+        self.transition_table = transition_table
+        self.states = states
+        self.transition_stats = {} # name -> [count, total_s, max_s]
+
+    def step(self, predicates):
+        """Evaluate table against predicates for one pass. Returns action's return value
+        (or None if no row matched).
+        """
+        for name, guard, action, is_state_change in self.transition_table:
+            if not guard(self.states, predicates):
+                continue
+            states_before = dict(self.states)
+            start_time = time.monotonic()
+            result = action(self.states, predicates)
+            elapsed_s = time.monotonic() - start_time
+
+            stats = self.transition_stats.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += elapsed_s
+            stats[2] = max(stats[2], elapsed_s)
+            if is_state_change:
+                changes = ", ".join(["%s: %s -> %s" % (key, states_before.get(key), value)
+                                     for key, value in self.states.items() if states_before.get(key) != value])
+                self.Output.print_debug("Transition '%s' handled in %.2fs%s."
+                                        % (name, elapsed_s, (" (%s)" % changes) if changes else ""),
+                                        category="state", transition=name, duration_s=round(elapsed_s, 3),
+                                        changed={key: value for key, value in self.states.items()
+                                                 if states_before.get(key) != value})
+            return result
+        return None
+
+    def print_stats(self):
+        self.Output.print_debug("State-machine transition timing (count, avg, max):")
+        for name, (count, total_s, max_s) in self.transition_stats.items():
+            self.Output.print_debug("\t%-32s %6d  %6.3fs  %6.3fs" % (name, count, total_s/count, max_s))
 
 
 class Controller(object):
-    def __init__(self):
+    """Shared (singleton) interface to AutomationHAT. Every Controller() call returns same object.
+    Keeps shadow copies of relay and LED states so redundant writes are skipped. LED writes are
+    coalesced until flush_outputs() (called once per event-loop pass). Relay writes happen
+    immediately, but read-back verification is batched into flush_outputs().
+    All hardware access (incl. ADC and RTC elsewhere) goes through hw_lock, so it is safe to call
+    from more than one thread (async_loop.py runs acquisition and control on separate threads).
+    """
+    _instance = None
+    hw_lock = threading.RLock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._set_up()
+        return cls._instance
+
+    def _set_up(self):
         self.input_list = [0, 1, 2]
         self.relay_list = [0, 1, 2]
         self.analog_list = [0, 1, 2]
         self.ind_led_list = [0, 1, 2]
+        self.relay_closes_blocked = False # Set by block_relay_closes()
+        self._reset_shadow_state()
+
+    def _reset_shadow_state(self):
+        # None means state unknown - next write always goes to hardware.
+        self.relay_shadow = {relay_num: None for relay_num in self.relay_list}
+        self.relays_unverified = set()
+        self.led_shadow = {led_num: None for led_num in self.ind_led_list}
+        self.led_pending = {}
+        self.flush_count = 0
+
+    def reinit_hat(self):
+        """Reload AutomationHAT module to discard driver state left inconsistent by a fault.
+        Hardware set up again lazily on next access.
+        """
+        importlib.reload(ah) # Module object updated in place, so existing "ah" references remain valid.
+        self._reset_shadow_state()
+        self.relay_closes_blocked = False
+
+    def block_relay_closes(self):
+        """Refuse close_relay() calls (until reinit_hat()) once outputs are being shut down, so a control
+        step still running on another thread can't close a relay after a safety path opened them all.
+        """
+        self.relay_closes_blocked = True
+
+    def flush_outputs(self, verify=True):
+        """Write pending LED changes that differ from hardware state, and verify relays written
+        since last flush (all relays every RELAY_FULL_VERIFY_INTERVAL calls).
+        Exit paths pass verify=False so a failed relay read-back can't stop them.
+        """
+        with self.hw_lock:
+            for led_num, brightness in self.led_pending.items():
+                if self.led_shadow[led_num] != brightness:
+                    ah.light[led_num].write(brightness)
+                    self.led_shadow[led_num] = brightness
+            self.led_pending = {}
+
+            if not verify:
+                return
+            self.flush_count += 1
+            if self.flush_count % RELAY_FULL_VERIFY_INTERVAL == 0:
+                self.relays_unverified.update(self.relay_list)
+            failures = self._verify_relays()
+        if failures:
+            self.exit_program(ChargeControlError, " ".join(failures))
+
+    def _verify_relays(self):
+        """Returns list of messages for relays whose read-back doesn't match shadow state.
+        """
+        failures = []
+        with self.hw_lock:
+            for relay_num in sorted(self.relays_unverified):
+                if self.relay_shadow[relay_num] is None:
+                    self.relay_shadow[relay_num] = ah.relay[relay_num].is_on()
+                    continue
+                if ah.relay[relay_num].is_on() != self.relay_shadow[relay_num]:
+                    failures.append("Relay %d follow-up check failed (expected %s)."
+                                    % (relay_num, "ON" if self.relay_shadow[relay_num] else "OFF"))
+            self.relays_unverified = set()
+        return failures
+
+    def _get_led_level(self, led_num):
+        if led_num in self.led_pending:
+            return self.led_pending[led_num]
+        elif self.led_shadow[led_num] is None:
+            with self.hw_lock:
+                self.led_shadow[led_num] = ah.light[led_num].read()
+        return self.led_shadow[led_num]
 
     def _light_led(self, led_num, brightness):
-        ah.light[led_num].write(brightness)
+        with self.hw_lock:
+            self.led_pending[led_num] = brightness
 
     def light_green_led(self, brightness=1):
         self._light_led(0, brightness=brightness)
@@ -783,80 +2872,130 @@ class Controller(object):
     def light_red_led(self, brightness=1):
         self._light_led(2, brightness=brightness)
 
+    def _toggle_led(self, led_num):
+        self._light_led(led_num, 0 if self._get_led_level(led_num) else 1)
+
     def toggle_green_led(self):
-        ah.light[0].toggle()
+        self._toggle_led(0)
 
     def toggle_blue_led(self):
-        ah.light[1].toggle()
+        self._toggle_led(1)
 
     def toggle_red_led(self):
-        ah.light[2].toggle()
+        self._toggle_led(2)
 
     def is_green_led_lit(self):
-        return (ah.light[0].read() == 0)
+        return (self._get_led_level(0) == 0)
 
     def is_blue_led_lit(self):
-        return (ah.light[1].read() == 0)
+        return (self._get_led_level(1) == 0)
 
     def is_red_led_lit(self):
-        return (ah.light[2].read() == 0)
+        return (self._get_led_level(2) == 0)
 
     def turn_off_all_ind_leds(self):
         for led_num in self.ind_led_list:
-            ah.light[led_num].off()
+            self._light_led(led_num, 0)
 
     def read_voltage(self, analog_pin_num):
         assert analog_pin_num in self.analog_list, "Called Controller.read_voltage() with invalid analog_pin_num %d" % analog_pin_num
-        return ah.analog[analog_pin_num].read()
+        with self.hw_lock:
+            return ah.analog[analog_pin_num].read()
 
     def is_input_high(self, input_pin_num):
         assert input_pin_num in self.input_list, "Called Controller.is_input_high() with invalid input_pin_num %d" % input_pin_num
-        return ah.input[input_pin_num].is_on()
+        with self.hw_lock:
+            return ah.input[input_pin_num].is_on()
 
     def is_input_low(self, input_pin_num):
         assert input_pin_num in self.input_list, "Called Controller.is_input_low() with invalid input_pin_num %d" % input_pin_num
-        return ah.input[input_pin_num].is_off()
+        with self.hw_lock:
+            return ah.input[input_pin_num].is_off()
 
     def is_relay_on(self, relay_num):
+        """Returns shadow state (hardware read only if state not yet known).
+        """
         assert relay_num in self.relay_list, "Called Controller.is_relay_on() with invalid relay_num %d" % relay_num
-        return ah.relay[relay_num].is_on()
+        if self.relay_shadow[relay_num] is None:
+            with self.hw_lock:
+                self.relay_shadow[relay_num] = ah.relay[relay_num].is_on()
+        return self.relay_shadow[relay_num]
 
     def is_relay_off(self, relay_num):
         assert relay_num in self.relay_list, "Called Controller.is_relay_off() with invalid relay_num %d" % relay_num
-        return ah.relay[relay_num].is_off()
+        return not self.is_relay_on(relay_num)
 
-    def close_relay(self, relay_num):
+    def close_relay(self, relay_num, force=False):
+        """Skips write if relay already closed (per shadow state) unless force is True.
+        Read-back verified at next flush_outputs().
+        """
         assert relay_num in self.relay_list, "Called Controller.close_relay() with invalid relay_num %d" % relay_num
-        ah.relay[relay_num].on()
-        assert self.is_relay_on(relay_num), "Tried to close relay %d but follow-up check failed." % relay_num
+        if self.relay_closes_blocked:
+            raise ChargeControlError("Relay %d close refused (outputs shut down)." % relay_num)
+        if self.relay_shadow[relay_num] is True and not force:
+            return
+        with self.hw_lock:
+            ah.relay[relay_num].on()
+            self.relay_shadow[relay_num] = True
+            self.relays_unverified.add(relay_num)
 
-    def open_relay(self, relay_num):
+    def open_relay(self, relay_num, force=False):
         assert relay_num in self.relay_list, "Called Controller.open_relay() with invalid relay_num %d" % relay_num
-        ah.relay[relay_num].off()
-        assert self.is_relay_off(relay_num), "Tried to open relay %d but follow-up check failed." % relay_num
+        if self.relay_shadow[relay_num] is False and not force:
+            return
+        with self.hw_lock:
+            ah.relay[relay_num].off()
+            self.relay_shadow[relay_num] = False
+            self.relays_unverified.add(relay_num)
 
     def open_all_relays(self):
+        """Always writes to hardware and verifies immediately (safety path).
+        """
         # Make sure charge-enable relay opened first (e.g., before charge-direction one)
-        self.open_relay(CHARGER_ENABLE_RELAY)
+        self.open_relay(CHARGER_ENABLE_RELAY, force=True)
         time.sleep(0.2)
         for relay_num in self.relay_list:
-            self.open_relay(relay_num)
+            self.open_relay(relay_num, force=True)
+        failures = self._verify_relays()
+        if failures:
+            raise ChargeControlError(" ".join(failures)) # Not exit_program() - exit paths call this.
+
+    def _open_relays_for_exit(self):
+        """Called first on exit paths. Never raises, so exit proceeds even if a relay fails read-back
+        (what exit_program() may be reporting) or AutomationHAT faulted.
+        """
+        self.block_relay_closes()
+        try:
+            self.open_all_relays()
+        except Exception as e:
+            print("Relay check on exit failed (%r). Opening each relay again." % e, file=sys.stderr)
+            for relay_num in [CHARGER_ENABLE_RELAY] + self.relay_list:
+                try:
+                    self.open_relay(relay_num, force=True)
+                except Exception:
+                    pass
 
     def exit_program(self, ProgFault, err_message):
-        self.light_blue_led()
-        self.light_red_led()
-        time.sleep(3)
-        self.turn_off_all_ind_leds()
-        time.sleep(1)
-        self.open_all_relays()
-        time.sleep(1)
+        self._open_relays_for_exit()
+        try:
+            self.light_blue_led()
+            self.light_red_led()
+            self.flush_outputs(verify=False)
+            time.sleep(3)
+            self.turn_off_all_ind_leds()
+            self.flush_outputs(verify=False)
+            time.sleep(1)
+        except Exception:
+            # If AutomationHAT errored out, skip nice-to-have feature of LED indication.
+            pass
         raise ProgFault(err_message)
 
     def reboot(self, delay_s):
+        self._open_relays_for_exit()
         try:
             self.turn_off_all_ind_leds()
             self.light_red_led(1)
-            self.open_all_relays()
+            self.flush_outputs(verify=False)
         except:
             # If AutomationHAT errored out, skip nice-to-have feature of LED indication.
             pass
@@ -869,10 +3008,11 @@ class Controller(object):
             sys.exit(250) # https://medium.com/@himanshurahangdale153/list-of-exit-status-codes-in-linux-f4c00c46c9e0
 
     def shut_down(self, delay_s):
+        self._open_relays_for_exit()
         try:
             self.turn_off_all_ind_leds()
             self.light_red_led(1)
-            self.open_all_relays()
+            self.flush_outputs(verify=False)
         except:
             # If AutomationHAT errored out, skip nice-to-have feature of LED indication.
             pass
@@ -888,18 +3028,218 @@ class Controller(object):
     def sigterm_handler(self, _signo, _stack_frame):
         """Pipe kill signal from Linux to this Python script to allow graceful exit.
         """
-        self.turn_off_all_ind_leds()
-        self.open_all_relays()
+        self._open_relays_for_exit()
+        try:
+            self.turn_off_all_ind_leds()
+            self.flush_outputs(verify=False)
+        except Exception:
+            pass
         sys.exit(0)
         # https://stackoverflow.com/questions/18499497/how-to-process-sigterm-signal-gracefully
 
 
+class BatteryEstimator(object):
+    def __init__(self, name, internal_r_ohm):
+        """Recursive (scalar Kalman filter) estimate of battery open-circuit voltage.
+        Each raw terminal-voltage sample is load-compensated for IR drop
+        (V_ocv = V_terminal - R*I, I positive when battery being charged) and folded into
+        estimate in constant time. Variance grows w/ time between samples (faster while readings
+        unusable) and jumps when charging changes, so confidence reflects how well-settled estimate is.
+        Confident only after OCV_EST_MIN_SETTLED_SEC of usable readings since last such change.
+        """
+        self.name = name
+        self.internal_r_ohm = internal_r_ohm
+        self.ocv = None
+        self.variance = None
+        self.last_update_time = None # monotonic
+        self.settled_since = None # monotonic. Last charging change, or first usable reading after unusable ones.
+        self.tracking = False # False while readings unusable (estimate stale even if variance still low).
+
+    def update(self, v_terminal, current_a, usable=True):
+        """Pass usable=False if reading can't be compensated (e.g., unmeasured alternator current).
+        Estimate then only loses confidence.
+        """
+        time_now = time.monotonic()
+        if self.ocv is None:
+            if usable:
+                self.ocv = v_terminal - self.internal_r_ohm * current_a
+                self.variance = OCV_EST_MEAS_NOISE_V2
+                self.last_update_time = time_now
+                self.settled_since = time_now
+                self.tracking = True
+            return
+
+        noise_rate = OCV_EST_PROCESS_NOISE_V2_PER_S if self.tracking else OCV_EST_STALE_NOISE_V2_PER_S
+        self.variance += noise_rate * (time_now - self.last_update_time)
+        self.last_update_time = time_now
+        if usable and not self.tracking:
+            self.settled_since = time_now # e.g., engine stopped. Battery still settling.
+        self.tracking = usable
+        if not usable:
+            return
+        v_ocv_msmt = v_terminal - self.internal_r_ohm * current_a
+        gain = self.variance / (self.variance + OCV_EST_MEAS_NOISE_V2)
+        self.ocv += gain * (v_ocv_msmt - self.ocv)
+        self.variance *= (1 - gain)
+
+    def add_uncertainty(self, variance_v2):
+        """Call when charging starts, stops or reverses.
+        """
+        if self.variance is not None:
+            self.variance += variance_v2
+            self.settled_since = time.monotonic()
+
+    def get_estimate(self):
+        """Returns (OCV, std dev) in volts, or (None, None) if no usable sample yet.
+        """
+        if self.ocv is None:
+            return (None, None)
+        return (self.ocv, math.sqrt(self.variance))
+
+    def is_confident(self):
+        return (self.tracking and math.sqrt(self.variance) <= OCV_EST_CONFIDENT_STD_V
+                and time.monotonic() - self.settled_since >= OCV_EST_MIN_SETTLED_SEC)
+
+    def get_state(self):
+        return {"ocv": self.ocv, "variance": self.variance, "last_update_time": self.last_update_time,
+                "settled_since": self.settled_since, "tracking": self.tracking}
+
+    def set_state(self, state):
+        """Monotonic timestamp only valid within same boot (checkpoint restore checks this).
+        """
+        self.ocv = state["ocv"]
+        self.variance = state["variance"]
+        self.last_update_time = state["last_update_time"]
+        self.settled_since = state.get("settled_since", time.monotonic()) # Older checkpoint - treat as unsettled.
+        self.tracking = state["tracking"]
+
+
+class FaultDetector(object):
+    # name -> (fault raised when debounced - None to only warn, message format w/ measured value)
+    INVARIANTS = {
+        "main_batt_present":      (SystemVoltageError, "No main voltage detected (reading %.2fV)."),
+        "aux_batt_present":       (SystemVoltageError, "No aux voltage detected (reading %.2fV)."),
+        "current_when_enabled":   (ChargeOverrideException,
+                                   "No charge current detected despite charging enabled (reading %.2fA)."),
+        "no_current_when_off":    (ChargeOverrideException,
+                                   "Charge current detected despite charging disabled (reading %.2fA)."),
+        "charger_output_fwd":     (ChargeControlError,
+                                   "Charge-direction relay failed closed (charger output %.2fV off from main voltage)."),
+        "charger_output_rev":     (ChargeControlError,
+                                   "Charge-direction relay failed open (charger output %.2fV off from aux voltage)."),
+        "no_w_signal_when_off":   (SystemVoltageError, "ECU W signal HIGH but key OFF (main voltage %.2fV)."),
+        "shunt_zero_drift":       (None, "Shunt reading drifting while not charging (avg %.2fA)."),
+    }
+
+    def __init__(self, Output):
+        """Incremental checks of wiring/relay/shunt invariants against every logged sample.
+        Each invariant keeps running stats (EWMA of measured quantity, counts, current violation
+        streak), so cost per sample is constant. A fault is raised only once an invariant has been
+        violated continuously for FAULT_DEBOUNCE_SEC over at least FAULT_DEBOUNCE_MIN_SAMPLES samples,
+        so single-sample transients don't trip it.
+        """
+        self.Output = Output
+        self.stats = {name: {"samples": 0, "violations": 0, "ewma": None,
+                             "violating_since": None, "streak": 0, "active": False}
+                      for name in self.INVARIANTS}
+        self.last_charge_mode = None
+        self.charge_mode_change_time = None # monotonic
+
+    def _evaluate(self, sample, charger_output_v, w_signal_high, settled):
+        """Returns {name: (violated, measured value)} for invariants that apply to this sample.
+        """
+        results = {"main_batt_present": (sample["Vmain_raw"] < MIN_BATT_PRESENT_V, sample["Vmain_raw"]),
+                   "aux_batt_present":  (sample["Vaux_raw"] < MIN_BATT_PRESENT_V, sample["Vaux_raw"])}
+        current = sample["charge_current"]
+        if not sample["charge_enable"]:
+            results["no_current_when_off"] = (current > MIN_CHARGE_CURRENT_A, current)
+            drift_ewma = self._get_next_ewma("shunt_zero_drift", current)
+            results["shunt_zero_drift"] = (abs(drift_ewma) > MIN_CHARGE_CURRENT_A / 2, current) # Offset either way.
+        elif settled:
+            results["current_when_enabled"] = (current < MIN_CHARGE_CURRENT_A, current)
+        if settled:
+            # Direction relay connects charger output to source battery (main when fwd, aux when rev).
+            if sample["charge_dir"]:
+                results["charger_output_fwd"] = (abs(charger_output_v - sample["Vmain_raw"]) > CHARGER_OUTPUT_V_TOL,
+                                                 charger_output_v - sample["Vmain_raw"])
+            else:
+                results["charger_output_rev"] = (abs(charger_output_v - sample["Vaux_raw"]) > CHARGER_OUTPUT_V_TOL,
+                                                 charger_output_v - sample["Vaux_raw"])
+        if not sample["key_ACC"]:
+            results["no_w_signal_when_off"] = (w_signal_high, sample["Vmain_raw"])
+        return results
+
+    def _get_next_ewma(self, name, value):
+        ewma = self.stats[name]["ewma"]
+        return value if ewma is None else ewma + FAULT_EWMA_ALPHA * (value - ewma)
+
+    def update(self, sample, charger_output_v, w_signal_high):
+        """Fold one sample (Vehicle.latest_sample) into invariant stats.
+        Returns list of (name, message) for faults that became active w/ this sample.
+        """
+        time_now = time.monotonic()
+        charge_mode = (sample["charge_enable"], sample["charge_dir"])
+        if charge_mode != self.last_charge_mode:
+            self.last_charge_mode = charge_mode
+            self.charge_mode_change_time = time_now
+        settled = (time_now - self.charge_mode_change_time) >= FAULT_SETTLE_SEC
+
+        results = self._evaluate(sample, charger_output_v, w_signal_high, settled)
+        new_faults = []
+        for name, stats in self.stats.items():
+            violated, value = results.get(name, (False, None))
+            if value is not None:
+                stats["samples"] += 1
+                stats["ewma"] = self._get_next_ewma(name, value)
+            if not violated:
+                if stats["active"]:
+                    self.Output.print_info("Fault '%s' cleared." % name, category="fault", invariant=name)
+                stats["violating_since"] = None
+                stats["streak"] = 0
+                stats["active"] = False
+                continue
+            stats["violations"] += 1
+            stats["streak"] += 1
+            if stats["violating_since"] is None:
+                stats["violating_since"] = time_now
+            if (not stats["active"] and stats["streak"] >= FAULT_DEBOUNCE_MIN_SAMPLES
+                    and (time_now - stats["violating_since"]) >= FAULT_DEBOUNCE_SEC):
+                stats["active"] = True
+                measured = stats["ewma"] if name == "shunt_zero_drift" else value
+                new_faults.append((name, self.INVARIANTS[name][1] % measured))
+        return new_faults
+
+    def is_any_suspect(self):
+        """True while any invariant is mid-streak, not yet raised (so caller can sample faster to confirm or clear it).
+        """
+        return any(stats["violating_since"] is not None and not stats["active"] for stats in self.stats.values())
+
+    def get_active(self):
+        return [name for name, stats in self.stats.items() if stats["active"]]
+
+    def print_stats(self):
+        self.Output.print_debug("Fault-detector invariants (samples, violations, avg):")
+        for name, stats in self.stats.items():
+            if stats["samples"]:
+                self.Output.print_debug("\t%-24s %8d  %6d  %7.2f%s" % (name, stats["samples"], stats["violations"],
+                                                                       stats["ewma"],
+                                                                       "  ACTIVE" if stats["active"] else ""))
+
+
 class Vehicle(object):
-    def __init__(self, Output, Timer):
+    def __init__(self, Output, Timer, Dog=None):
+        """Dog is optional Watchdog kept fed during long DataLogger jobs (startup migration, backup).
+        """
         self.Output = Output
         self.Timer = Timer
-        self.DataLogger = DataLogger(Output)
+        self.Dog = Dog
+        self.DataLogger = DataLogger(Output, staging_path=DATA_LOG_STAGING_PATH,
+                                     progress_fxn=Dog.keep_alive if Dog is not None else None)
         self.BattCharger = BatteryCharger(self.Output, self.Timer)
+        self.Faults = FaultDetector(self.Output)
+        self.Sampling = SamplingPolicy(self.Output, self.Timer, self.BattCharger, Faults=self.Faults)
+        self.Phases = LoopPhaseTimer(self.Output)
+        self.Params = ControlParamStore(self.Output)
 
         self.key_acc_detect_pin = KEY_ACC_INPUT_PIN
         self.engine_on_detect_pin = ENGINE_ON_INPUT_PIN
@@ -909,6 +3249,11 @@ class Vehicle(object):
 
         self.led_level = 0
 
+        self.main_batt_est = BatteryEstimator("Main", MAIN_BATT_INTERNAL_R_OHM)
+        self.aux_batt_est = BatteryEstimator("Aux", AUX_BATT_INTERNAL_R_OHM)
+        self.last_charge_mode = None # (charging, charge_dir_fwd) at previous sample
+        self.latest_sample = None
+
         Controller().open_all_relays()
         time.sleep(1)                # Give time for AutomationHAT inputs to stabilize.
         self.check_wiring()
@@ -916,43 +3261,131 @@ class Vehicle(object):
         self.log_data()
 
     def log_data(self):
+        timestamp_now = self.Timer.get_time_now()
+        v_main_raw = self.get_main_voltage_raw(log=False)
+        v_aux_raw = self.get_aux_voltage_raw(log=False)
+        charging = self.BattCharger.is_charging()
+        charge_dir_fwd = self.BattCharger.is_charge_direction_fwd()
+        charge_current_raw = self.get_charge_current_raw()
+        enable_sw = self.is_enable_switch_closed(log=False)
+        key_acc = self.is_acc_powered()
+        engine_running = self.is_engine_running(log=False)
+        analog_voltages = [Controller().read_voltage(n) for n in [0, 1, 2]]
+        inputs_high = [Controller().is_input_high(n) for n in [0, 1, 2]]
+        self._update_estimators(v_main_raw, v_aux_raw, charging, charge_dir_fwd, charge_current_raw, engine_running)
+
+        # Kept in memory for status API (StatusServer).
+        self.latest_sample = {"Timestamp": timestamp_now.strftime(DATETIME_FORMAT_SQL),
+                              "Vmain_raw": v_main_raw,
+                              "Vaux_raw": v_aux_raw,
+                              "Vmain_ocv_est": self.main_batt_est.get_estimate()[0],
+                              "Vaux_ocv_est": self.aux_batt_est.get_estimate()[0],
+                              "charge_enable": charging,
+                              "charge_dir": charge_dir_fwd,
+                              "charge_current": charge_current_raw,
+                              "enable_sw": enable_sw,
+                              "key_ACC": key_acc,
+                              "engine_on": engine_running}
+
         # DataLogger methods check that time is valid before committing data to db.
-        self.DataLogger.log_voltages(self.Timer.get_time_now(),
-                                     [self.get_main_voltage_raw(log=False),
-                                      self.get_aux_voltage_raw(log=False)]
+        self.DataLogger.log_voltages(timestamp_now,
+                                     [v_main_raw,
+                                      v_aux_raw]
                                     )
-        self.DataLogger.log_charging(self.Timer.get_time_now(),
-                                     [self.BattCharger.is_charging(),
-                                      self.BattCharger.is_charge_direction_fwd(),
-                                      self.get_charge_current_raw(),
+        self.DataLogger.log_charging(timestamp_now,
+                                     [charging,
+                                      charge_dir_fwd,
+                                      charge_current_raw,
                                       self.BattCharger.get_adc_diff_V()]
                                     )
-        self.DataLogger.log_signals(self.Timer.get_time_now(),
-                                    [self.is_enable_switch_closed(log=False),
-                                     self.is_acc_powered(),
-                                     Controller().is_input_high(self.engine_on_detect_pin),
-                                     self.is_engine_running(log=False),
-                                     self.Timer.get_network_name(log=False),
-                                     *[Controller().read_voltage(n) for n in [0, 1, 2]],
-                                     *[Controller().is_input_high(n) for n in [0, 1, 2]],
+        self.DataLogger.log_derived(timestamp_now, v_main_raw, v_aux_raw, charge_dir_fwd, charge_current_raw)
+        derived_values = self.DataLogger.latest_derived[1] # Same filtered voltages decisions use.
+        self.latest_sample["Vmain_filt"] = derived_values["Vmain_filt"]
+        self.latest_sample["Vaux_filt"] = derived_values["Vaux_filt"]
+        self.DataLogger.log_signals(timestamp_now,
+                                    [enable_sw,
+                                     key_acc,
+                                     inputs_high[self.engine_on_detect_pin],
+                                     engine_running,
+                                     self.Timer.get_network_name(log=False, max_age_s=NETWORK_NAME_MAX_AGE_SEC),
+                                     *analog_voltages,
+                                     *inputs_high,
                                      *[Controller().is_relay_on(n) for n in [0, 1, 2]],
                                      os.getpid()]
                                    )
+        self.DataLogger.commit_if_due()
+        self.Sampling.record_sample()
+        # After logging so sample that confirms fault is in DB.
+        self._handle_faults(self.Faults.update(self.latest_sample,
+                                               charger_output_v=analog_voltages[CHARGER_OUTPUT_V_PIN],
+                                               w_signal_high=inputs_high[self.engine_on_detect_pin]))
+
+    def _handle_faults(self, new_faults):
+        for name, message in new_faults:
+            fault_type = FaultDetector.INVARIANTS[name][0]
+            if fault_type is None:
+                self.Output.print_warn(message, category="fault", invariant=name)
+            else:
+                self.Output.print_err(message, category="fault", invariant=name)
+                Controller().exit_program(fault_type, message)
+
+    def _update_estimators(self, v_main_raw, v_aux_raw, charging, charge_dir_fwd, charge_current_raw, engine_running):
+        charge_mode = (charging, charge_dir_fwd)
+        if self.last_charge_mode is not None and charge_mode != self.last_charge_mode:
+            # Surface charge / transient after charging change. Let estimates re-converge quickly.
+            self.main_batt_est.add_uncertainty(OCV_EST_TRANSITION_V2)
+            self.aux_batt_est.add_uncertainty(OCV_EST_TRANSITION_V2)
+        self.last_charge_mode = charge_mode
+
+        # Shunt current treated as flowing out of source battery and into destination one
+        # (converter ratio absorbed into each battery's internal_r_ohm). Shunt reads noise when not charging.
+        main_current = 0
+        if charging:
+            main_current = charge_current_raw if charge_dir_fwd else -charge_current_raw
+        # Alternator current not measured, so main reading not usable while engine running.
+        self.main_batt_est.update(v_main_raw, main_current, usable=not engine_running)
+        self.aux_batt_est.update(v_aux_raw, -main_current)
+
+    def reinit_hardware(self):
+        """Re-create AutomationHAT, ADC, and RTC driver objects after I2C fault (e.g., after
+        sys-time jump) and return outputs to startup state. Called for in-process recovery.
+        """
+        try:
+            Controller().open_all_relays()
+        except Exception:
+            pass # HAT may be what faulted. Relays opened again below after reinit.
+        Controller().reinit_hat()
+        self.BattCharger.set_up_adc_board()
+        self.Timer.set_up_rtc()
+        Controller().open_all_relays()
+        time.sleep(1)                # Give time for AutomationHAT inputs to stabilize.
+        Controller().close_relay(self.keepalive_relay_num) # Keep on whenever device is on.
+
+    def get_checkpoint_state(self):
+        return {"charging": self.BattCharger.is_charging(),
+                "charge_dir_fwd": self.BattCharger.is_charge_direction_fwd(),
+                "estimators": {"main": self.main_batt_est.get_state(),
+                               "aux": self.aux_batt_est.get_state()}}
+
+    def restore_checkpoint_state(self, vehicle_state):
+        self.main_batt_est.set_state(vehicle_state["estimators"]["main"])
+        self.aux_batt_est.set_state(vehicle_state["estimators"]["aux"])
 
     def check_datalogging(self):
-        if not self.Output.is_time_valid():
-            # Datalogger won't be logging
-            return
-        time_now = self.Timer.get_time_now()
-        threshold_s = 5 # Amount of time (in seconds) expected to always contain at least two log entries
-        table_accessors = [self.DataLogger.get_voltages,
-                           self.DataLogger.get_charging,
-                           self.DataLogger.get_signals]
-        for get_table in table_accessors:
-            if get_table(time_now, threshold_s).empty:
-                Controller().exit_program(DataLoggingError, "Datalogging has lapsed for >%d seconds." % threshold_s)
+        """Cheap enough (no DB query) to call every pass. Returns True if datalogging healthy.
+        """
+        # Allow for time between samples when sampling slowly (SamplingPolicy).
+        lapse_threshold_s = DATALOG_LAPSE_THRESHOLD_SEC + self.Sampling.get_interval()
+        lapsed_tables = self.DataLogger.get_lapsed_tables(lapse_threshold_s)
+        if lapsed_tables:
+            Controller().exit_program(DataLoggingError, "Datalogging has lapsed for >%d seconds (%s)."
+                                                        % (lapse_threshold_s, ", ".join(lapsed_tables)))
+        return True
 
     def check_wiring(self):
+        """Startup check on single readings (before any samples exist).
+        Ongoing checks run on every sample in FaultDetector.
+        """
         if self.get_main_voltage_raw() < 5:
             # No FLA voltage detected
             output_str = "No main voltage detected (reading %.2fV)." % self.get_main_voltage_raw(log=False)
@@ -980,11 +3413,11 @@ class Vehicle(object):
         #     self.Output.print_err(output_str)
         #     raise ChargeControlError(output_str)
 
-        if self.BattCharger.is_charge_direction_fwd() and not np.isclose(self.get_main_voltage_raw(), self.BattCharger.get_charger_output_V(), atol=0.05):
+        if self.BattCharger.is_charge_direction_fwd() and not math.isclose(self.get_main_voltage_raw(), self.BattCharger.get_charger_output_V(), abs_tol=0.05):
             output_str = "Charge-direction relay failed closed (charger output voltage =/= main voltage)."
             self.Output.print_err(output_str)
             raise ChargeControlError(output_str)
-        elif self.BattCharger.is_charge_direction_rev() and not np.isclose(self.get_aux_voltage_raw(), self.BattCharger.get_charger_output_V(), atol=0.05):
+        elif self.BattCharger.is_charge_direction_rev() and not math.isclose(self.get_aux_voltage_raw(), self.BattCharger.get_charger_output_V(), abs_tol=0.05):
             output_str = "Charge-direction relay failed open (charger output voltage =/= aux voltage)."
             self.Output.print_err(output_str)
             raise ChargeControlError(output_str)
@@ -1033,9 +3466,9 @@ class Vehicle(object):
 
         enable_detect = Controller().is_input_high(self.enable_sw_detect_pin)
         if log and enable_detect:
-            self.Output.print_info("Enable switch ON")
+            self.Output.print_info("Enable switch ON", category="state")
         elif log:
-            self.Output.print_warn("Enable switch OFF")
+            self.Output.print_warn("Enable switch OFF", category="state")
         return enable_detect
 
     def get_main_voltage_raw(self, log=False):
@@ -1053,8 +3486,12 @@ class Vehicle(object):
     def get_main_voltage(self, log=False):
         elevated = False
 
-        voltage_trailing_msmts = self.DataLogger.get_voltages(self.Timer.get_time_now(), DB_SAMPLE_TRAILING_SEC, ["Vmain_raw"])
-        voltage_est = np.median(voltage_trailing_msmts["Vmain_raw"].to_list() + [self.get_main_voltage_raw(log=False)])
+        trailing_s = self.Sampling.get_trailing_window_s()
+        timestamp_now = self.Timer.get_time_now()
+        voltage_est = self.DataLogger.get_filtered_voltage(timestamp_now, trailing_s, "Vmain_filt")
+        if voltage_est is None:
+            voltage_trailing_msmts = self.DataLogger.get_voltage_values(timestamp_now, trailing_s, "Vmain_raw")
+            voltage_est = statistics.median(voltage_trailing_msmts + [self.get_main_voltage_raw(log=False)])
 
         if self.is_engine_running(v_main=voltage_est):
             # Currently being charged, elevating voltage
@@ -1077,7 +3514,7 @@ class Vehicle(object):
 
         if log:
             self.Output.print_debug("FLA battery-voltage reading (%ds trail): %.2fV%s."
-                                    % (DB_SAMPLE_TRAILING_SEC, voltage_est,
+                                    % (trailing_s, voltage_est,
                                        (" (assumed elevated)" if elevated else "")))
         return voltage_est
 
@@ -1125,8 +3562,12 @@ class Vehicle(object):
         elevated = False
         depressed = False
 
-        voltage_trailing_msmts = self.DataLogger.get_voltages(self.Timer.get_time_now(), DB_SAMPLE_TRAILING_SEC, ["Vaux_raw"])
-        voltage_est = np.median(voltage_trailing_msmts["Vaux_raw"].to_list() + [self.get_aux_voltage_raw(log=False)])
+        trailing_s = self.Sampling.get_trailing_window_s()
+        timestamp_now = self.Timer.get_time_now()
+        voltage_est = self.DataLogger.get_filtered_voltage(timestamp_now, trailing_s, "Vaux_filt")
+        if voltage_est is None:
+            voltage_trailing_msmts = self.DataLogger.get_voltage_values(timestamp_now, trailing_s, "Vaux_raw")
+            voltage_est = statistics.median(voltage_trailing_msmts + [self.get_aux_voltage_raw(log=False)])
 
         if self.BattCharger.is_charging() and self.BattCharger.is_charge_direction_fwd():
             # Currently charging starter battery, depressing aux-batt voltage.
@@ -1147,7 +3588,7 @@ class Vehicle(object):
 
         if log:
             self.Output.print_debug("Li battery-voltage reading (%ds trail): %.2fV%s."
-                                        % (DB_SAMPLE_TRAILING_SEC, voltage_est,
+                                        % (trailing_s, voltage_est,
                                            (" (assumed elevated)" if elevated
                                                                   else (" (assumed depressed)" if depressed
                                                                         else ""))))
@@ -1182,30 +3623,57 @@ class Vehicle(object):
         return voltage_diff * SHUNT_AMP_VOLTAGE_RATIO
 
     def get_charge_current(self):
-        current_trailing_msmts = self.DataLogger.get_charging(self.Timer.get_time_now(), DB_SAMPLE_TRAILING_SEC, ["charge_current"])
-        current_est = np.median(current_trailing_msmts["charge_current"].to_list() + [self.get_charge_current_raw()])
+        trailing_s = self.Sampling.get_trailing_window_s()
+        current_trailing_msmts = self.DataLogger.get_charging_values(self.Timer.get_time_now(), trailing_s, "charge_current")
+        current_est = statistics.median(current_trailing_msmts + [self.get_charge_current_raw()])
         return current_est
 
+    def get_main_ocv(self, log=False):
+        return self._get_ocv(self.main_batt_est, log=log)
+
+    def get_aux_ocv(self, log=False):
+        return self._get_ocv(self.aux_batt_est, log=log)
+
+    def _get_ocv(self, batt_est, log=False):
+        ocv, std_dev = batt_est.get_estimate()
+        if log and ocv is not None:
+            self.Output.print_debug("%s battery open-circuit voltage est: %.2fV (±%.2fV)." % (batt_est.name, ocv, std_dev))
+        return ocv
+
+    def _get_decision_voltage(self, batt_est, get_filtered_voltage, log=False):
+        """Voltage to compare against charge thresholds. Uses load-compensated OCV estimate if
+        confident (no need to wait for voltage to stabilize after charging change). Otherwise
+        falls back to filtered voltage once stable. Returns None if neither available yet.
+        """
+        if batt_est.is_confident():
+            return self._get_ocv(batt_est, log=log)
+        elif self.Timer.is_sys_voltage_stable():
+            return get_filtered_voltage(log=log)
+        else:
+            return None
+
     def is_starter_batt_low(self, log=True):
-        if not self.Timer.is_sys_voltage_stable():
+        est_voltage = self._get_decision_voltage(self.main_batt_est, self.get_main_voltage, log=log)
+        if est_voltage is None:
             return False
-        est_voltage = self.get_main_voltage(log=log)
         is_low = est_voltage < MAIN_V_MIN
         if log and is_low:
             self.Output.print_warn("Starter-batt voltage %.2fV below min allowed %.2fV." % (est_voltage, MAIN_V_MIN))
         return is_low
 
     def is_starter_batt_charged(self, log=False):
-        if not self.Timer.is_sys_voltage_stable():
+        est_voltage = self._get_decision_voltage(self.main_batt_est, self.get_main_voltage, log=log)
+        if est_voltage is None:
             return True
         else:
-            return (self.get_main_voltage(log=log) >= MAIN_V_CHARGED)
+            return (est_voltage >= MAIN_V_CHARGED)
 
     def does_starter_batt_need_charge(self, log=False):
         return not self.is_starter_batt_charged(log=log)
 
     def is_aux_batt_empty(self, threshold_override=None, log=True):
-        if not self.Timer.is_sys_voltage_stable():
+        est_voltage = self._get_decision_voltage(self.aux_batt_est, self.get_aux_voltage, log=log)
+        if est_voltage is None:
             return False
 
         if threshold_override is not None:
@@ -1213,7 +3681,6 @@ class Vehicle(object):
         else:
             threshold = AUX_V_MIN
 
-        est_voltage = self.get_aux_voltage(log=log)
         is_low = est_voltage < threshold
         if log and is_low:
             self.Output.print_warn("Aux-batt voltage %.2fV below min allowed %.2fV."
@@ -1227,9 +3694,9 @@ class Vehicle(object):
         return not self.is_aux_batt_empty(threshold_override=threshold_override, log=log)
 
     def is_aux_batt_full(self, log=False):
-        if not self.Timer.is_sys_voltage_stable():
+        est_voltage = self._get_decision_voltage(self.aux_batt_est, self.get_aux_voltage, log=log)
+        if est_voltage is None:
             return False
-        est_voltage = self.get_aux_voltage(log=log)
         is_full = est_voltage >= AUX_V_MAX
         if log and is_full:
             self.Output.print_debug("Aux batt full (%.2fV)" % est_voltage)
@@ -1254,7 +3721,7 @@ class Vehicle(object):
         # self.roll_indicator_light(Controller().light_blue_led)
         Controller().toggle_blue_led()
         if log:
-            self.Output.print_info("Charging starter battery.")
+            self.Output.print_info("Charging starter battery.", category="charge", direction="fwd")
         if post_delay:
             time.sleep(VOLTAGE_STABILIZATION_TIME_SEC)
             self.check_wiring() # includes charge-direction check. Run at start of charging only.
@@ -1280,7 +3747,7 @@ class Vehicle(object):
         Controller().toggle_green_led()
 
         if log:
-            self.Output.print_info("Charging auxiliary battery.")
+            self.Output.print_info("Charging auxiliary battery.", category="charge", direction="rev")
         if post_delay:
             time.sleep(VOLTAGE_STABILIZATION_TIME_SEC)
             self.check_wiring() # includes charge-direction check. Run at start of charging only.
@@ -1299,13 +3766,16 @@ class Vehicle(object):
         self.BattCharger.disable_charge()
         Controller().turn_off_all_ind_leds()
         if log and charging_was_active:
-            self.Output.print_info("Stopped charging.")
+            self.Output.print_info("Stopped charging.", category="charge")
 
     def shut_down_controller(self, delay=5):
-        self.DataLogger.run_backup(self.Timer.get_time_now(string_format=DATE_FORMAT))
+        self.DataLogger.checkpoint()
+        self.DataLogger.run_backup() # Named after waiting for valid time if needed.
         self.Timer.update_rtc(force=True, wait=False, log=True) # Use system time to update RTC if sync'd w/ NTP.
         Controller().turn_off_all_ind_leds()
-        self.Output.print_warn("Shutting down controller in %d seconds." % delay)
+        self.Output.print_warn("Shutting down controller in %d seconds." % delay, category="program", delay_s=delay)
+        if self.Dog is not None:
+            self.Dog.keep_alive(force=True) # Fresh ping, so delay can't run past WatchdogSec.
         Controller().shut_down(delay_s=delay)
 
     def output_status(self):
@@ -1322,6 +3792,10 @@ class Vehicle(object):
                                % (("ON" if engine_on_state else "OFF"), ("HIGH" if ecu_w_signal_high else "LOW")))
         self.Output.print_info("\tMain (filtered/raw): %.2f/%.2f" % (self.get_main_voltage(), self.get_main_voltage_raw()))
         self.Output.print_info("\tAux  (filtered/raw): %.2f/%.2f" % (self.get_aux_voltage(), self.get_aux_voltage_raw()))
+        for batt_est in [self.main_batt_est, self.aux_batt_est]:
+            ocv, std_dev = batt_est.get_estimate()
+            if ocv is not None:
+                self.Output.print_info("\t%-4s OCV est: %.2f (±%.2f)" % (batt_est.name, ocv, std_dev))
         self.Output.print_info("\t%s" % (      ("Charging -> FLA (%.2fA)." % charge_current) if charging_fla
                                          else (("Charging -> Li (%.2fA)." % charge_current) if charging_li
                                          else  "Not charging.")))
@@ -1341,7 +3815,8 @@ class BatteryCharger(object):
         self.adc_board.gain = 16
 
     def get_adc_diff_V(self):
-        return abs(AnalogIn(self.adc_board, ads1x15.Pin.A0, ads1x15.Pin.A1).voltage)
+        with Controller.hw_lock:
+            return abs(AnalogIn(self.adc_board, ads1x15.Pin.A0, ads1x15.Pin.A1).voltage)
 
     def get_charger_output_V(self):
         return Controller().read_voltage(CHARGER_OUTPUT_V_PIN)
@@ -1349,14 +3824,12 @@ class BatteryCharger(object):
     def is_charging(self):
         return Controller().is_relay_on(CHARGER_ENABLE_RELAY)
 
+    # Relay writes read back at next Controller.flush_outputs(), which exits program on mismatch.
     def enable_charge(self):
         if not self.is_charging():
             Controller().close_relay(CHARGER_ENABLE_RELAY)
             time.sleep(0.5)
             self.Timer.set_charge_start_time()
-        if not self.is_charging():
-            self.Output.print_err("BatteryCharger.enable_charge() failed to start charging.")
-            Controller().exit_program(ChargeControlError, "BatteryCharger.enable_charge() failed to start charging.")
 
     def disable_charge(self):
         if self.is_charging():
@@ -1368,13 +3841,6 @@ class BatteryCharger(object):
             Controller().open_relay(CHARGE_DIRECTION_RELAY)
             time.sleep(0.2)
 
-        if self.is_charging():
-            self.Output.print_err("BatteryCharger.disable_charge() failed to stop charging.")
-            Controller().exit_program(ChargeControlError, "BatteryCharger.disable_charge() failed to stop charging.")
-        if not Controller().is_relay_off(CHARGE_DIRECTION_RELAY):
-            self.Output.print_err("BatteryCharger.disable_charge() failed to open charge-direction relay.")
-            Controller().exit_program(ChargeControlError, "BatteryCharger.disable_charge() failed to open charge-direction relay.")
-
     def is_charge_direction_fwd(self):
         return Controller().is_relay_off(CHARGE_DIRECTION_RELAY)
 
@@ -1387,9 +3853,6 @@ class BatteryCharger(object):
             self.disable_charge()
             Controller().open_relay(CHARGE_DIRECTION_RELAY)
             time.sleep(0.5)
-        if not self.is_charge_direction_fwd():
-            self.Output.print_err("BatteryCharger.set_charge_direction_fwd() failed to set direction.")
-            Controller().exit_program(ChargeControlError, "BatteryCharger.set_charge_direction_fwd() failed to set direction.")
 
     def set_charge_direction_rev(self):
         # Charge aux battery with alternator
@@ -1397,7 +3860,4 @@ class BatteryCharger(object):
             self.disable_charge()
             Controller().close_relay(CHARGE_DIRECTION_RELAY)
             time.sleep(0.5)
-        if not self.is_charge_direction_rev():
-            self.Output.print_err("BatteryCharger.set_charge_direction_rev() failed to set direction.")
-            Controller().exit_program(ChargeControlError, "BatteryCharger.set_charge_direction_rev() failed to set direction.")
 
@@ -0,0 +1,362 @@
+"""Aggregate per-day, per-vehicle statistics across many datalog DBs (live DB, datalogging_BU backups,
+and pulls from several vehicles) into a single summary DB.
+
+Every *.db under root containing the datalogger tables is used, as is every backup in a chunk store
+(DatalogBackupStore layout - manifests/ and chunks/). Backup days are read straight from their chunks
+(no restore), and a chunk shared by several backups is only read once. Vehicle name is the source's
+directory relative to root (w/ trailing datalogging_BU dropped), so lay out pulls as root/<vehicle>/...
+Overlapping sources are de-duplicated by Timestamp. Each (vehicle, day) is merged and summarized
+in a separate worker process. Older DBs w/ TEXT (one row per second) timestamps are converted to
+epoch ms while merging, and days are local-time days either way.
+
+    python datalog_analytics.py ROOT [--store datalog_summary.db] [--workers N] [--recompute]
+"""
+import os
+import sys
+import zlib
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import contextlib
+import urllib.request
+import datetime as dt
+import concurrent.futures
+
+DEFAULT_STORE_PATH = "datalog_summary.db"
+DATALOG_TABLES = ["voltages", "charging", "signals"]
+BU_DIR_NAME = "datalogging_BU"
+BU_MANIFEST_DIR_NAME = "manifests"
+BU_CHUNK_DIR_NAME = "chunks"
+# One backup's chunks for a day loaded here (shared-cache, so summary connection can attach it).
+BU_DAY_DB_URI = "file:backup_day?mode=memory&cache=shared"
+# Each row stands for time until next row (sample rate varies), capped so gaps w/ controller off don't count.
+ROW_WEIGHT_MAX_SEC = 30
+# Older TEXT Timestamp (local time, "YYYY-MM-DD HH:MM:SS") -> epoch ms, as in DataLogger migration.
+TEXT_TS_TO_MS = "CAST(round((julianday(Timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER)"
+
+# Only columns used for stats (older DB versions may have others).
+MERGE_COLUMNS = {"voltages": ["Vmain_raw", "Vaux_raw"],
+                 "charging": ["charge_enable", "charge_dir", "charge_current"],
+                 "signals": ["key_ACC", "engine_on", "PID"]}
+
+SUMMARY_COLUMNS = ["samples", "first_ts", "last_ts", "max_gap_s", "num_pids",
+                   "Vmain_min", "Vmain_mean", "Vmain_max", "Vaux_min", "Vaux_mean", "Vaux_max",
+                   "key_acc_h", "engine_on_h", "charge_fwd_h", "charge_rev_h",
+                   "charge_fwd_Ah", "charge_rev_Ah", "aux_out_Wh", "aux_in_Wh",
+                   "num_sources", "complete", "computed_at"]
+
+
+def discover_dbs(root):
+    """Returns {vehicle: [source paths (DBs and backup manifests), newest first]}.
+    """
+    root = os.path.abspath(root)
+    found = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        is_manifest_dir = (os.path.basename(dir_path) == BU_MANIFEST_DIR_NAME
+                           and os.path.isdir(os.path.join(os.path.dirname(dir_path), BU_CHUNK_DIR_NAME)))
+        if BU_CHUNK_DIR_NAME in dir_names and os.path.isdir(os.path.join(dir_path, BU_MANIFEST_DIR_NAME)):
+            dir_names.remove(BU_CHUNK_DIR_NAME) # Only compressed chunks in there.
+        for file_name in file_names:
+            db_path = os.path.join(dir_path, file_name)
+            if is_manifest_dir:
+                if not file_name.endswith(".json") or not has_backup_tables(db_path):
+                    continue
+                source_dir = os.path.dirname(dir_path) # Chunk store itself (e.g. datalogging_BU).
+            elif not file_name.endswith(".db") or not has_datalog_tables(db_path):
+                continue
+            else:
+                source_dir = dir_path
+            vehicle_dir = os.path.relpath(source_dir, root)
+            if os.path.basename(vehicle_dir) == BU_DIR_NAME:
+                vehicle_dir = os.path.dirname(vehicle_dir)
+            vehicle = os.path.basename(root) if vehicle_dir in ["", "."] else vehicle_dir
+            found.setdefault(vehicle, []).append(db_path)
+    for vehicle in found:
+        found[vehicle].sort(key=os.path.getmtime, reverse=True)
+    return found
+
+
+def has_datalog_tables(db_path):
+    try:
+        with contextlib.closing(_open_ro(db_path)) as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError:
+        return False # Not an SQLite DB (or corrupt).
+    return set(DATALOG_TABLES) <= tables
+
+
+def has_backup_tables(manifest_path):
+    try:
+        return set(DATALOG_TABLES) <= set(_load_manifest(manifest_path)["schema"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False # Not a backup manifest (or partly written).
+
+
+def _is_manifest(source_path):
+    return source_path.endswith(".json")
+
+
+def _load_manifest(manifest_path):
+    with open(manifest_path, "r") as fd:
+        return json.load(fd)
+
+
+def _read_chunk(manifest_path, sha256):
+    """Returns rows stored in backup chunk (see DatalogBackupStore). Verifies content hash.
+    """
+    store_dir = os.path.dirname(os.path.dirname(manifest_path))
+    with open(os.path.join(store_dir, BU_CHUNK_DIR_NAME, sha256[:2], sha256 + ".z"), "rb") as fd:
+        content = zlib.decompress(fd.read())
+    if hashlib.sha256(content).hexdigest() != sha256:
+        raise ValueError("Backup chunk %s corrupt (hash mismatch)." % sha256)
+    return json.loads(content)
+
+
+def _load_backup_day(manifest_path, day, chunks_read):
+    """Returns connection to BU_DAY_DB_URI holding backup's rows for day (closing it discards them).
+    Skips chunks in chunks_read set (same content already merged from another backup) and adds the rest.
+    """
+    manifest = _load_manifest(manifest_path)
+    day_conn = sqlite3.connect(BU_DAY_DB_URI, uri=True)
+    try:
+        for table in DATALOG_TABLES:
+            day_conn.execute(manifest["schema"][table])
+        for chunk in manifest["chunks"]:
+            if chunk["day"] != day or chunk["table"] not in DATALOG_TABLES or chunk["sha256"] in chunks_read:
+                continue
+            rows = _read_chunk(manifest_path, chunk["sha256"])
+            if rows:
+                placeholders = ", ".join(["?"] * len(rows[0]))
+                day_conn.executemany(f"INSERT INTO {chunk['table']} VALUES ({placeholders})", rows)
+            chunks_read.add(chunk["sha256"])
+        day_conn.commit()
+    except Exception:
+        day_conn.close()
+        raise
+    return day_conn
+
+
+def _ro_uri(db_path):
+    return "file:%s?mode=ro" % urllib.request.pathname2url(os.path.abspath(db_path))
+
+
+def _open_ro(db_path):
+    return sqlite3.connect(_ro_uri(db_path), uri=True)
+
+
+def _get_day_bounds(day, text_ts):
+    """Returns (start, end) of local day in table's Timestamp format (end exclusive).
+    """
+    next_day = dt.date.fromisoformat(day) + dt.timedelta(days=1)
+    if text_ts:
+        return day, next_day.isoformat()
+    return (int(dt.datetime.fromisoformat(day).timestamp() * 1000),
+            int(dt.datetime.combine(next_day, dt.time()).timestamp() * 1000))
+
+
+def _is_text_ts(conn, schema="main"):
+    col_types = {row[1]: row[2] for row in conn.execute("PRAGMA %s.table_info(signals)" % schema)}
+    return col_types["Timestamp"].upper() == "TEXT"
+
+
+def _ms_to_local_str(epoch_ms):
+    return dt.datetime.fromtimestamp(epoch_ms / 1000).isoformat(sep=" ", timespec="milliseconds")
+
+
+def list_days(db_path):
+    """Returns list of date strings present in db's signals table (or backup manifest's signals chunks).
+    Skip-scans PK index (one lookup per day) instead of reading every row.
+    """
+    if _is_manifest(db_path):
+        return sorted({chunk["day"] for chunk in _load_manifest(db_path)["chunks"] if chunk["table"] == "signals"})
+    days = []
+    with contextlib.closing(_open_ro(db_path)) as conn:
+        text_ts = _is_text_ts(conn)
+        row = conn.execute("SELECT MIN(Timestamp) FROM signals").fetchone()
+        while row is not None and row[0] is not None:
+            day = row[0][:10] if text_ts else dt.datetime.fromtimestamp(row[0] / 1000).date().isoformat()
+            days.append(day)
+            row = conn.execute("SELECT Timestamp FROM signals WHERE Timestamp >= ? "
+                               "ORDER BY Timestamp LIMIT 1", (_get_day_bounds(day, text_ts)[1],)).fetchone()
+    return days
+
+
+def summarize_day(vehicle, day, source_paths):
+    """Merge one day from all sources (first source wins on duplicate Timestamp) and compute stats.
+    Runs in worker process. Returns (vehicle, day, stats dict, list of warning strings).
+    """
+    warnings = []
+    conn = sqlite3.connect("file::memory:", uri=True) # URI mode so sources can be attached read-only.
+    for table, columns in MERGE_COLUMNS.items():
+        conn.execute("CREATE TABLE %s (Timestamp INTEGER PRIMARY KEY, %s)" % (table, ", ".join(columns)))
+    num_sources = 0
+    chunks_read = set()
+    for source_path in source_paths:
+        day_conn = None
+        try:
+            if _is_manifest(source_path):
+                day_conn = _load_backup_day(source_path, day, chunks_read)
+                conn.execute("ATTACH ? AS src", (BU_DAY_DB_URI,))
+            else:
+                conn.execute("ATTACH ? AS src", (_ro_uri(source_path),))
+        except (sqlite3.DatabaseError, OSError, ValueError, KeyError) as e:
+            warnings.append("%s: %s" % (source_path, e))
+            continue
+        try:
+            text_ts = _is_text_ts(conn, "src")
+            for table, columns in MERGE_COLUMNS.items():
+                col_str = ", ".join([TEXT_TS_TO_MS if text_ts else "Timestamp"] + columns)
+                conn.execute(f"""INSERT OR IGNORE INTO main.{table}
+                                 SELECT {col_str} FROM src.{table}
+                                 WHERE Timestamp >= ? AND Timestamp < ?;
+                              """, _get_day_bounds(day, text_ts))
+            num_sources += 1
+        except sqlite3.DatabaseError as e:
+            warnings.append("%s: %s" % (source_path, e))
+        conn.commit()
+        conn.execute("DETACH src")
+        if day_conn is not None:
+            day_conn.close()
+
+    # Seconds each row stands for. Last row of day counted as one second.
+    for table in ["signals", "charging"]:
+        conn.execute(f"""CREATE TEMP VIEW {table}_weighted AS
+                         SELECT *, MIN(COALESCE(LEAD(Timestamp) OVER (ORDER BY Timestamp) - Timestamp, 1000),
+                                       {ROW_WEIGHT_MAX_SEC * 1000}) / 1000.0 AS dur_s
+                         FROM {table};
+                      """)
+
+    stats = {"num_sources": num_sources}
+    row = conn.execute("""SELECT COUNT(*), MIN(Timestamp), MAX(Timestamp), COUNT(DISTINCT PID),
+                                 TOTAL(key_ACC * dur_s) / 3600.0, TOTAL(engine_on * dur_s) / 3600.0
+                          FROM signals_weighted;
+                       """).fetchone()
+    stats.update(zip(["samples", "first_ts", "last_ts", "num_pids", "key_acc_h", "engine_on_h"], row))
+    for key in ["first_ts", "last_ts"]:
+        if stats[key] is not None:
+            stats[key] = _ms_to_local_str(stats[key])
+    row = conn.execute("""SELECT MAX(gap) / 1000.0 FROM (
+                              SELECT Timestamp - LAG(Timestamp) OVER (ORDER BY Timestamp) AS gap
+                              FROM signals);
+                       """).fetchone()
+    stats["max_gap_s"] = round(row[0]) if row[0] is not None else None
+    row = conn.execute("""SELECT MIN(Vmain_raw), AVG(Vmain_raw), MAX(Vmain_raw),
+                                 MIN(Vaux_raw), AVG(Vaux_raw), MAX(Vaux_raw)
+                          FROM voltages;
+                       """).fetchone()
+    stats.update(zip(["Vmain_min", "Vmain_mean", "Vmain_max", "Vaux_min", "Vaux_mean", "Vaux_max"], row))
+    # charge_dir 1 = fwd (aux -> main), 0 = rev (main -> aux).
+    row = conn.execute("""SELECT TOTAL((c.charge_dir = 1) * c.dur_s) / 3600.0, TOTAL((c.charge_dir = 0) * c.dur_s) / 3600.0,
+                                 TOTAL(CASE WHEN c.charge_dir = 1 THEN c.charge_current * c.dur_s END) / 3600.0,
+                                 TOTAL(CASE WHEN c.charge_dir = 0 THEN c.charge_current * c.dur_s END) / 3600.0,
+                                 TOTAL(CASE WHEN c.charge_dir = 1 THEN c.charge_current * v.Vaux_raw * c.dur_s END) / 3600.0,
+                                 TOTAL(CASE WHEN c.charge_dir = 0 THEN c.charge_current * v.Vaux_raw * c.dur_s END) / 3600.0
+                          FROM charging_weighted AS c LEFT JOIN voltages AS v USING (Timestamp)
+                          WHERE c.charge_enable = 1;
+                       """).fetchone()
+    stats.update(zip(["charge_fwd_h", "charge_rev_h", "charge_fwd_Ah", "charge_rev_Ah",
+                      "aux_out_Wh", "aux_in_Wh"], row))
+    conn.close()
+    return vehicle, day, stats, warnings
+
+
+class SummaryStore(object):
+    def __init__(self, store_path):
+        """Single SQLite summary DB. One row per (vehicle, day).
+        """
+        self.conn = sqlite3.connect(store_path)
+        col_defs = ", ".join("%s %s" % (col, "TEXT" if col.endswith("_ts") or col == "computed_at" else "REAL")
+                             for col in SUMMARY_COLUMNS)
+        self.conn.execute(f"""CREATE TABLE IF NOT EXISTS daily_stats (
+                                  vehicle TEXT,
+                                  date TEXT,
+                                  {col_defs},
+                                  PRIMARY KEY (vehicle, date)
+                              );
+                           """)
+        self.conn.commit()
+
+    def get_complete_days(self, vehicle):
+        rows = self.conn.execute("SELECT date FROM daily_stats WHERE vehicle = ? AND complete = 1",
+                                 (vehicle,)).fetchall()
+        return {row[0] for row in rows}
+
+    def write(self, vehicle, day, stats):
+        values = [vehicle, day] + [stats.get(col) for col in SUMMARY_COLUMNS]
+        placeholders = ", ".join(["?"] * len(values))
+        self.conn.execute("INSERT OR REPLACE INTO daily_stats VALUES (%s)" % placeholders, values)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def run(root, store_path=DEFAULT_STORE_PATH, workers=None, recompute=False, log=print):
+    """Discover, merge, and summarize. Returns dict of counts.
+    A stored day is marked complete once a later day exists in sources, and complete days are
+    skipped on later runs unless recompute is True.
+    """
+    start_time = time.perf_counter()
+    vehicle_dbs = discover_dbs(root)
+    Store = SummaryStore(store_path)
+    counts = {"vehicles": len(vehicle_dbs), "dbs": sum(len(paths) for paths in vehicle_dbs.values()),
+              "days_computed": 0, "days_skipped": 0}
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        all_paths = [path for paths in vehicle_dbs.values() for path in paths]
+        path_days = dict(zip(all_paths, pool.map(list_days, all_paths)))
+
+        futures = []
+        latest_days = {}
+        for vehicle, paths in vehicle_dbs.items():
+            day_sources = {}
+            for path in paths: # Newest first, so newest source wins duplicates.
+                for day in path_days[path]:
+                    day_sources.setdefault(day, []).append(path)
+            if not day_sources:
+                continue
+            latest_days[vehicle] = max(day_sources)
+            skip_days = set() if recompute else Store.get_complete_days(vehicle)
+            for day in sorted(day_sources):
+                if day in skip_days:
+                    counts["days_skipped"] += 1
+                    continue
+                futures.append(pool.submit(summarize_day, vehicle, day, day_sources[day]))
+
+        computed_at = dt.datetime.now().isoformat(timespec="seconds")
+        for future in concurrent.futures.as_completed(futures):
+            vehicle, day, stats, warnings = future.result()
+            for warning in warnings:
+                log("Warning: %s" % warning)
+            stats["complete"] = int(day < latest_days[vehicle])
+            stats["computed_at"] = computed_at
+            Store.write(vehicle, day, stats)
+            counts["days_computed"] += 1
+    Store.commit()
+    Store.close()
+    counts["elapsed_s"] = time.perf_counter() - start_time
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize datalog DBs across backups and vehicles.")
+    parser.add_argument("root", help="Directory tree to search for datalog DBs and backup stores.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Summary DB path.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--recompute", action="store_true", help="Recompute days already marked complete.")
+    args = parser.parse_args()
+    if not os.path.isdir(args.root):
+        sys.exit("%s is not a directory." % args.root)
+
+    counts = run(args.root, store_path=args.store, workers=args.workers, recompute=args.recompute)
+    print("%d vehicle(s), %d source(s): %d day(s) computed, %d skipped in %.1fs -> %s"
+          % (counts["vehicles"], counts["dbs"], counts["days_computed"], counts["days_skipped"],
+             counts["elapsed_s"], args.store))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Manage deduplicated datalog backups (DatalogBackupStore) - list, verify, restore, prune.
+
+    python datalog_backup.py list [--bu-dir DIR]
+    python datalog_backup.py restore NAME DEST_DB [--bu-dir DIR]
+    python datalog_backup.py verify [NAME] [--bu-dir DIR]
+    python datalog_backup.py prune [--keep N] [--bu-dir DIR]
+    python datalog_backup.py backup [--db DB] [--bu-dir DIR]
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import datetime as dt
+
+from class_def import DatalogBackupStore, DataLoggingError, \
+                      DATA_LOG_BU_DIR, DATA_LOG_BU_NUM_TO_KEEP, DATA_LOG_PATH, DATE_FORMAT
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage deduplicated datalog backups.")
+    parser.add_argument("--bu-dir", default=DATA_LOG_BU_DIR, help="Backup store (e.g. copy synced to laptop).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list")
+    restore_parser = subparsers.add_parser("restore")
+    restore_parser.add_argument("name")
+    restore_parser.add_argument("dest_db")
+    verify_parser = subparsers.add_parser("verify")
+    verify_parser.add_argument("name", nargs="?", help="Default: all backups.")
+    prune_parser = subparsers.add_parser("prune")
+    prune_parser.add_argument("--keep", type=int, default=DATA_LOG_BU_NUM_TO_KEEP)
+    backup_parser = subparsers.add_parser("backup")
+    backup_parser.add_argument("--db", default=DATA_LOG_PATH)
+    args = parser.parse_args()
+
+    BackupStore = DatalogBackupStore(None, bu_dir=args.bu_dir)
+    if args.command == "list":
+        for name in BackupStore.list_backups():
+            manifest = BackupStore.load_manifest(name)
+            days = sorted({chunk["day"] for chunk in manifest["chunks"]})
+            print("%s  created %s  %d chunk(s), %d row(s)%s"
+                  % (name, manifest["created"], len(manifest["chunks"]),
+                     sum(chunk["rows"] for chunk in manifest["chunks"]),
+                     ("  %s..%s" % (days[0], days[-1])) if days else ""))
+    elif args.command == "restore":
+        num_rows = BackupStore.restore(args.name, args.dest_db)
+        print("Restored %s to %s (%d rows)." % (args.name, args.dest_db, num_rows))
+    elif args.command == "verify":
+        names = [args.name] if args.name else BackupStore.list_backups()
+        num_bad = 0
+        for name in names:
+            for chunk in BackupStore.load_manifest(name)["chunks"]:
+                try:
+                    BackupStore._read_chunk(chunk["sha256"])
+                except (OSError, DataLoggingError) as e:
+                    num_bad += 1
+                    print("%s: %s %s: %s" % (name, chunk["table"], chunk["day"], e))
+        print("%d backup(s) checked, %d bad chunk(s)." % (len(names), num_bad))
+        if num_bad:
+            sys.exit(1)
+    elif args.command == "prune":
+        num_deleted = BackupStore.prune(args.keep)
+        print("%d unreferenced chunk(s) deleted." % num_deleted)
+    elif args.command == "backup":
+        name = "%s--%s_auto" % (os.path.splitext(os.path.basename(DATA_LOG_PATH))[0], dt.datetime.now().strftime(DATE_FORMAT))
+        conn = sqlite3.connect("file:%s?mode=ro" % args.db, uri=True)
+        stats = BackupStore.backup(conn, name, ["voltages", "charging", "signals"])
+        conn.close()
+        print("Backed up %s to %s: %s" % (args.db, name, stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Render datalog for a time range as a self-contained HTML report (inline SVG, no scripts or external files).
+
+Voltage, signed charge current, charger power, and vehicle/charger state panels. Each series is
+reduced to min/max per pixel-width time bucket in SQL (DataLogger.get_binned()), so a 60-day view
+draws a few thousand points per series and memory stays bounded regardless of range or sample rate.
+DB opened read-only, so it's safe to run against live DB while controller writes it.
+
+    python datalog_report.py [--since 2024-05-01] [--until "2024-05-08 12:00"] [--days 7]
+                             [--db DB] [--points 2000] [--output datalog_report.html]
+"""
+import os
+import sys
+import html
+import math
+import argparse
+import datetime as dt
+
+from class_def import DataLogger, DataLoggingError, DATA_LOG_PATH
+from event_query import parse_time_arg
+
+PLOT_WIDTH = 1100
+PLOT_HEIGHT = 200
+MARGIN_LEFT = 60
+MARGIN_RIGHT = 20
+MARGIN_TOP = 28
+MARGIN_BOTTOM = 24
+STATE_ROW_HEIGHT = 18
+
+# (title, y label, tables, [(label, SQL expression, color)])
+# Signed current and power read from derived table (see RAW_DERIVED_EXPRS if it doesn't cover range).
+# Positive = fwd (aux -> main), i.e. into main batt.
+LINE_PANELS = [("Voltage", "V", ["voltages"],
+                [("Main", "Vmain_raw", "purple"),
+                 ("Aux", "Vaux_raw", "green")]),
+               ("Charge current", "A", ["charging", "derived"],
+                [("Current", "charge_enable * charge_current_signed", "orange")]),
+               ("Charger power (aux side)", "W", ["charging", "derived"],
+                [("Power", "charge_enable * charge_power", "firebrick")])]
+# Derived column -> (tables, same value computed from raw columns as in DataLogger.backfill_derived()).
+RAW_DERIVED_EXPRS = {"charge_current_signed": (["charging"], "(charge_current * (charge_dir*2 - 1))"),
+                     "charge_power": (["charging", "voltages"], "(charge_current * (charge_dir*2 - 1) * Vaux_raw)")}
+STATE_ROWS = [("Key ACC", "signals", "key_ACC", "steelblue"),
+              ("Engine on", "signals", "engine_on", "dimgray"),
+              ("Charging fwd", "charging", "charge_enable * charge_dir", "orange"),
+              ("Charging rev", "charging", "charge_enable * (1 - charge_dir)", "teal"),
+              ("Enable sw", "signals", "enable_sw", "olivedrab")]
+# Step between x-axis ticks (smallest step giving at most this many ticks used).
+TIME_TICK_STEPS_SEC = [60, 300, 900, 1800, 3600, 3*3600, 6*3600, 12*3600, 86400, 2*86400, 7*86400, 14*86400]
+MAX_TIME_TICKS = 10
+
+
+class Axis(object):
+    def __init__(self, start_ms, end_ms, y_min, y_max, height):
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.y_min = y_min
+        self.y_max = y_max
+        self.height = height
+
+    def x(self, time_ms):
+        return MARGIN_LEFT + (time_ms - self.start_ms) / (self.end_ms - self.start_ms) * PLOT_WIDTH
+
+    def y(self, value):
+        return MARGIN_TOP + (self.y_max - value) / (self.y_max - self.y_min) * self.height
+
+
+def get_time_ticks(start_ms, end_ms):
+    """Returns list of (ms, label) at local-time-aligned steps.
+    """
+    span_s = (end_ms - start_ms) / 1000
+    step_s = next((step for step in TIME_TICK_STEPS_SEC if span_s / step <= MAX_TIME_TICKS),
+                  TIME_TICK_STEPS_SEC[-1])
+    label_format = "%m-%d" if step_s >= 86400 else "%m-%d %H:%M"
+    start_time = dt.datetime.fromtimestamp(start_ms / 1000)
+    tick_time = start_time.replace(hour=0, minute=0, second=0, microsecond=0) # Align to local midnight.
+    ticks = []
+    while DataLogger.to_epoch_ms(tick_time) < end_ms:
+        tick_ms = DataLogger.to_epoch_ms(tick_time)
+        if tick_ms >= start_ms:
+            ticks.append((tick_ms, tick_time.strftime(label_format)))
+        tick_time += dt.timedelta(seconds=step_s)
+    return ticks
+
+
+def has_derived_rows(Logger, start_ms, end_ms):
+    """True if derived table spans same rows as charging table in range (logged live or backfilled).
+    """
+    if not Logger.table_columns[Logger.derived_table]:
+        return False # DB from before derived table added.
+    bounds = [Logger._query_rows(f"""SELECT MIN(Timestamp), MAX(Timestamp) FROM {table}
+                                     WHERE Timestamp >= ? AND Timestamp < ?;
+                                  """, (start_ms, end_ms))[0]
+              for table in [Logger.charging_table, Logger.derived_table]]
+    return bounds[0] == bounds[1]
+
+
+def get_line_panels(use_derived):
+    """LINE_PANELS, w/ derived columns computed from raw ones instead if use_derived is False.
+    """
+    if use_derived:
+        return LINE_PANELS
+    panels = []
+    for title, y_label, tables, series in LINE_PANELS:
+        if "derived" in tables:
+            tables = [table for table in tables if table != "derived"]
+            for column, (raw_tables, raw_expr) in RAW_DERIVED_EXPRS.items():
+                if any(column in expr for label, expr, color in series):
+                    tables += [table for table in raw_tables if table not in tables]
+                    series = [(label, expr.replace(column, raw_expr), color) for label, expr, color in series]
+        panels.append((title, y_label, tables, series))
+    return panels
+
+
+def get_value_ticks(y_min, y_max, num_ticks=5):
+    raw_step = (y_max - y_min) / num_ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in [1, 2, 5, 10] if m * magnitude >= raw_step)
+    first = math.ceil(y_min / step) * step
+    return [first + n * step for n in range(num_ticks + 1) if first + n * step <= y_max]
+
+
+def _svg_frame(Ax, title, time_ticks, total_height):
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d" font-family="sans-serif" font-size="11">'
+             % (MARGIN_LEFT + PLOT_WIDTH + MARGIN_RIGHT, total_height),
+             '<text x="%d" y="16" font-size="13" font-weight="bold">%s</text>' % (MARGIN_LEFT, html.escape(title)),
+             '<rect x="%d" y="%d" width="%d" height="%d" fill="none" stroke="#999"/>'
+             % (MARGIN_LEFT, MARGIN_TOP, PLOT_WIDTH, Ax.height)]
+    for tick_ms, label in time_ticks:
+        x = Ax.x(tick_ms)
+        parts.append('<line x1="%.1f" y1="%d" x2="%.1f" y2="%d" stroke="#eee"/>' % (x, MARGIN_TOP, x, MARGIN_TOP + Ax.height))
+        parts.append('<text x="%.1f" y="%d" text-anchor="middle" fill="#555">%s</text>'
+                     % (x, MARGIN_TOP + Ax.height + 15, label))
+    return parts
+
+
+def render_line_panel(Logger, title, y_label, tables, series, start_ms, end_ms, bucket_ms, time_ticks):
+    """Returns SVG string. Each bucket drawn as vertical min-max stroke, so spikes narrower than a
+    pixel stay visible. Line broken across empty buckets (no data logged).
+    """
+    rows = Logger.get_binned(tables, [expr for label, expr, color in series], start_ms, end_ms, bucket_ms)
+    values = [v for row in rows for v in row[2:] if v is not None]
+    y_min, y_max = (min(values), max(values)) if values else (0, 1)
+    pad = (y_max - y_min) * 0.05 or 0.5
+    Ax = Axis(start_ms, end_ms, y_min - pad, y_max + pad, PLOT_HEIGHT)
+
+    parts = _svg_frame(Ax, title, time_ticks, MARGIN_TOP + PLOT_HEIGHT + MARGIN_BOTTOM)
+    for value in get_value_ticks(Ax.y_min, Ax.y_max):
+        y = Ax.y(value)
+        parts.append('<line x1="%d" y1="%.1f" x2="%d" y2="%.1f" stroke="#eee"/>' % (MARGIN_LEFT, y, MARGIN_LEFT + PLOT_WIDTH, y))
+        parts.append('<text x="%d" y="%.1f" text-anchor="end" fill="#555">%g</text>' % (MARGIN_LEFT - 4, y + 4, round(value, 6)))
+    parts.append('<text x="12" y="%d" transform="rotate(-90 12 %d)" text-anchor="middle">%s</text>'
+                 % (MARGIN_TOP + PLOT_HEIGHT / 2, MARGIN_TOP + PLOT_HEIGHT / 2, html.escape(y_label)))
+    legend_x = MARGIN_LEFT + PLOT_WIDTH
+    for series_num, (label, expr, color) in reversed(list(enumerate(series))):
+        legend_x -= 8 + 7 * len(label) + 14
+        parts.append('<rect x="%d" y="6" width="10" height="10" fill="%s"/><text x="%d" y="15">%s</text>'
+                     % (legend_x, color, legend_x + 14, html.escape(label)))
+        runs, run, prev_bucket = [], [], None
+        for row in rows:
+            v_min, v_max = row[2 + 2*series_num], row[3 + 2*series_num]
+            if v_min is None or (prev_bucket is not None and row[0] - prev_bucket > bucket_ms):
+                if run:
+                    runs.append(run)
+                run = []
+            if v_min is not None:
+                x = Ax.x(row[0] + bucket_ms / 2)
+                run += [(x, Ax.y(v_min)), (x, Ax.y(v_max))]
+            prev_bucket = row[0]
+        runs.append(run)
+        for run in runs:
+            if run:
+                parts.append('<polyline fill="none" stroke="%s" stroke-width="1" points="%s"/>'
+                             % (color, " ".join("%.1f,%.1f" % point for point in run)))
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def render_state_panel(Logger, start_ms, end_ms, bucket_ms, time_ticks):
+    """Returns SVG string. Row shaded for each bucket where state was on for any sample.
+    """
+    height = STATE_ROW_HEIGHT * len(STATE_ROWS)
+    Ax = Axis(start_ms, end_ms, 0, 1, height)
+    parts = _svg_frame(Ax, "State", time_ticks, MARGIN_TOP + height + MARGIN_BOTTOM)
+    binned_by_table = {} # One pass per table for all its rows.
+    for table in dict.fromkeys(row_table for label, row_table, expr, color in STATE_ROWS):
+        binned_by_table[table] = Logger.get_binned([table], [expr for label, row_table, expr, color in STATE_ROWS
+                                                             if row_table == table],
+                                                   start_ms, end_ms, bucket_ms)
+    for row_num, (label, table, expr, color) in enumerate(STATE_ROWS):
+        y = MARGIN_TOP + row_num * STATE_ROW_HEIGHT
+        parts.append('<text x="%d" y="%d" text-anchor="end">%s</text>'
+                     % (MARGIN_LEFT - 4, y + STATE_ROW_HEIGHT - 5, html.escape(label)))
+        rows = binned_by_table[table]
+        expr_num = [row_expr for row_label, row_table, row_expr, row_color in STATE_ROWS
+                    if row_table == table].index(expr)
+        band_start = band_end = None
+        bands = []
+        for row in rows:
+            if not row[3 + 2*expr_num]:
+                continue
+            if band_end is not None and row[0] == band_end:
+                band_end += bucket_ms # Merge consecutive buckets into one rect.
+            else:
+                if band_start is not None:
+                    bands.append((band_start, band_end))
+                band_start, band_end = row[0], row[0] + bucket_ms
+        if band_start is not None:
+            bands.append((band_start, band_end))
+        for band_start, band_end in bands:
+            x_start = Ax.x(max(band_start, start_ms))
+            parts.append('<rect x="%.1f" y="%d" width="%.1f" height="%d" fill="%s"/>'
+                         % (x_start, y + 2, max(Ax.x(min(band_end, end_ms)) - x_start, 0.5),
+                            STATE_ROW_HEIGHT - 4, color))
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+def render_report(Logger, start_ms, end_ms, num_points):
+    """Returns HTML string for range (end exclusive). num_points is buckets across plot width.
+    """
+    bucket_ms = max(1, (end_ms - start_ms) // num_points)
+    time_ticks = get_time_ticks(start_ms, end_ms)
+    range_str = "%s to %s" % (dt.datetime.fromtimestamp(start_ms / 1000).isoformat(sep=" ", timespec="seconds"),
+                              dt.datetime.fromtimestamp(end_ms / 1000).isoformat(sep=" ", timespec="seconds"))
+    panels = [render_line_panel(Logger, *panel, start_ms, end_ms, bucket_ms, time_ticks)
+              for panel in get_line_panels(has_derived_rows(Logger, start_ms, end_ms))]
+    panels.append(render_state_panel(Logger, start_ms, end_ms, bucket_ms, time_ticks))
+    return "\n".join(['<!DOCTYPE html>',
+                      '<html><head><meta charset="utf-8"><title>Datalog %s</title></head>' % html.escape(range_str),
+                      '<body style="font-family: sans-serif">',
+                      '<h2>Datalog %s</h2>' % html.escape(range_str),
+                      '<p>%s. Min/max per %.0fs bucket. Generated %s.</p>'
+                      % (html.escape(Logger.db_path), bucket_ms / 1000,
+                         dt.datetime.now().isoformat(sep=" ", timespec="seconds")),
+                      *["<div>%s</div>" % panel for panel in panels],
+                      '</body></html>'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render datalog time range as self-contained HTML report.")
+    parser.add_argument("--db", default=DATA_LOG_PATH, help="Datalog DB (e.g. copy synced to laptop).")
+    parser.add_argument("--since", type=parse_time_arg, help="Default: --days before --until.")
+    parser.add_argument("--until", type=parse_time_arg, help="Exclusive. Default: latest sample.")
+    parser.add_argument("--days", type=float, default=1)
+    parser.add_argument("--points", type=int, default=2000, help="Time buckets across plot (2 points each).")
+    parser.add_argument("--output", default="datalog_report.html")
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        sys.exit("%s not found." % args.db)
+
+    try:
+        Logger = DataLogger(None, db_path=args.db, purge=False, read_only=True)
+    except DataLoggingError as e:
+        sys.exit(str(e))
+    if args.until is not None:
+        end_ms = DataLogger.to_epoch_ms(args.until)
+    else:
+        latest_ms = Logger._get_latest_timestamp(Logger.signals_table)
+        if latest_ms is None:
+            sys.exit("No data in %s." % args.db)
+        end_ms = latest_ms + 1
+    if args.since is not None:
+        start_ms = DataLogger.to_epoch_ms(args.since)
+    else:
+        start_ms = end_ms - int(args.days * 86400 * 1000)
+    if start_ms >= end_ms:
+        sys.exit("Empty time range.")
+
+    with open(args.output, "w") as fd:
+        fd.write(render_report(Logger, start_ms, end_ms, args.points))
+    print("Wrote %s." % args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,178 +1,394 @@
+import time
+LAUNCH_TIME = time.monotonic() # Reference for import-to-first-sample startup timing.
+
 import os
 import sys
-import time
 import signal
+import threading
 import traceback
 
-from class_def import Vehicle, Controller, TimeKeeper, OutputHandler, SysTimeUpdateException
+from class_def import Vehicle, Controller, TimeKeeper, OutputHandler, StateCheckpoint, \
+                      StateMachine, TickPredicates, StatusServer, Watchdog, StackProfiler, \
+                      LogArchiver, SysTimeUpdateException, STATUS_API_ADDRESS
+IMPORT_DONE_TIME = time.monotonic()
+
+MAX_RECOVERIES_PER_HOUR = 6 # Beyond this, fall back to exiting for launcher.sh to restart program.
 
-def main(Output, Timer):
-    time.sleep(4)                # Give time for system to stabilize.
-    Car = Vehicle(Output, Timer)
+
+def start_up(Output, Timer, Checkpoint, Dog=None):
+    """Creates Vehicle object and establishes initial loop states (recorded in Checkpoint).
+    Dog (optional Watchdog) kept fed during long startup jobs. Returns Vehicle object.
+    """
+    checkpoint = Checkpoint.load() # None unless restarting shortly after previous instance exited.
+
+    if checkpoint is None:
+        time.sleep(4)            # Give time for system to stabilize.
+    else:
+        time.sleep(1)            # System already stable. Just let AutomationHAT settle.
+    Car = Vehicle(Output, Timer, Dog=Dog) # Logs first sample.
+    Output.print_debug("Startup timing: imports %.2fs, first sample %.2fs after launch."
+                       % (IMPORT_DONE_TIME - LAUNCH_TIME, time.monotonic() - LAUNCH_TIME),
+                       category="program", import_s=round(IMPORT_DONE_TIME - LAUNCH_TIME, 2))
 
     # Log initial data to use for proper state inference, voltage measurements, etc.
-    for x in range(3):
+    # After restart, trailing data from previous instance already in DB.
+    for x in range(3 if checkpoint is None else 1):
         Car.log_data()
         time.sleep(1.1)
 
-    key_acc_powered   = Car.is_acc_powered()
-    engine_on_state   = Car.is_engine_running()
-    sys_enabled_state = Car.is_enable_switch_closed()
+    if checkpoint is None:
+        key_acc_powered   = Car.is_acc_powered()
+        engine_on_state   = Car.is_engine_running()
+        sys_enabled_state = Car.is_enable_switch_closed()
+    else:
+        # Resume w/ previous instance's view of state. Any change during restart is caught in main() as a transition.
+        key_acc_powered   = checkpoint["loop_states"]["key_acc_powered"]
+        engine_on_state   = checkpoint["loop_states"]["engine_on_state"]
+        sys_enabled_state = checkpoint["loop_states"]["sys_enabled_state"]
+        Timer.restore_timer_state(checkpoint["timers"], downtime_s=checkpoint["downtime_s"])
+        if checkpoint["vehicle"] is not None:
+            Car.restore_checkpoint_state(checkpoint["vehicle"])
+        if checkpoint["vehicle"] is not None and checkpoint["vehicle"]["charging"]:
+            Output.print_debug("Charging %s before restart. Resuming."
+                               % ("starter batt" if checkpoint["vehicle"]["charge_dir_fwd"] else "aux batt"),
+                               category="charge")
     Car.output_status()
 
+    # After restart, timers restored above. Don't treat restart as a state change.
     # Handle if program started w/ enable switch open (could have opened after boot initiated).
-    if sys_enabled_state:
+    if checkpoint is None and sys_enabled_state:
         Timer.start_charge_delay_timer("program startup", delay_s=10) # Treat RPi startup triggering as a state change.
-    else:
+    elif checkpoint is None:
         Car.is_enable_switch_closed(log=True) # Call again just for logging
         Timer.start_shutdown_timer(log=True)
 
-    while True:
+    Checkpoint.update(key_acc_powered=key_acc_powered,
+                      engine_on_state=engine_on_state,
+                      sys_enabled_state=sys_enabled_state)
+    Checkpoint.attach_vehicle(Car) # Startup complete - main() can now be resumed w/ this object after fault.
+    return Car
 
-        # Logging and output
-        Car.log_data()
-        if (Timer.get_minutes() % 10 == 0) and (Timer.get_seconds() == 43):
-            Car.check_wiring() # periodically look for I/O issues.
-            time.sleep(1)
-        if (Timer.get_minutes() % 5 == 0) and (Timer.get_seconds() == 0):
-            # Every 5 minutes, print/log system status info.
+
+def get_tick_predicates(Car):
+    """Inputs to transition table for one pass. Each evaluated lazily, at most once per pass.
+    """
+    return TickPredicates({
+        "enable_switch_closed":   Car.is_enable_switch_closed,
+        "shutdown_delay_elapsed": Car.Timer.has_shutdown_delay_elapsed,
+        "acc_powered":            Car.is_acc_powered,
+        "engine_running":         Car.is_engine_running,
+        "shutdown_pending":       Car.Timer.is_shutdown_pending,
+        "charge_delay_status":    Car.Timer.has_charge_delay_time_elapsed, # (ready, first_time_ind)
+    })
+
+
+# Guards - pure functions of loop states and predicates.
+def is_charge_ready(p):
+    # Enter new charging mode (if first_time_ind is True) based on current state,
+    # or continue with current mode. Don't enter if shutdown pending.
+    return (not p["shutdown_pending"]) and p["charge_delay_status"][0]
+
+
+def build_transition_table(Car):
+    """Returns ordered list of (name, guard, action, is_state_change) rows for StateMachine.
+    Actions update loop states in place and return True to end event loop.
+    """
+    Output = Car.Output
+    Timer = Car.Timer
+
+    def enable_switch_opened(s, p):
+        # Switch opened for the first time.
+        Car.is_enable_switch_closed(log=True) # Call again just for logging
+        s["sys_enabled_state"] = False
+        Car.stop_charging(log=True)
+        Timer.start_shutdown_timer(log=True)
+
+    def enable_switch_closed(s, p):
+        # Enable switch closed (during previous timeout)
+        Car.is_enable_switch_closed(log=True) # Call again just for logging
+        s["sys_enabled_state"] = True
+        Timer.stop_shutdown_timer(log=True)
+        Timer.start_charge_delay_timer("enable switch closed")  # Re-enter appropriate operating mode below after delay.
+
+    def shutdown_delay_elapsed(s, p):
+        Timer.has_shutdown_delay_elapsed(log=True) # Call again just for logging
+        Car.shut_down_controller()
+        return True
+
+    def key_off_to_acc(s, p):
+        Output.print_info("Key switched from OFF to ACC.", category="state")
+        s["key_acc_powered"] = True
+        Car.stop_charging()
+        Timer.start_charge_delay_timer("key OFF -> ACC")
+
+    def key_acc_to_off(s, p):
+        Output.print_info("Key switched from ACC to OFF.", category="state")
+        s["key_acc_powered"] = False
+        Car.stop_charging()
+        if not s["engine_on_state"]:
+            # Engine already off. Can use shorter delay.
+            Timer.start_charge_delay_timer("key ACC -> OFF", delay_s=5)
+        else:
+            s["engine_on_state"] = False
+            Timer.start_charge_delay_timer("engine stopped, key ACC -> OFF")
+
+    def engine_stopped(s, p):
+        # Could happen independent of key -> ACC if engine stalls.
+        Output.print_info("Engine stopped (main voltage raw: %.2f)." % Car.get_main_voltage_raw(), category="state")
+        s["engine_on_state"] = False
+        Car.stop_charging()
+        Timer.start_charge_delay_timer("engine stopped")
+
+    def engine_started(s, p):
+        Output.print_info("Engine started. (main voltage raw: %.2f)" % Car.get_main_voltage_raw(), category="state")
+        s["engine_on_state"] = True
+        Car.stop_charging()
+        Timer.start_charge_delay_timer("engine started")
+
+    def engine_running_mode(s, p):
+        first_time_ind = p["charge_delay_status"][1]
+        if first_time_ind:
+            Output.print_debug("Charge-delay time has elapsed.", category="timer", timer="charge_delay")
+            Output.print_info("State: Key ON; engine running.", category="state", mode="engine_running")
+        if Car.is_aux_batt_full(log=first_time_ind):
+            Timer.start_charge_delay_timer("aux battery full already", delay_s=600)
+        else:
+            Car.charge_aux_batt(log=first_time_ind, post_delay=first_time_ind)
+
+    def key_acc_mode(s, p):
+        # Key in ACC or ON but engine off.
+        first_time_ind = p["charge_delay_status"][1]
+        if first_time_ind:
+            Output.print_debug("Charge-delay time has elapsed.", category="timer", timer="charge_delay")
+            Output.print_info("State: Key in ACC or ON; engine off.", category="state", mode="key_acc")
+        if Car.is_aux_batt_sufficient(log=first_time_ind):
+            Car.charge_starter_batt(log=first_time_ind, post_delay=first_time_ind)
+        else:
+            # If Li batt V low, power down RPi.
+            Car.is_aux_batt_sufficient(log=True) # Call again just for logging
+            Car.shut_down_controller(delay=60)
+            return True
+            # Will need to be manually turned back on either by key cycle or enable-switch cycle.
+
+    def key_off_mode(s, p):
+        first_time_ind = p["charge_delay_status"][1]
+        if first_time_ind:
+            Output.print_debug("Charge-delay time has elapsed.", category="timer", timer="charge_delay")
+            Output.print_info("State: Key OFF.", category="state", mode="key_off")
+
+        # if not Car.is_aux_batt_sufficient(log=first_time_ind):
+        temp_threshold = 12 # temp measure until long-term key-off charge logic implemented.
+        if not Car.is_aux_batt_sufficient(threshold_override=temp_threshold, log=False):
+            # If Li batt V low, power down RPi.
+            Car.is_aux_batt_sufficient(threshold_override=temp_threshold, log=True) # Call again just for logging
+            Output.print_warn("Li batt V low (%.2f); initiating RPi shutdown." % Car.get_aux_voltage(log=False),
+                              category="program")
+            Car.shut_down_controller(delay=60)
+            return True
+            # Will turn back on next time key turned to ACC (assuming enable switch on)
+        # elif not Car.does_starter_batt_need_charge(log=first_time_ind):
+        #     if first_time_ind:
+        #         Output.print_warn("Starter batt fully charged; initiating RPi shutdown.")
+        #     Car.shut_down_controller()
+        #     return True
+        else:
+            # Keep charging while FLA batt needs charge and Li batt V sufficient.
+            Car.charge_starter_batt(log=first_time_ind, post_delay=first_time_ind)
+
+    return [
+        # Enable-switch state changes
+        ("enable switch opened",   lambda s, p: s["sys_enabled_state"] and not p["enable_switch_closed"],
+                                   enable_switch_opened, True),
+        ("enable switch closed",   lambda s, p: not s["sys_enabled_state"] and p["enable_switch_closed"],
+                                   enable_switch_closed, True),
+        # Shut down if shutdown countdown has ended.
+        ("shutdown delay elapsed", lambda s, p: p["shutdown_delay_elapsed"],
+                                   shutdown_delay_elapsed, True),
+        # Vehicle operating-state changes
+        ("key OFF -> ACC",         lambda s, p: p["acc_powered"] and not s["key_acc_powered"],
+                                   key_off_to_acc, True),
+        ("key ACC -> OFF",         lambda s, p: not p["acc_powered"] and s["key_acc_powered"],
+                                   key_acc_to_off, True),
+        ("engine stopped",         lambda s, p: not p["engine_running"] and s["engine_on_state"],
+                                   engine_stopped, True),
+        ("engine started",         lambda s, p: p["engine_running"] and not s["engine_on_state"],
+                                   engine_started, True),
+        # Steady-state charging modes (run every pass once charge delay elapsed)
+        ("mode: engine running",   lambda s, p: is_charge_ready(p) and s["engine_on_state"],
+                                   engine_running_mode, False),
+        ("mode: key ACC",          lambda s, p: is_charge_ready(p) and s["key_acc_powered"],
+                                   key_acc_mode, False),
+        ("mode: key OFF",          lambda s, p: is_charge_ready(p),
+                                   key_off_mode, False),
+    ]
+
+
+def run_pass(Car, Machine, Checkpoint, Status=None, Dog=None):
+    """One event-loop pass. Returns True if event loop should end.
+    """
+    Output = Car.Output
+    Timer = Car.Timer
+    Sampling = Car.Sampling
+    Phases = Car.Phases
+    Car.Params.apply_changes() # Edited control_params.py takes effect here, between passes.
+    Checkpoint.update(**Machine.states)
+    sample_due = Sampling.start_pass(Machine.states)
+
+    # Apply LED changes coalesced during previous pass and verify relay writes.
+    with Phases.phase("outputs"):
+        Controller().flush_outputs()
+
+    # Logging and output
+    if sample_due:
+        with Phases.phase("acquisition"):
+            Car.log_data()
+            if Status is not None:
+                Status.publish(Car.latest_sample, {"states": dict(Machine.states),
+                                                   "timers": Timer.get_timer_state(),
+                                                   "sampling": Sampling.mode,
+                                                   "faults": Car.Faults.get_active(),
+                                                   "pid": os.getpid()})
+    if Sampling.crossed(300):
+        # Every 5 minutes, print/log system status info.
+        with Phases.phase("status"):
             Timer.update_rtc(force=False, wait=False, log=True)
-            Timer.is_ntp_syncd(restart_on_sync=True, log=False)
-            # Will restart program if NTP sync detected first here (need to call before Vehicle.output_status()).
+            Timer.is_ntp_syncd(log=False) # First NTP sync (sys-time jump) handled in-process.
             Car.output_status()
-            time.sleep(1)
-            # Also check datalogging not crashed, every 5 min.
-            Car.check_datalogging()
-
-        # Check for enable-switch state change
-        if not Car.is_enable_switch_closed() and sys_enabled_state:
-            # Switch opened for the first time.
-            Car.is_enable_switch_closed(log=True) # Call again just for logging
-            sys_enabled_state = False
-            Car.stop_charging(log=True)
-            Timer.start_shutdown_timer(log=True)
-            continue
-        elif Car.is_enable_switch_closed() and not sys_enabled_state:
-            # Enable switch closed (during previous timeout)
-            Car.is_enable_switch_closed(log=True) # Call again just for logging
-            sys_enabled_state = True
-            Timer.stop_shutdown_timer(log=True)
-            Timer.start_charge_delay_timer("enable switch closed")  # Re-enter appropriate operating mode below after delay.
-            continue
+            Machine.print_stats()
+            Sampling.print_stats()
+            Car.Faults.print_stats()
 
-        # Shut down if shutdown countdown has ended.
-        if Timer.has_shutdown_delay_elapsed(log=False):
-            Timer.has_shutdown_delay_elapsed(log=True) # Call again just for logging
-            Car.shut_down_controller()
+    # Check datalogging not crashed (in-memory check of last inserts - cheap enough for every pass).
+    if Car.check_datalogging() and Dog is not None:
+        Dog.feed()
+
+    with Phases.phase("control"):
+        Timer.apply_pending_rebase() # After first NTP sync seen above (or in a previous pass).
+        return Machine.step(get_tick_predicates(Car))
+
+
+def set_stats_signal(Car, Machine, extra_stats_fxn=None):
+    """kill -USR2 <pid> logs loop-phase (incl. where loop is now), transition, sampling, and fault stats.
+    Logged from a separate thread, so it works while loop is blocked and never interrupts it mid-operation.
+    """
+    def print_loop_stats():
+        Car.Phases.print_stats()
+        Machine.print_stats()
+        Car.Sampling.print_stats()
+        Car.Faults.print_stats()
+        if extra_stats_fxn is not None:
+            extra_stats_fxn()
+    signal.signal(signal.SIGUSR2, lambda signo, frame: threading.Thread(target=print_loop_stats, name="stats",
+                                                                         daemon=True).start())
+
+
+def main(Output, Timer, Checkpoint, Status=None, Dog=None, Car=None):
+    """Pass existing Vehicle object to resume loop after in-process recovery (skips startup sequence).
+    Status is optional StatusServer to publish each new sample to.
+    Dog is optional Watchdog fed each pass while datalogging healthy.
+    """
+    if Car is None:
+        Car = start_up(Output, Timer, Checkpoint, Dog)
+        if Dog is not None:
+            Dog.notify_ready()
+    Machine = StateMachine(Output, build_transition_table(Car), dict(Checkpoint.loop_states))
+    set_stats_signal(Car, Machine)
+
+    while True:
+        if run_pass(Car, Machine, Checkpoint, Status, Dog):
             break
+        with Car.Phases.phase("wait"):
+            Car.Sampling.wait_for_next_pass() # No wait at full rate. Sleeps between samples when idle.
 
 
-        # Check for vehicle operating-state changes
-        if Car.is_acc_powered() and not key_acc_powered:
-            Output.print_info("Key switched from OFF to ACC.")
-            key_acc_powered = True
-            Car.stop_charging()
-            Timer.start_charge_delay_timer("key OFF -> ACC")
-            continue
-
-        elif not Car.is_acc_powered() and key_acc_powered:
-            Output.print_info("Key switched from ACC to OFF.")
-            key_acc_powered = False
-            Car.stop_charging()
-            if not engine_on_state:
-                # Engine already off. Can use shorter delay.
-                Timer.start_charge_delay_timer("key ACC -> OFF", delay_s=5)
-            else:
-                engine_on_state = False
-                Timer.start_charge_delay_timer("engine stopped, key ACC -> OFF")
-            continue
-
-        elif not Car.is_engine_running() and engine_on_state:
-            # Could happen independent of key -> ACC if engine stalls.
-            Output.print_info("Engine stopped (main voltage raw: %.2f)." % Car.get_main_voltage_raw())
-            engine_on_state = False
-            Car.stop_charging()
-            Timer.start_charge_delay_timer("engine stopped")
-            continue
-
-        elif Car.is_engine_running() and not engine_on_state:
-            Output.print_info("Engine started. (main voltage raw: %.2f)" % Car.get_main_voltage_raw())
-            engine_on_state = True
-            Car.stop_charging()
-            Timer.start_charge_delay_timer("engine started")
-            continue
-
-
-        shutdown_pending = Timer.is_shutdown_pending()
-        ready, first_time_ind = Timer.has_charge_delay_time_elapsed()
-        # Enter new charging mode (if first_time_ind is True) based on current state.
-        # or continue with current mode.
-        # Don't enter if shutdown pending.
-        if ready and not shutdown_pending:
-            if first_time_ind:
-                Output.print_debug("Charge-delay time has elapsed.")
-
-            if engine_on_state:
-                # Key ON, engine running.
-                if first_time_ind:
-                    Output.print_info("State: Key ON; engine running.")
-                if Car.is_aux_batt_full(log=first_time_ind):
-                    Timer.start_charge_delay_timer("aux battery full already", delay_s=600)
-                else:
-                    Car.charge_aux_batt(log=first_time_ind, post_delay=first_time_ind)
-
-            elif key_acc_powered:
-                # Key in ACC or ON but engine off.
-                if first_time_ind:
-                    Output.print_info("State: Key in ACC or ON; engine off.")
-                if Car.is_aux_batt_sufficient(log=first_time_ind):
-                    Car.charge_starter_batt(log=first_time_ind, post_delay=first_time_ind)
-                else:
-                    # If Li batt V low, power down RPi.
-                    Car.is_aux_batt_sufficient(log=True) # Call again just for logging
-                    Car.shut_down_controller(delay=60)
-                    break
-                    # Will need to be manually turned back on either by key cycle or enable-switch cycle.
-
-            else:
-                # Key OFF
-                if first_time_ind:
-                    Output.print_info("State: Key OFF.")
-
-                # if not Car.is_aux_batt_sufficient(log=first_time_ind):
-                temp_threshold = 12 # temp measure until long-term key-off charge logic implemented.
-                if not Car.is_aux_batt_sufficient(threshold_override=temp_threshold, log=False):
-                    # If Li batt V low, power down RPi.
-                    Car.is_aux_batt_sufficient(threshold_override=temp_threshold, log=True) # Call again just for logging
-                    Output.print_warn("Li batt V low (%.2f); initiating RPi shutdown." % Car.get_aux_voltage(log=False))
-                    Car.shut_down_controller(delay=60)
-                    break
-                    # Will turn back on next time key turned to ACC (assuming enable switch on)
-                # elif not Car.does_starter_batt_need_charge(log=first_time_ind):
-                #     if first_time_ind:
-                #         Output.print_warn("Starter batt fully charged; initiating RPi shutdown.")
-                #     Car.shut_down_controller()
-                #     break
-                else:
-                    # Keep charging while FLA batt needs charge and Li batt V sufficient.
-                    Car.charge_starter_batt(log=first_time_ind, post_delay=first_time_ind)
+def is_recoverable_fault(e):
+    """AutomationHAT faults seemingly caused by system acquiring NTP sync and jumping sys time.
+    """
+    if isinstance(e, (TimeoutError, SysTimeUpdateException)):
+        # TimeoutError thrown by AutomationHAT - "Timed out waiting for conversion."
+        return True
+    elif isinstance(e, OSError) and e.errno == 16:
+        # "OSError: [Errno 16] Device or resource busy"
+        return True
+        # "OSError: [Errno 5] Input/output error" thrown when AutomationHAT absent. Not recoverable.
+    else:
+        return False
 
 
-if __name__ == "__main__":
+def supervise(Output, Timer, Checkpoint, Status=None, Dog=None, main_fxn=main):
+    """Runs main() (or main_fxn w/ same signature, e.g. async_loop.main), recovering from
+    AutomationHAT faults in-process (relays opened, drivers re-initialized, loop resumed w/
+    existing Vehicle/DataLogger state) rather than exiting for launcher.sh to restart whole program.
+    Re-raises fault if recovery fails or faults recur too often.
+    """
+    recovery_times = [] # monotonic
+    while True:
+        try:
+            main_fxn(Output, Timer, Checkpoint, Status, Dog, Car=Checkpoint.Car)
+            return
+        except Exception as e:
+            if not is_recoverable_fault(e) or Checkpoint.Car is None:
+                # Startup not complete (no Vehicle object to resume with) - restart program instead.
+                raise
+            recovery_start = time.monotonic()
+            recovery_times = [t for t in recovery_times if recovery_start - t < 3600] + [recovery_start]
+            if len(recovery_times) > MAX_RECOVERIES_PER_HOUR:
+                Output.print_err("%d faults in past hour. Giving up on in-process recovery." % len(recovery_times),
+                                 category="program")
+                raise
+
+            Output.print_err(traceback.format_exc())
+            Output.print_rtc_and_sys_time("Time compare (after exception thrown)")
+            Output.print_warn("Recovering in-process from %s (recovery #%d this hour)."
+                              % (type(e).__name__, len(recovery_times)), category="program", fault=type(e).__name__)
+            try:
+                Checkpoint.Car.reinit_hardware()
+            except Exception:
+                Output.print_err("In-process recovery failed:\n%s" % traceback.format_exc(), category="program")
+                raise e
+            # Re-base datetime timers on (possibly jumped) clock using their monotonic elapsed times.
+            Timer.restore_timer_state(Timer.get_timer_state())
+            # Relays were opened. Re-enter charging mode as after any state change (voltage stabilization and
+            # wiring check), not straight away as if charge delay had long elapsed.
+            Timer.start_charge_delay_timer("in-process recovery", delay_s=10)
+            Output.print_info("In-process recovery complete in %.2fs. Resuming event loop."
+                              % (time.monotonic() - recovery_start), category="program")
+
+
+def run(main_fxn=main):
+    """Program entry point. Sets up shared objects and handles faults that end program.
+    """
     signal.signal(signal.SIGTERM, Controller().sigterm_handler) # method that turns off LEDs and relays and exits Python script
 
     Output = OutputHandler()
     Output.finish_clock_setup()
     Timer = Output.Clock     # TimeKeeper object created in OutputHandler.__init__()
+    Checkpoint = StateCheckpoint(Output, Timer)
+
+    Status = None
+    if STATUS_API_ADDRESS is not None:
+        try:
+            Status = StatusServer(Output)
+        except OSError as e:
+            # e.g., port still held by previous instance. Status API is nice-to-have only.
+            Output.print_warn("Status API not started (%s)." % e)
+
+    Dog = Watchdog(Output)
+    # kill -USR1 <pid> profiles running program for PROFILE_DURATION_SEC (stack dump in logs/).
+    # Profiler runs in own thread. Loop, relays, and timers unaffected.
+    Profiler = StackProfiler(Output)
+    signal.signal(signal.SIGUSR1, lambda signo, frame: Profiler.start())
+    LogArchiver(Output).start() # Compresses previous days' log files (low-priority thread).
 
     try:
-        main(Output, Timer)
+        supervise(Output, Timer, Checkpoint, Status, Dog, main_fxn=main_fxn)
     except TimeoutError:
         # Thrown by AutomationHAT - "Timed out waiting for conversion."
         # Seems to be caused by system acquiring NTP sync, jumping system time, and some mechanics in AutomationHAT code infer an op timed out.
         Output.print_err(traceback.format_exc())
         Output.print_rtc_and_sys_time("Time compare (after exception thrown)")
-        Output.print_err("Restarting program (TimeoutError caught).")
+        Output.print_err("Restarting program (TimeoutError caught).", category="program")
+        Checkpoint.save()
         Controller().open_all_relays()
         sys.exit(109) # https://medium.com/@himanshurahangdale153/list-of-exit-status-codes-in-linux-f4c00c46c9e0
     except OSError as e:
@@ -182,7 +398,8 @@ if __name__ == "__main__":
             #                                                 jumping system time, and some mechanics in AutomationHAT code infer an op timed out.
             Output.print_err(traceback.format_exc())
             Output.print_rtc_and_sys_time("Time compare (after exception thrown)")
-            Output.print_err("Restarting program (OSError 16 caught).")
+            Output.print_err("Restarting program (OSError 16 caught).", category="program")
+            Checkpoint.save()
             Controller().open_all_relays()
             sys.exit(109)
             # "OSError: [Errno 5] Input/output error" thrown when AutomationHAT absent. Handle below.
@@ -191,6 +408,7 @@ if __name__ == "__main__":
             Controller().open_all_relays()
     except SysTimeUpdateException:
         Output.print_exit("Restarting program after sys time updated.")
+        Checkpoint.save()
         Controller().open_all_relays()
         sys.exit(109)
     except KeyboardInterrupt:
@@ -202,3 +420,11 @@ if __name__ == "__main__":
     except:
         Output.print_exit("Program killed by OS.")
         Controller().open_all_relays()
+    finally:
+        if Checkpoint.Car is not None:
+            Checkpoint.Car.DataLogger.checkpoint() # Persist staged rows on every exit path.
+        Output.commit_events() # Batched EventLog rows (see EventLog.add) too.
+
+
+if __name__ == "__main__":
+    run()
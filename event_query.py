@@ -0,0 +1,69 @@
+"""Query structured event log (EventLog, logs/events.db) by type and time range.
+
+    python event_query.py [--since 2024-05-01] [--until "2024-05-02 12:00:00"] [-c charge -c state]
+                          [--level WARN] [--grep relay] [--with-data] [--json]
+"""
+import sys
+import json
+import argparse
+import datetime as dt
+
+from class_def import EventLog, EVENT_LOG_PATH, DATA_LOG_PATH
+
+
+def parse_time_arg(time_str):
+    for time_format in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+        try:
+            return dt.datetime.strptime(time_str, time_format)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError("Unrecognized time '%s' (use YYYY-MM-DD[ HH:MM[:SS]])." % time_str)
+
+
+def format_event(event, with_data):
+    line = "%s  %-5s  %-8s  %s" % (event["Timestamp"] if event["time_valid"] else "(%s?)" % event["Timestamp"],
+                                   event["level"], event["category"], event["message"].replace("\n", "\n\t"))
+    if event["fields"]:
+        line += "  " + json.dumps(event["fields"])
+    if with_data:
+        if event["Vmain_raw"] is None or event["charge_current"] is None:
+            line += "  [no sample]"
+        else:
+            line += "  [Vmain %.2f, Vaux %.2f, %s %.2fA]" % (event["Vmain_raw"], event["Vaux_raw"],
+                                                            ("fwd" if event["charge_dir"] else "rev")
+                                                            if event["charge_enable"] else "idle",
+                                                            event["charge_current"])
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query structured event log.")
+    parser.add_argument("--db", default=EVENT_LOG_PATH, help="Event DB (e.g. copy synced to laptop).")
+    parser.add_argument("--since", type=parse_time_arg)
+    parser.add_argument("--until", type=parse_time_arg, help="Exclusive.")
+    parser.add_argument("-c", "--category", action="append",
+                        help="state, charge, fault, timer, time, sampling, program, backup, general (repeatable).")
+    parser.add_argument("--level", choices=EventLog.EVENT_LEVELS, help="Minimum level.")
+    parser.add_argument("--grep", help="Substring of message.")
+    parser.add_argument("--with-data", nargs="?", const=DATA_LOG_PATH, metavar="DATA_LOG_DB",
+                        help="Join each event w/ sensor sample from same second.")
+    parser.add_argument("--include-invalid-time", action="store_true",
+                        help="Include events logged before sys time was valid.")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--json", action="store_true", help="Output JSON lines.")
+    args = parser.parse_args()
+
+    Events = EventLog(db_path=args.db)
+    events = Events.query(start=args.since, end=args.until, categories=args.category, min_level=args.level,
+                          contains=args.grep, valid_only=not args.include_invalid_time,
+                          data_log_path=args.with_data, limit=args.limit)
+    for event in events:
+        if args.json:
+            print(json.dumps(event))
+        else:
+            print(format_event(event, args.with_data is not None))
+    print("%d event(s)." % len(events), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
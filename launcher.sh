@@ -9,6 +9,7 @@ USERNAME="user11"
 # https://stackoverflow.com/a/16011496
 
 PROGRAM_ROOT="/home/${USERNAME}/vehicle_aux_battery_control"
+EVENT_LOOP_SCRIPT="event_loop.py" # or async_loop.py (asyncio runtime)
 # Kill program if already running.
 ${PROGRAM_ROOT}/kill_event_loop.sh
 
@@ -29,7 +30,7 @@ if [ -e "${KILLSWITCH_PATH}" ]; then
     cd "${PROGRAM_ROOT}"
     while :
     do
-        python event_loop.py
+        python ${EVENT_LOOP_SCRIPT}
         EVENT_LOOP_RETURN=$? # gets return value of last command executed.
         if [ ${EVENT_LOOP_RETURN} -ne 109 ]; then
             break
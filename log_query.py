@@ -0,0 +1,96 @@
+"""Search text logs (logs/YYYYMMDD.log, and .log.gz compressed by LogArchiver) by time range and level.
+Compressed days are read through their index, so only blocks in range (and w/ matching levels) are
+decompressed. Output streamed as found.
+
+    python log_query.py [--since 2024-05-01] [--until "2024-05-02 12:00"] [--level WARN] [--grep relay]
+                        [--dir logs/] [--include-invalid-time]
+"""
+import os
+import re
+import sys
+import gzip
+import argparse
+import datetime as dt
+
+from class_def import LogArchiver, EventLog, LOG_DIR, LOG_FILE_REGEX, DATE_FORMAT
+from event_query import parse_time_arg
+
+
+def get_log_paths(log_dir, start, end):
+    """Returns paths of logs (compressed or not) for days overlapping [start, end), oldest first.
+    """
+    log_paths = []
+    for name in sorted(os.listdir(log_dir)):
+        match = re.match(LOG_FILE_REGEX, name[:-3] if name.endswith(".gz") else name)
+        if match is None:
+            continue
+        day_start = dt.datetime.strptime(match.group(1), DATE_FORMAT)
+        if ((start is not None and day_start + dt.timedelta(days=1) <= start)
+                or (end is not None and day_start >= end)):
+            continue
+        log_paths.append(os.path.join(log_dir, name))
+    # Day compressed while program later appended to it has both. Compressed part is older.
+    return sorted(log_paths, key=lambda path: (os.path.basename(path).split(".")[0], not path.endswith(".gz")))
+
+
+def iter_chunks(log_path, start, end, min_level, include_invalid_time):
+    if not log_path.endswith(".gz"):
+        with open(log_path, "r", errors="replace") as fd:
+            yield fd.read()
+    elif os.path.exists(LogArchiver.get_index_path(log_path)):
+        yield from LogArchiver.iter_blocks(log_path, start, end, min_level, include_invalid_time)
+    else:
+        with gzip.open(log_path, "rt", errors="replace") as fd: # No index (e.g., gzipped by hand).
+            yield fd.read()
+
+
+def iter_entries(chunk):
+    """Yields (header, lines) per entry. Continuation lines (tracebacks) kept w/ their entry.
+    """
+    header, lines = None, []
+    for line in chunk.splitlines():
+        line_header = LogArchiver.parse_header(line)
+        if line_header is not None and lines:
+            yield header, lines
+            lines = []
+        if line_header is not None or not lines:
+            header = line_header
+        lines.append(line)
+    if lines:
+        yield header, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search text logs (plain or compressed).")
+    parser.add_argument("--dir", default=LOG_DIR, help="Log dir (e.g. copy synced to laptop).")
+    parser.add_argument("--since", type=parse_time_arg)
+    parser.add_argument("--until", type=parse_time_arg, help="Exclusive.")
+    parser.add_argument("--level", choices=EventLog.EVENT_LEVELS, help="Minimum level.")
+    parser.add_argument("--grep", help="Substring of entry.")
+    parser.add_argument("--include-invalid-time", action="store_true",
+                        help="Include entries logged before sys time was valid (and unstamped lines).")
+    args = parser.parse_args()
+
+    levels = EventLog.EVENT_LEVELS[EventLog.EVENT_LEVELS.index(args.level):] if args.level else None
+    num_entries = 0
+    for log_path in get_log_paths(args.dir, args.since, args.until):
+        for chunk in iter_chunks(log_path, args.since, args.until, args.level, args.include_invalid_time):
+            for header, lines in iter_entries(chunk):
+                if header is None or header[0] is None:
+                    if not args.include_invalid_time:
+                        continue
+                elif ((args.since is not None and header[0] < args.since)
+                        or (args.until is not None and header[0] >= args.until)):
+                    continue
+                if levels is not None and (header is None or header[1] not in levels):
+                    continue
+                entry = "\n".join(lines)
+                if args.grep is not None and args.grep not in entry:
+                    continue
+                print(entry)
+                num_entries += 1
+    print("%d entries." % num_entries, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
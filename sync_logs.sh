@@ -1,6 +1,10 @@
 
 RPI_USER="user11"
 RPI_PROGRAM_ROOT="/home/${RPI_USER}/vehicle_aux_battery_control"
+# events.db (EventLog) held open and written by running program, so copying file directly can give torn copy.
+# Synced from snapshot taken w/ SQLite online backup instead (consistent as of last committed event).
+EVENT_LOG_SNAPSHOT_PATH=${RPI_PROGRAM_ROOT}/logs/events.db.snapshot
+EVENT_LOG_SNAPSHOT_CMD="python3 -c 'import sqlite3, sys; dst = sqlite3.connect(sys.argv[2]); sqlite3.connect(sys.argv[1]).backup(dst); dst.close()' ${RPI_PROGRAM_ROOT}/logs/events.db ${EVENT_LOG_SNAPSHOT_PATH}"
 
 # If running on RPi, push log BU to USB
 KILLSWITCH_DEV="USB-01"
@@ -11,7 +15,21 @@ DEST_PATH_DATA=${KILLSWITCH_DEV_ROOT}
 DEST_PATH_DATA_BU=${KILLSWITCH_DEV_ROOT}/datalogging_BU
 if [ -d "/home/${RPI_USER}" ] && [ -e "${KILLSWITCH_PATH}" ]; then
     sleep 15 # need delay after system startup for drive to mount.
+    # Completed days are .log.gz (LogArchiver), so unchanged days skipped and little sent.
     rsync -azi \
+          --exclude "*.tmp" \
+          --exclude "events.db*" \
+          ${RPI_PROGRAM_ROOT}/logs/ \
+          ${DEST_PATH_LOGS}/
+    sh -c "${EVENT_LOG_SNAPSHOT_CMD}" && \
+    rsync -azi \
+          ${EVENT_LOG_SNAPSHOT_PATH} \
+          ${DEST_PATH_LOGS}/events.db
+    # Remove .log files superseded by .log.gz (LogArchiver removes .log once compressed copy written).
+    # Deletion-only pass (nothing transferred). Only .log files considered, so nothing else ever deleted.
+    rsync -ri \
+          --existing --ignore-existing --delete-after \
+          --include "*.log" --exclude "*" \
           ${RPI_PROGRAM_ROOT}/logs/ \
           ${DEST_PATH_LOGS}/
 
@@ -36,10 +54,24 @@ DEST_PATH_DATA=${DEST_PATH_BASE}
 DEST_PATH_DATA_BU=${DEST_PATH_BASE}/datalogging_BU
 if [ -d "/home/${LAPTOP_USER}" ]; then
     rsync -azivh \
+          --exclude "*.tmp" \
+          --exclude "events.db*" \
           --partial-dir="${DEST_PATH_BASE}/rsync_partials_buffer" \
           -e "ssh -i /home/${LAPTOP_USER}/.ssh/id_ed25519" \
           ${RPI_USER}@${REMOTE_HOSTNAME}:${RPI_PROGRAM_ROOT}/logs/ \
           ${DEST_PATH_LOGS}
+    ssh -i /home/${LAPTOP_USER}/.ssh/id_ed25519 ${RPI_USER}@${REMOTE_HOSTNAME} "${EVENT_LOG_SNAPSHOT_CMD}" && \
+    rsync -azivh \
+          -e "ssh -i /home/${LAPTOP_USER}/.ssh/id_ed25519" \
+          ${RPI_USER}@${REMOTE_HOSTNAME}:${EVENT_LOG_SNAPSHOT_PATH} \
+          ${DEST_PATH_LOGS}/events.db
+    # Remove .log files superseded by .log.gz (see above).
+    rsync -rivh \
+          --existing --ignore-existing --delete-after \
+          --include "*.log" --exclude "*" \
+          -e "ssh -i /home/${LAPTOP_USER}/.ssh/id_ed25519" \
+          ${RPI_USER}@${REMOTE_HOSTNAME}:${RPI_PROGRAM_ROOT}/logs/ \
+          ${DEST_PATH_LOGS}
 
     rsync -azivh \
           --progress \
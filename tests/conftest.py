@@ -0,0 +1,33 @@
+"""Shared fixtures. Tests run class_def/event_loop code against simulated hardware
+(benchmarks/fake_hardware.py) w/ all data and log files under a temp dir.
+"""
+import os
+import sys
+import time
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+sys.path.insert(0, REPO_ROOT)
+
+import fake_hardware
+fake_hardware.import_class_def() # Fallback local modules (control_params etc.) before test modules import event_loop.
+
+
+@pytest.fixture
+def class_def(tmp_path, monkeypatch):
+    """class_def module pointed at simulated hardware. Deliberate delays (time.sleep) skipped.
+    """
+    monkeypatch.setattr(time, "sleep", lambda seconds: None)
+    module = fake_hardware.install(str(tmp_path))
+    fake_hardware.HAT.__init__() # Default scenario (key off, enable switch closed, relays open).
+    yield module
+    module.Controller._instance = None
+
+
+@pytest.fixture
+def Output(class_def):
+    Output = class_def.OutputHandler()
+    Output.finish_clock_setup()
+    return Output
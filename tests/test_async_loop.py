@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import pytest
+
+import fake_hardware
+import event_loop
+import async_loop
+
+
+def test_fault_during_charge_transition_leaves_relays_open(class_def, Output):
+    Checkpoint = class_def.StateCheckpoint(Output, Output.Clock)
+    Car = event_loop.start_up(Output, Output.Clock, Checkpoint)
+    mid_transition = threading.Event()
+    relays_opened = threading.Event()
+
+    def start_charging(s, p):
+        # Control thread: direction set, then fault handled on acquisition thread before charger enabled.
+        Car.BattCharger.set_charge_direction_rev()
+        mid_transition.set()
+        relays_opened.wait(5)
+        Car.BattCharger.enable_charge()
+    Machine = class_def.StateMachine(Output, [("start charging", lambda s, p: True, start_charging, True)],
+                                     dict(Checkpoint.loop_states))
+    Runtime = async_loop.AsyncRuntime(Car, Machine, Checkpoint)
+    Runtime._wait_for_next_pass = lambda: None
+    num_samples = [0]
+
+    def acquire():
+        num_samples[0] += 1
+        if num_samples[0] == 1:
+            return True
+        mid_transition.wait(5)
+        try:
+            # e.g., FaultDetector raising relay fault
+            class_def.Controller().exit_program(class_def.ChargeControlError, "Relay fault.")
+        finally:
+            relays_opened.set()
+    Runtime._acquire = acquire
+
+    with pytest.raises(class_def.ChargeControlError):
+        asyncio.run(Runtime.run())
+    assert not any(thread.name.startswith("control") for thread in threading.enumerate())
+    assert fake_hardware.HAT.relays == [False, False, False]
@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock. Advance by adding to clock[0]."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def feed(Est, clock, v_terminal, duration_s, interval_s=0.1, current_a=0, usable=True):
+    for sample_num in range(int(round(duration_s / interval_s))):
+        clock[0] += interval_s
+        Est.update(v_terminal, current_a, usable=usable)
+
+
+def test_not_confident_from_single_reading(class_def, clock):
+    Est = class_def.BatteryEstimator("Aux", 0.02)
+    Est.update(13.2, 0)
+    assert not Est.is_confident()
+    feed(Est, clock, 13.2, 1)
+    assert not Est.is_confident() # Enough readings, but not settled long enough.
+    feed(Est, clock, 13.2, class_def.OCV_EST_MIN_SETTLED_SEC)
+    assert Est.is_confident()
+    assert Est.get_estimate()[0] == pytest.approx(13.2)
+
+
+def test_charge_transition_waits_out_settle_time(class_def, clock):
+    Est = class_def.BatteryEstimator("Aux", 0.02)
+    feed(Est, clock, 13.2, 20)
+    assert Est.is_confident()
+    Est.add_uncertainty(class_def.OCV_EST_TRANSITION_V2)
+    feed(Est, clock, 13.0, class_def.OCV_EST_MIN_SETTLED_SEC - 1)
+    assert not Est.is_confident()
+    feed(Est, clock, 13.0, 2)
+    assert Est.is_confident()
+
+
+def test_stale_estimate_not_confident_after_unusable_stretch(class_def, clock):
+    # e.g., main battery while engine ran 30 min (alternator current unmeasured).
+    Est = class_def.BatteryEstimator("Main", 0.03)
+    feed(Est, clock, 12.6, 20)
+    feed(Est, clock, 14.2, 30*60, interval_s=1, usable=False)
+    assert not Est.is_confident()
+    feed(Est, clock, 12.7, 1)
+    assert not Est.is_confident() # Pre-start estimate not trusted on first readings after engine off.
+    assert Est.get_estimate()[1] > class_def.OCV_EST_CONFIDENT_STD_V
+
+
+def test_idle_sampling_rate_still_confident(class_def, clock):
+    Est = class_def.BatteryEstimator("Aux", 0.02)
+    feed(Est, clock, 13.2, 600, interval_s=class_def.SAMPLE_INTERVAL_IDLE_SEC)
+    assert Est.is_confident()
@@ -0,0 +1,52 @@
+import os
+import shutil
+
+import pytest
+
+
+@pytest.fixture
+def param_files(class_def, tmp_path, monkeypatch):
+    """(local, usb) control_params.py paths in separate dirs. class_def globals restored after test.
+    """
+    for name in class_def.CONTROL_PARAM_NAMES:
+        monkeypatch.setattr(class_def, name, getattr(class_def, name))
+    local_path = tmp_path / "local" / "control_params.py"
+    usb_path = tmp_path / "USB-01" / "control_params.py"
+    for path in (local_path, usb_path):
+        path.parent.mkdir()
+    local_path.write_text("AUX_V_MIN = 12.8\nAUX_V_MAX = 13.6\nRPI_SHUTDOWN_DELAY_SEC = 10*60\n")
+    return str(local_path), str(usb_path)
+
+
+def test_usb_override_applied_at_startup_and_reverted_when_drive_removed(class_def, Output, param_files):
+    local_path, usb_path = param_files
+    with open(usb_path, "w") as fd:
+        fd.write("import os\nAUX_V_MAX = 13.8\n")
+    Params = class_def.ControlParamStore(Output, paths=[local_path, usb_path])
+    assert class_def.AUX_V_MAX == 13.8
+    assert class_def.RPI_SHUTDOWN_DELAY_SEC == 600
+    assert Params.overrides == {"AUX_V_MAX": usb_path}
+
+    shutil.rmtree(os.path.dirname(usb_path)) # Drive removed.
+    Params.last_poll_time = 0
+    assert Params.apply_changes() == {"AUX_V_MAX": (13.8, 13.6)}
+    assert Params.overrides == {}
+
+
+def test_param_files_parsed_not_run(class_def, Output, param_files, tmp_path):
+    local_path, usb_path = param_files
+    marker_path = tmp_path / "ran"
+    with open(usb_path, "w") as fd:
+        fd.write("open(%r, 'w')\nAUX_V_MAX = len('x') + 13\n" % str(marker_path))
+    class_def.ControlParamStore(Output, paths=[local_path, usb_path])
+    assert not marker_path.exists()
+    assert class_def.AUX_V_MAX == 13.6 # Whole reload rejected (non-literal value).
+
+
+def test_invalid_change_rejected(class_def, Output, param_files):
+    local_path, usb_path = param_files
+    Params = class_def.ControlParamStore(Output, paths=[local_path, usb_path])
+    with open(local_path, "a") as fd:
+        fd.write("AUX_V_MIN = 14.0\n") # Above AUX_V_MAX
+    assert Params.apply_changes(force=True) == {}
+    assert class_def.AUX_V_MIN == 12.8
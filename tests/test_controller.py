@@ -0,0 +1,26 @@
+import pytest
+
+import fake_hardware
+
+
+def test_exit_program_opens_relays_despite_failed_readback(class_def, monkeypatch):
+    Ctrl = class_def.Controller()
+    Ctrl.close_relay(class_def.CHARGER_ENABLE_RELAY)
+    Ctrl.flush_outputs()
+    # Relay 2 reads back wrong (e.g., failed closed) - what exit_program() is typically reporting.
+    Ctrl.open_relay(2)
+    monkeypatch.setattr(fake_hardware._Relay, "is_on", lambda relay: relay.num == 2 or fake_hardware.HAT.relays[relay.num])
+
+    with pytest.raises(class_def.ChargeControlError):
+        Ctrl.exit_program(class_def.ChargeControlError, "Relay failed closed.")
+    assert not fake_hardware.HAT.relays[class_def.CHARGER_ENABLE_RELAY]
+
+
+def test_flush_outputs_detects_failed_readback(class_def, monkeypatch):
+    Ctrl = class_def.Controller()
+    Ctrl.flush_outputs() # Learn initial relay states.
+    monkeypatch.setattr(fake_hardware._Relay, "on", lambda relay: None) # Relay doesn't respond.
+    Ctrl.close_relay(1)
+    with pytest.raises(class_def.ChargeControlError, match="Relay 1 follow-up check failed"):
+        Ctrl.flush_outputs()
+    assert fake_hardware.HAT.relays == [False, False, False]
@@ -0,0 +1,46 @@
+import re
+import sys
+import shutil
+import hashlib
+import datetime as dt
+
+import synth_datalog
+import datalog_report
+
+
+def file_hash(path):
+    with open(path, "rb") as fd:
+        return hashlib.sha256(fd.read()).hexdigest()
+
+
+def render(class_def, db_path, start_ms, end_ms):
+    Logger = class_def.DataLogger(None, db_path=db_path, purge=False, read_only=True)
+    report = datalog_report.render_report(Logger, start_ms, end_ms, 500)
+    return re.sub(r"<p>.*</p>", "", report) # DB path and generation time.
+
+
+def test_report_leaves_db_unchanged(class_def, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "system_data_log.db")
+    synth_datalog.generate(db_path, 1)
+    db_hash = file_hash(db_path)
+    output_path = str(tmp_path / "report.html")
+    monkeypatch.setattr(sys, "argv", ["datalog_report.py", "--db", db_path, "--output", output_path])
+    datalog_report.main()
+    assert file_hash(db_path) == db_hash
+    with open(output_path) as fd:
+        assert "Charger power" in fd.read()
+
+
+def test_report_same_w_and_wo_derived_rows(class_def, tmp_path):
+    db_path = str(tmp_path / "raw.db")
+    synth_datalog.generate(db_path, 1, start_time=dt.datetime(2024, 5, 1))
+    backfilled_path = str(tmp_path / "backfilled.db")
+    shutil.copy(db_path, backfilled_path)
+    class_def.DataLogger(None, db_path=backfilled_path, purge=False).backfill_derived()
+
+    start_ms, end_ms = class_def.DataLogger.get_day_bounds_ms("2024-05-01")
+    Raw = class_def.DataLogger(None, db_path=db_path, purge=False, read_only=True)
+    Backfilled = class_def.DataLogger(None, db_path=backfilled_path, purge=False, read_only=True)
+    assert not datalog_report.has_derived_rows(Raw, start_ms, end_ms)
+    assert datalog_report.has_derived_rows(Backfilled, start_ms, end_ms)
+    assert render(class_def, db_path, start_ms, end_ms) == render(class_def, backfilled_path, start_ms, end_ms)
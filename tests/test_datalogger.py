@@ -0,0 +1,56 @@
+import sqlite3
+import datetime as dt
+
+import fake_hardware
+
+
+class RecordingOutput(fake_hardware.QuietOutput):
+    def __init__(self):
+        self.messages = []
+
+    def print_err(self, message, **kwargs):
+        self.messages.append(("ERROR", message))
+
+    def print_debug(self, message, **kwargs):
+        self.messages.append(("DEBUG", message))
+
+
+def log_rows(Logger, num_rows):
+    start = dt.datetime.now() - dt.timedelta(seconds=num_rows)
+    for row_num in range(num_rows):
+        Logger.log_voltages(start + dt.timedelta(seconds=row_num), [12.6, 13.2])
+    Logger.flush_pending()
+
+
+def test_failed_checkpoint_not_counted_and_retried(class_def, tmp_path):
+    Output = RecordingOutput()
+    Logger = class_def.DataLogger(Output, db_path=str(tmp_path / "persist.db"),
+                                  staging_path=str(tmp_path / "staging.db"))
+    log_rows(Logger, 10)
+    # e.g., SD card full
+    with sqlite3.connect(str(tmp_path / "persist.db")) as conn:
+        conn.execute("CREATE TRIGGER fail BEFORE INSERT ON voltages BEGIN SELECT RAISE(ABORT, 'disk full'); END;")
+    assert Logger.checkpoint() == 0
+    assert Output.messages[-1][0] == "ERROR" and "10 rows remain staged" in Output.messages[-1][1]
+
+    with sqlite3.connect(str(tmp_path / "persist.db")) as conn:
+        conn.execute("DROP TRIGGER fail;")
+    assert Logger.checkpoint() == 10
+    assert Output.messages[-1][1].startswith("Datalog checkpoint: 10 rows written")
+
+
+def test_persisted_query_cache_misses_after_rows_added_to_range(class_def, tmp_path):
+    db_path = str(tmp_path / "persist.db")
+    cache_dir = str(tmp_path / "cache")
+    Logger = class_def.DataLogger(fake_hardware.QuietOutput(), db_path=db_path, cache_dir=cache_dir)
+    day_start = dt.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - dt.timedelta(days=1)
+    Logger.log_voltages(day_start + dt.timedelta(hours=1), [12.6, 13.2])
+    Logger.log_voltages(dt.datetime.now(), [12.6, 13.2]) # Newer row, so yesterday's range is cacheable.
+    Logger.flush_pending()
+    assert len(Logger.get_dfs(day_start.date().isoformat())[0]) == 1
+
+    # Next session: row back-stamped into yesterday (held while sys time invalid).
+    Logger = class_def.DataLogger(fake_hardware.QuietOutput(), db_path=db_path, cache_dir=cache_dir)
+    Logger.log_voltages(day_start + dt.timedelta(hours=2), [12.5, 13.1])
+    Logger.flush_pending()
+    assert len(Logger.get_dfs(day_start.date().isoformat())[0]) == 2
@@ -0,0 +1,34 @@
+import sqlite3
+
+
+def count_committed(db_path):
+    with sqlite3.connect(db_path) as conn: # Separate connection only sees committed rows.
+        return conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+def test_events_committed_in_batches(class_def, tmp_path):
+    db_path = str(tmp_path / "events.db")
+    Events = class_def.EventLog(db_path)
+    Events.add("2024-05-01 12:00:00", True, "INFO", "state", "one")
+    Events.add("2024-05-01 12:00:01", True, "DEBUG", "state", "two")
+    assert count_committed(db_path) == 0
+    assert len(Events.query()) == 2 # Visible to own connection before commit.
+
+    Events.add("2024-05-01 12:00:02", True, "WARN", "state", "three")
+    assert count_committed(db_path) == 3
+
+    Events.add("2024-05-01 12:00:03", True, "INFO", "state", "four")
+    Events.last_commit_time -= class_def.EVENT_LOG_COMMIT_INTERVAL_SEC
+    Events.add("2024-05-01 12:00:04", True, "INFO", "state", "five")
+    assert count_committed(db_path) == 5
+
+
+def test_deferred_writes_committed_on_flush(Output):
+    Output.defer_writes()
+    Output.print_info("queued", category="state")
+    assert "queued" not in [event["message"] for event in Output.Events.query(valid_only=False)]
+    Output.flush_writes()
+    events = Output.Events.query(valid_only=False)
+    assert events[-1]["message"] == "queued"
+    assert count_committed(Output.Events.db_path) == len(events)
+    Output.defer_writes(False)
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+import fake_hardware
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock. Advance by adding to clock[0]."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_sample(Vmain_raw=12.6, Vaux_raw=13.2):
+    return {"Vmain_raw": Vmain_raw, "Vaux_raw": Vaux_raw, "charge_current": 0.0,
+            "charge_enable": False, "charge_dir": False, "key_ACC": True}
+
+
+def feed(Faults, clock, sample, num_samples, interval_s):
+    """Returns names of faults raised."""
+    raised = []
+    for sample_num in range(num_samples):
+        clock[0] += interval_s
+        raised += [name for name, message in Faults.update(sample, sample["Vaux_raw"], False)]
+    return raised
+
+
+def test_transient_not_raised(class_def, clock):
+    Faults = class_def.FaultDetector(fake_hardware.QuietOutput())
+    feed(Faults, clock, make_sample(), 5, 1)
+    # Violated for (many) fewer samples than needed, then cleared.
+    assert feed(Faults, clock, make_sample(Vmain_raw=0.1), class_def.FAULT_DEBOUNCE_MIN_SAMPLES - 1, 1) == []
+    assert Faults.is_any_suspect()
+    assert feed(Faults, clock, make_sample(), 1, 1) == []
+    assert not Faults.is_any_suspect()
+    # Violated for enough samples, but over too short a time.
+    assert feed(Faults, clock, make_sample(Vmain_raw=0.1), 10, class_def.FAULT_DEBOUNCE_SEC / 20) == []
+    assert Faults.get_active() == []
+
+
+def test_sustained_violation_raised_once_then_cleared(class_def, clock):
+    Faults = class_def.FaultDetector(fake_hardware.QuietOutput())
+    feed(Faults, clock, make_sample(), 5, 1)
+    raised = feed(Faults, clock, make_sample(Vmain_raw=0.1), 10, class_def.FAULT_DEBOUNCE_SEC / 2)
+    assert raised == ["main_batt_present"] # Only once, though violation continued.
+    assert Faults.get_active() == ["main_batt_present"]
+    assert not Faults.is_any_suspect()
+
+    feed(Faults, clock, make_sample(), 1, 1)
+    assert Faults.get_active() == []
+
+
+def test_shunt_drift_flagged_either_direction(class_def, clock):
+    for offset_a in [0.8, -0.8]:
+        Faults = class_def.FaultDetector(fake_hardware.QuietOutput())
+        sample = dict(make_sample(), charge_current=offset_a * class_def.MIN_CHARGE_CURRENT_A)
+        assert feed(Faults, clock, sample, 10, 1) == ["shunt_zero_drift"]
@@ -0,0 +1,77 @@
+import os
+import gzip
+import datetime as dt
+
+import fake_hardware
+import log_query
+
+DAY_LOG = ("launcher.sh: starting\n"
+           "--------042005 [INFO]  Program start (time not yet valid)\n"
+           "20240501T100000 [DEBUG] Charge delay started.\n"
+           "20240501T100500 [INFO]  State: Key OFF.\n"
+           "20240501T110000 [ERROR] Traceback (most recent call last):\n"
+           "  File \"event_loop.py\", line 1\n"
+           "20240501T113000 [INFO]  Engine started.\n")
+APPENDED_LOG = ("20240501T230000 [WARN]  Li batt V low.\n")
+
+
+def write_log(log_dir, name, text):
+    with open(os.path.join(log_dir, name), "a") as fd:
+        fd.write(text)
+    return os.path.join(log_dir, name)
+
+
+def test_compress_then_append_to_compressed_day(class_def, tmp_path):
+    Archiver = class_def.LogArchiver(fake_hardware.QuietOutput(), log_dir=str(tmp_path))
+    log_path = write_log(str(tmp_path), "20240501.log", DAY_LOG)
+    Archiver.compress(log_path)
+    assert not os.path.exists(log_path)
+    num_blocks = len(Archiver.read_index(log_path + ".gz")["blocks"])
+    assert num_blocks == 3 # Before time valid, hour 10, hour 11.
+
+    # Program appended to day after it was compressed.
+    write_log(str(tmp_path), "20240501.log", APPENDED_LOG)
+    Archiver.compress(log_path)
+    with gzip.open(log_path + ".gz", "rt") as fd:
+        assert fd.read() == DAY_LOG + APPENDED_LOG # Still one readable gzip stream (zcat).
+    index = Archiver.read_index(log_path + ".gz")
+    assert len(index["blocks"]) == num_blocks + 1
+    assert index["raw_size"] == len(DAY_LOG + APPENDED_LOG)
+    assert [block["raw_offset"] for block in index["blocks"][1:]] == \
+           [block["raw_offset"] + block["raw_length"] for block in index["blocks"][:-1]]
+
+
+def test_blocks_split_at_max_size(class_def, tmp_path, monkeypatch):
+    monkeypatch.setattr(class_def, "LOG_COMPRESS_BLOCK_MAX_BYTES", 60)
+    Archiver = class_def.LogArchiver(fake_hardware.QuietOutput(), log_dir=str(tmp_path))
+    log_path = write_log(str(tmp_path), "20240501.log", DAY_LOG)
+    Archiver.compress(log_path)
+    blocks = Archiver.read_index(log_path + ".gz")["blocks"]
+    # Hour 11 block split once full (traceback took it over max size) - continuation lines kept w/ entry.
+    assert [block["first_time"] for block in blocks] == [None, "2024-05-01 10:00:00", "2024-05-01 11:00:00",
+                                                         "2024-05-01 11:30:00"]
+    assert "".join(class_def.LogArchiver.iter_blocks(log_path + ".gz", include_invalid_time=True)) == DAY_LOG
+
+
+def test_iter_blocks_filters_by_time_and_level(class_def, tmp_path):
+    Archiver = class_def.LogArchiver(fake_hardware.QuietOutput(), log_dir=str(tmp_path))
+    log_path = write_log(str(tmp_path), "20240501.log", DAY_LOG)
+    Archiver.compress(log_path)
+    gz_path = log_path + ".gz"
+
+    def read(**kwargs):
+        return "".join(class_def.LogArchiver.iter_blocks(gz_path, **kwargs))
+    assert read(start=dt.datetime(2024, 5, 1, 10, 2), end=dt.datetime(2024, 5, 1, 11)) == \
+           "".join(DAY_LOG.splitlines(keepends=True)[2:4])
+    assert "Traceback" in read(min_level="ERROR") and "Key OFF" not in read(min_level="ERROR")
+    assert "time not yet valid" not in read()
+    assert "time not yet valid" in read(include_invalid_time=True)
+
+
+def test_get_log_paths_orders_compressed_part_first(class_def, tmp_path):
+    for name in ["20240430.log.gz", "20240501.log", "20240501.log.gz", "20240502.log", "20240503.log",
+                 "20240501.log.gz.idx", "events.db"]:
+        write_log(str(tmp_path), name, "")
+    paths = log_query.get_log_paths(str(tmp_path), dt.datetime(2024, 4, 30, 12), dt.datetime(2024, 5, 3))
+    assert [os.path.basename(path) for path in paths] == \
+           ["20240430.log.gz", "20240501.log.gz", "20240501.log", "20240502.log"]
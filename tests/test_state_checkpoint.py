@@ -0,0 +1,43 @@
+import os
+import json
+
+import event_loop
+
+
+def test_round_trip_resumes_loop_states_and_timers(class_def, Output):
+    Checkpoint = class_def.StateCheckpoint(Output, Output.Clock)
+    Car = event_loop.start_up(Output, Output.Clock, Checkpoint)
+    Checkpoint.update(engine_on_state=True)
+    Car.BattCharger.enable_charge()
+    Checkpoint.save()
+    assert os.path.exists(class_def.STATE_CHECKPOINT_PATH)
+
+    Resumed = class_def.StateCheckpoint(Output, Output.Clock)
+    event_loop.start_up(Output, Output.Clock, Resumed)
+    assert Resumed.loop_states == {"key_acc_powered": False, "engine_on_state": True, "sys_enabled_state": True}
+    assert Output.Clock.is_charge_delay_pending() # Restored from first instance's "program startup" timer.
+    assert not os.path.exists(class_def.STATE_CHECKPOINT_PATH) # Consumed so it only applies once.
+
+
+def test_no_checkpoint_saved_before_startup_complete(class_def, Output):
+    # e.g., HAT fault during startup, before Vehicle object created.
+    Checkpoint = class_def.StateCheckpoint(Output, Output.Clock)
+    Checkpoint.save()
+    assert not os.path.exists(class_def.STATE_CHECKPOINT_PATH)
+
+    Checkpoint.update(key_acc_powered=False) # Loop states only partly recorded.
+    Checkpoint.attach_vehicle(object())
+    Checkpoint.save()
+    assert not os.path.exists(class_def.STATE_CHECKPOINT_PATH)
+
+
+def test_incomplete_checkpoint_falls_back_to_normal_startup(class_def, Output):
+    Checkpoint = class_def.StateCheckpoint(Output, Output.Clock)
+    with open(class_def.STATE_CHECKPOINT_PATH, "w") as fd:
+        json.dump({"boot_id": Checkpoint._get_boot_id(), "monotonic_time": 0, "pid": 1,
+                   "loop_states": {}, "timers": {}, "vehicle": None}, fd)
+    assert Checkpoint.load() is None
+    assert not os.path.exists(class_def.STATE_CHECKPOINT_PATH)
+
+    event_loop.start_up(Output, Output.Clock, Checkpoint)
+    assert set(Checkpoint.loop_states) == set(class_def.StateCheckpoint.LOOP_STATE_KEYS)
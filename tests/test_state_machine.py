@@ -0,0 +1,94 @@
+import itertools
+from unittest import mock
+
+import fake_hardware
+
+STATE_KEYS = ["sys_enabled_state", "key_acc_powered", "engine_on_state"]
+PREDICATE_KEYS = ["enable_switch_closed", "shutdown_delay_elapsed", "acc_powered", "engine_running",
+                  "shutdown_pending", "charge_ready"]
+
+
+def old_main_pass(s, p, aux_sufficient):
+    """Decision made by one pass of pre-state-machine main() loop (if/elif chain).
+    Returns (branch, loop states after pass, whether loop ended).
+    """
+    s = dict(s)
+    if not p["enable_switch_closed"] and s["sys_enabled_state"]:
+        s["sys_enabled_state"] = False
+        return "enable switch opened", s, False
+    elif p["enable_switch_closed"] and not s["sys_enabled_state"]:
+        s["sys_enabled_state"] = True
+        return "enable switch closed", s, False
+    if p["shutdown_delay_elapsed"]:
+        return "shutdown delay elapsed", s, True
+    if p["acc_powered"] and not s["key_acc_powered"]:
+        s["key_acc_powered"] = True
+        return "key OFF -> ACC", s, False
+    elif not p["acc_powered"] and s["key_acc_powered"]:
+        s["key_acc_powered"] = False
+        s["engine_on_state"] = False
+        return "key ACC -> OFF", s, False
+    elif not p["engine_running"] and s["engine_on_state"]:
+        s["engine_on_state"] = False
+        return "engine stopped", s, False
+    elif p["engine_running"] and not s["engine_on_state"]:
+        s["engine_on_state"] = True
+        return "engine started", s, False
+    if p["charge_ready"] and not p["shutdown_pending"]:
+        if s["engine_on_state"]:
+            return "mode: engine running", s, False
+        elif s["key_acc_powered"]:
+            return "mode: key ACC", s, not aux_sufficient
+        else:
+            return "mode: key OFF", s, not aux_sufficient
+    return None, s, False
+
+
+def make_car(aux_sufficient):
+    Car = mock.MagicMock()
+    Car.Output = fake_hardware.QuietOutput()
+    Car.get_main_voltage_raw.return_value = 12.6
+    Car.get_aux_voltage.return_value = 11.5
+    Car.is_aux_batt_sufficient.return_value = aux_sufficient
+    Car.is_aux_batt_full.return_value = False
+    return Car
+
+
+def test_transition_table_matches_old_main_loop(class_def):
+    import event_loop
+    for state_values, predicate_values, aux_sufficient in itertools.product(
+            itertools.product([False, True], repeat=len(STATE_KEYS)),
+            itertools.product([False, True], repeat=len(PREDICATE_KEYS)),
+            [False, True]):
+        states = dict(zip(STATE_KEYS, state_values))
+        p = dict(zip(PREDICATE_KEYS, predicate_values))
+        predicates = dict(p, charge_delay_status=(p["charge_ready"], True))
+        Car = make_car(aux_sufficient)
+        Machine = class_def.StateMachine(Car.Output, event_loop.build_transition_table(Car), dict(states))
+
+        ended = bool(Machine.step(predicates))
+        expected_branch, expected_states, expected_end = old_main_pass(states, p, aux_sufficient)
+        branch = next(iter(Machine.transition_stats), None)
+        context = (states, p, aux_sufficient)
+        assert branch == expected_branch, context
+        assert Machine.states == expected_states, context
+        assert ended == expected_end, context
+
+
+def test_key_off_to_acc_restarts_charge_delay(class_def):
+    import event_loop
+    Car = make_car(aux_sufficient=True)
+    Machine = class_def.StateMachine(Car.Output, event_loop.build_transition_table(Car),
+                                     {"sys_enabled_state": True, "key_acc_powered": False, "engine_on_state": False})
+    Machine.step({"enable_switch_closed": True, "shutdown_delay_elapsed": False, "acc_powered": True})
+    Car.stop_charging.assert_called_once_with()
+    Car.Timer.start_charge_delay_timer.assert_called_once_with("key OFF -> ACC")
+    assert Machine.states["key_acc_powered"]
+
+
+def test_predicates_evaluated_lazily(class_def):
+    calls = []
+    predicates = class_def.TickPredicates({"a": lambda: calls.append("a") or True,
+                                           "b": lambda: calls.append("b") or False})
+    assert predicates["a"] and predicates["a"]
+    assert calls == ["a"]
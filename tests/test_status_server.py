@@ -0,0 +1,37 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import event_loop
+
+
+@pytest.fixture
+def status_url(class_def, Output):
+    Status = class_def.StatusServer(Output, address=("127.0.0.1", 0))
+    for sample_num in range(5):
+        Status.publish({"n": sample_num}, {"states": {}})
+    yield "http://%s:%d" % Status.httpd.server_address
+    Status.shut_down()
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def test_samples_n_validated_and_clamped(status_url):
+    assert get_json(status_url + "/samples?n=2") == [{"n": 3}, {"n": 4}]
+    assert get_json(status_url + "/samples?n=-5") == []
+    assert len(get_json(status_url + "/samples?n=1000000000")) == 5
+    with pytest.raises(urllib.error.HTTPError) as exc_info:
+        get_json(status_url + "/samples?n=abc")
+    assert exc_info.value.code == 400
+
+
+def test_latest_sample_includes_filtered_voltages(class_def, Output):
+    Car = event_loop.start_up(Output, Output.Clock, class_def.StateCheckpoint(Output, Output.Clock))
+    Car.log_data()
+    assert Car.latest_sample["Vaux_filt"] == pytest.approx(Car.latest_sample["Vaux_raw"])
+    assert Car.latest_sample["Vmain_filt"] == pytest.approx(Car.latest_sample["Vmain_raw"])
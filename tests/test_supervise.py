@@ -0,0 +1,81 @@
+import errno
+import importlib
+
+import pytest
+
+import fake_hardware
+import event_loop
+
+
+@pytest.fixture
+def Checkpoint(class_def, Output, monkeypatch):
+    monkeypatch.setattr(importlib, "reload", lambda module: module) # Simulated "ah" isn't a module.
+    Checkpoint = class_def.StateCheckpoint(Output, Output.Clock)
+    event_loop.start_up(Output, Output.Clock, Checkpoint)
+    return Checkpoint
+
+
+def hat_busy():
+    return OSError(errno.EBUSY, "Device or resource busy")
+
+
+def test_recovers_w_relays_open_and_charge_delay_restarted(class_def, Output, Checkpoint):
+    Car = Checkpoint.Car
+    Timer = Output.Clock
+    resumed = []
+
+    def main_fxn(Output, Timer, Checkpoint, Status=None, Dog=None, Car=None):
+        if not resumed:
+            resumed.append(None)
+            Car.BattCharger.set_charge_direction_rev()
+            Car.BattCharger.enable_charge()
+            assert Timer.has_charge_delay_time_elapsed() == (True, False) # Charging mode long entered.
+            raise hat_busy()
+        resumed.append(Car)
+        assert not fake_hardware.HAT.relays[class_def.CHARGER_ENABLE_RELAY]
+        assert not fake_hardware.HAT.relays[class_def.CHARGE_DIRECTION_RELAY]
+        assert Timer.has_charge_delay_time_elapsed() == (False, False) # Wiring re-checked before charging again.
+
+    Timer.state_change_timer_start = Timer.timer_starts_mono["state_change"] = None # Delay elapsed before fault.
+    event_loop.supervise(Output, Timer, Checkpoint, main_fxn=main_fxn)
+    assert resumed == [None, Car]
+
+
+def test_gives_up_after_too_many_recoveries(class_def, Output, Checkpoint):
+    calls = []
+
+    def main_fxn(Output, Timer, Checkpoint, Status=None, Dog=None, Car=None):
+        calls.append(Car)
+        raise hat_busy()
+
+    with pytest.raises(OSError):
+        event_loop.supervise(Output, Output.Clock, Checkpoint, main_fxn=main_fxn)
+    assert len(calls) == event_loop.MAX_RECOVERIES_PER_HOUR + 1
+
+
+def test_reraises_fault_if_reinit_fails(class_def, Output, Checkpoint, monkeypatch):
+    calls = []
+
+    def main_fxn(Output, Timer, Checkpoint, Status=None, Dog=None, Car=None):
+        calls.append(Car)
+        raise hat_busy()
+
+    def reinit_hardware():
+        raise OSError(errno.EIO, "Input/output error") # HAT gone.
+    monkeypatch.setattr(Checkpoint.Car, "reinit_hardware", reinit_hardware)
+    with pytest.raises(OSError) as exc_info:
+        event_loop.supervise(Output, Output.Clock, Checkpoint, main_fxn=main_fxn)
+    assert exc_info.value.errno == errno.EBUSY
+    assert len(calls) == 1
+
+
+def test_unrecoverable_fault_not_retried(class_def, Output, Checkpoint):
+    calls = []
+
+    def main_fxn(Output, Timer, Checkpoint, Status=None, Dog=None, Car=None):
+        calls.append(Car)
+        raise OSError(errno.EIO, "Input/output error")
+
+    with pytest.raises(OSError):
+        event_loop.supervise(Output, Output.Clock, Checkpoint, main_fxn=main_fxn)
+    assert len(calls) == 1
@@ -0,0 +1,56 @@
+import socket
+
+import pytest
+
+import fake_hardware
+import synth_datalog
+
+
+@pytest.fixture
+def notify_socket(tmp_path, monkeypatch):
+    """Local stand-in for systemd's notify socket. Yields receiving end."""
+    path = str(tmp_path / "notify.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.bind(path)
+        sock.settimeout(1)
+        monkeypatch.setenv("NOTIFY_SOCKET", path)
+        monkeypatch.setenv("WATCHDOG_USEC", "120000000")
+        yield sock
+
+
+def receive_all(sock):
+    messages = []
+    sock.settimeout(0)
+    try:
+        while True:
+            messages.append(sock.recv(4096).decode())
+    except BlockingIOError:
+        return messages
+
+
+def test_feed_rate_limited_to_half_watchdog_timeout(class_def, notify_socket):
+    Dog = class_def.Watchdog(fake_hardware.QuietOutput())
+    assert Dog.feed_interval_s == 60
+    Dog.notify_ready()
+    for pass_num in range(5):
+        Dog.feed()
+    assert receive_all(notify_socket) == ["READY=1", "WATCHDOG=1"]
+
+
+def test_backup_keeps_watchdog_fed(class_def, tmp_path, monkeypatch):
+    # socketpair stands in for notify socket. Feed interval shortened so each progress point pings.
+    monkeypatch.setenv("WATCHDOG_USEC", "2")
+    receive_sock, send_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+    Dog = class_def.Watchdog(fake_hardware.QuietOutput(), notify_fxn=lambda message: send_sock.send(message.encode()))
+    db_path = str(tmp_path / "history.db")
+    synth_datalog.generate(db_path, 2)
+    Logger = class_def.DataLogger(fake_hardware.QuietOutput(), db_path=db_path, purge=False,
+                                  progress_fxn=Dog.keep_alive)
+    Logger.run_backup("20240101")
+
+    messages = receive_all(receive_sock)
+    num_chunks = len(class_def.DatalogBackupStore(None).load_manifest("system_data_log--20240101_auto")["chunks"])
+    assert len(messages) >= num_chunks
+    assert all(message.startswith("WATCHDOG=1\nEXTEND_TIMEOUT_USEC=") for message in messages)
+    receive_sock.close()
+    send_sock.close()